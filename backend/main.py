@@ -1,5 +1,4 @@
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles  # <-- Added
 from datetime import datetime, timedelta
 import random
 
@@ -11,11 +10,21 @@ from routes.auth import router as auth_router
 from routes.user_management import router as user_management_router
 from routes.track_record import router as track_record_router
 from routes.relationships import router as relationships_router
+from utils.uploads import UploadsStaticFiles, UploadLimitMiddleware, MULTIPART_SLACK_BYTES, MAX_AVATAR_UPLOAD_BYTES
+from utils.pdf_processing import MAX_PDF_UPLOAD_BYTES
+from utils.pdf_batch import MAX_BATCH_UPLOAD_BYTES
 
 app = FastAPI()
 
-# Mount the uploads directory to serve static files
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Refuse oversized uploads before their bodies are received and spooled.
+app.add_middleware(UploadLimitMiddleware, limits={
+    "/data-extraction": MAX_PDF_UPLOAD_BYTES + MULTIPART_SLACK_BYTES,
+    "/data-extraction/batch": MAX_BATCH_UPLOAD_BYTES + MULTIPART_SLACK_BYTES,
+    "/user-management/upload-profile-picture": MAX_AVATAR_UPLOAD_BYTES + MULTIPART_SLACK_BYTES,
+})
+
+# Mount the uploads directory to serve static files (content-addressed avatars are cached as immutable)
+app.mount("/uploads", UploadsStaticFiles(directory="uploads"), name="uploads")
 
 # Include routers under their respective prefixes
 app.include_router(data_extraction_router, prefix="/data-extraction")
@@ -3,6 +3,7 @@ from sqlmodel import Session, select
 from pydantic import BaseModel
 from models.user import User
 from db.session import get_session
+from utils.user_cache import user_cache
 from passlib.context import CryptContext
 
 router = APIRouter(tags=["Authentication"])
@@ -26,6 +27,8 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 @router.post("/register", status_code=status.HTTP_201_CREATED)
 def register(user: UserCreate, session: Session = Depends(get_session)):
+    if user_cache.get_by_email(user.email) is not None:
+        raise HTTPException(status_code=400, detail="Email already registered")
     statement = select(User).where(User.email == user.email)
     db_user = session.exec(statement).first()
     if db_user:
@@ -35,13 +38,19 @@ def register(user: UserCreate, session: Session = Depends(get_session)):
     session.add(new_user)
     session.commit()
     session.refresh(new_user)
+    # Write-through: drop anything stale under this email, then cache the new row.
+    user_cache.invalidate(email=new_user.email)
+    user_cache.put(new_user)
     return new_user
 
 @router.post("/login")
 def login(user: UserLogin, session: Session = Depends(get_session)):
-    statement = select(User).where(User.email == user.email)
-    db_user = session.exec(statement).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    db_user = user_cache.get_by_email(user.email)
+    if db_user is None:
+        statement = select(User).where(User.email == user.email)
+        db_user = session.exec(statement).first()
+        db_user = user_cache.put(db_user) if db_user else None
+    if not db_user or not verify_password(user.password, db_user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     # For simplicity, no JWT is generated here.
-    return {"message": "Login successful", "user": {"id": db_user.id, "username": db_user.username, "email": db_user.email}}
+    return {"message": "Login successful", "user": {"id": db_user["id"], "username": db_user["username"], "email": db_user["email"]}}
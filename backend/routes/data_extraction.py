@@ -1,13 +1,147 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from utils.pdf_processing import process_pdf_to_markdown
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List
+import json
+import os
+from utils.pdf_processing import process_pdf_to_markdown, save_pdf_upload
+from utils.pdf_jobs import pdf_jobs, format_event
+from utils.pdf_batch import collect_batch_inputs, run_batch, BATCH_MAX_CONCURRENCY
+from utils import docling_pool
+from utils.docling_pool import DOCLING_POOL_SIZE, DOCLING_MIN_SHARD_PAGES
+from utils.conversion_cache import conversion_cache
 
 router = APIRouter(tags=["Data Extraction"])
 
+@router.on_event("startup")
+def on_startup():
+    """
+    Optionally warm the shared docling converter pool at startup
+    (DOCLING_PRELOAD=1); otherwise converters are built on first use.
+    """
+    if os.environ.get("DOCLING_PRELOAD", "0") == "1":
+        try:
+            docling_pool.warm_up()
+            print(f"Docling converter pool warmed ({docling_pool.DOCLING_POOL_SIZE} converters).")
+        except Exception as e:
+            print("Error warming docling converter pool:", e)
+
+@router.on_event("shutdown")
+def on_shutdown():
+    docling_pool.shutdown()
+
 @router.post("/process_pdf")
-async def process_pdf(pdf_file: UploadFile = File(...)):
+async def process_pdf(
+    pdf_file: UploadFile = File(...),
+    shard_pages: int = Query(None, ge=0, description=f"Pages per shard for large PDFs (0 disables sharding, otherwise at least {DOCLING_MIN_SHARD_PAGES})"),
+    parallelism: int = Query(None, ge=1, le=DOCLING_POOL_SIZE, description="Maximum shards converted at once"),
+):
     """
     Accepts a PDF file upload, processes it using docling, and returns the
-    extracted document as Markdown.
+    extracted document as Markdown. Large PDFs are converted as page shards
+    in parallel and merged back in page order.
     """
-    markdown = await process_pdf_to_markdown(pdf_file)
+    if shard_pages and shard_pages < DOCLING_MIN_SHARD_PAGES:
+        raise HTTPException(status_code=400, detail=f"shard_pages must be 0 or at least {DOCLING_MIN_SHARD_PAGES}.")
+    markdown = await process_pdf_to_markdown(pdf_file, shard_pages=shard_pages, parallelism=parallelism)
     return {"markdown": markdown}
+
+@router.post("/batch")
+async def process_pdf_batch(
+    files: List[UploadFile] = File(None),
+    archive: UploadFile = File(None),
+    concurrency: int = Query(None, ge=1, le=BATCH_MAX_CONCURRENCY, description="Maximum documents converted at once"),
+    stream: bool = Query(False, description="Stream one NDJSON line per document as it finishes"),
+):
+    """
+    Convert a batch of PDFs, sent as a multipart list (`files`) and/or a zip
+    archive (`archive`). Conversions are scheduled across the worker pool with
+    at most `concurrency` in flight. A failing document only produces an error
+    entry for that file. The response ends with a summary of aggregate
+    throughput (documents and pages per second).
+    """
+    items = await collect_batch_inputs(files=files, archive=archive)
+    results = run_batch(items, concurrency=concurrency)
+
+    if stream:
+        async def ndjson():
+            async for result in results:
+                yield json.dumps(result) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    documents = []
+    summary = None
+    async for result in results:
+        if "summary" in result:
+            summary = result["summary"]
+        else:
+            documents.append(result)
+    documents.sort(key=lambda r: r["index"])
+    return {"documents": documents, "summary": summary}
+
+@router.post("/jobs", status_code=202)
+async def create_pdf_job(
+    pdf_file: UploadFile = File(...),
+    parallelism: int = Query(None, ge=1, le=DOCLING_POOL_SIZE, description="Maximum pages converted at once"),
+):
+    """
+    Start a background extraction job for a PDF and return its id right away.
+    Follow progress at /jobs/{job_id}/events, which streams per-page markdown
+    and tables as each page finishes; fetch the final result at /jobs/{job_id}.
+    """
+    spooled = await save_pdf_upload(pdf_file)
+    try:
+        job = pdf_jobs.submit(spooled.path, spooled.sha256, filename=pdf_file.filename, parallelism=parallelism)
+    except RuntimeError as e:
+        spooled.discard()
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        "job_id": job.id,
+        "status_url": f"/data-extraction/jobs/{job.id}",
+        "events_url": f"/data-extraction/jobs/{job.id}/events",
+    }
+
+@router.get("/jobs/{job_id}")
+def get_pdf_job(job_id: str):
+    """
+    Job status, plus merged markdown and tables once the job is done.
+    """
+    job = pdf_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.summary(include_result=True)
+
+@router.get("/jobs/{job_id}/events")
+async def stream_pdf_job_events(
+    job_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+):
+    """
+    Stream job events as NDJSON (default) or Server-Sent Events (format=sse):
+    `started`, one `page` (or `page_error`) per page as it completes, then
+    `done` (with status "partial" if some pages failed) or `error`.
+    Already-emitted events are replayed first; once the job has finished,
+    replayed `page` events no longer carry markdown and tables (fetch the
+    merged result from /jobs/{job_id}).
+    """
+    job = pdf_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def event_stream():
+        async for event in job.follow():
+            yield format_event(event, format)
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+@router.get("/metrics")
+def get_conversion_metrics():
+    """
+    Converter pool state, init vs. conversion timings and conversion cache counters.
+    """
+    return {
+        "pool": docling_pool.pool_stats(),
+        "timings": docling_pool.metrics.snapshot(),
+        "cache": conversion_cache.stats(),
+    }
@@ -1,31 +1,157 @@
-from fastapi import APIRouter, UploadFile, HTTPException
-import tempfile
-import os
-from docling.document_converter import DocumentConverter
+from fastapi import APIRouter, UploadFile, HTTPException, Query
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+import csv
+import io
+import zipfile
+from utils.pdf_processing import save_pdf_upload, convert_spooled_pdf, conversion_key
+from utils.conversion_cache import conversion_cache
+from utils.docling_pool import parse_page_ranges, pdf_text_less_pages
 
 router = APIRouter(tags=["Data Extraction"])
 
+# pyarrow is only needed for format=arrow.
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+def unique_column_names(columns):
+    """Make column names unique (docling tables can repeat header cells)."""
+    seen = {}
+    names = []
+    for col in columns:
+        name = col or "column"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def table_to_csv(table):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(table["columns"])
+    writer.writerows(table["data"])
+    return buffer.getvalue().encode("utf-8")
+
+
+def table_to_arrow(table):
+    names = unique_column_names(table["columns"])
+    columns = {
+        name: pa.array([None if row[i] is None else str(row[i]) for row in table["data"]], type=pa.string())
+        for i, name in enumerate(names)
+    }
+    arrow_table = pa.table(columns, metadata={"table_index": str(table["table_index"]), "page_no": str(table["page_no"])})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+    return sink.getvalue().to_pybytes()
+
+
+def zip_tables(tables, encode, extension):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for table in tables:
+            archive.writestr(f"table_{table['table_index']}_p{table['page_no']}.{extension}", encode(table))
+    return buffer.getvalue()
+
+
+def tables_on_pages(tables, page_ranges):
+    """
+    Tables within `page_ranges`, renumbered as a conversion of just those
+    pages would be. Tables without a page number (no provenance) are left out.
+    """
+    if not page_ranges:
+        return tables
+    selected = [
+        t for t in tables
+        if t["page_no"] is not None and any(start <= t["page_no"] <= end for start, end in page_ranges)
+    ]
+    return [{**t, "table_index": i} for i, t in enumerate(selected)]
+
+
+async def convert_for_tables(spooled, page_ranges=None, full_pipeline=False):
+    """
+    Tables of a saved PDF. A cached (or in-flight) whole-document conversion
+    from /process_pdf, QA or batch extraction is reused when there is one;
+    otherwise the tables-only pipeline converts just `page_ranges`. That
+    pipeline skips OCR, so documents with scanned (text-less) pages go
+    through the default pipeline instead.
+    """
+    cached = await conversion_cache.get(conversion_key(spooled.sha256))
+    if cached is not None:
+        return tables_on_pages(cached["tables"], page_ranges)
+    profile = "default"
+    if not full_pipeline:
+        try:
+            text_less = await run_in_threadpool(pdf_text_less_pages, spooled.path, page_ranges)
+        except Exception as e:
+            print("Warning: could not inspect PDF text layer, using the default pipeline:", e)
+            text_less = True
+        if not text_less:
+            profile = "tables"
+    payload = await convert_spooled_pdf(spooled, profile=profile, page_ranges=page_ranges)
+    return payload["tables"]
+
+
 @router.post("/")
-async def extract_tables(pdf_file: UploadFile):
-    if pdf_file.content_type != "application/pdf":
-        raise HTTPException(status_code=400, detail="Invalid file type. Please upload a PDF file.")
+async def extract_tables(
+    pdf_file: UploadFile,
+    format: str = Query("markdown", pattern="^(markdown|json|csv|arrow)$"),
+    pages: str = Query(None, description='Only convert these 1-based pages, e.g. "3-5,9"'),
+    table_index: int = Query(None, ge=0, description="Return a single table (csv/arrow formats)"),
+    full_pipeline: bool = Query(False, description="Use the full docling pipeline instead of the tables-only one"),
+):
+    """
+    Extract tables from a PDF.
+
+    Tables are read from the cached whole-document conversion of the same PDF
+    when there is one. Otherwise this runs a tables-only docling pipeline (no
+    OCR, picture or enrichment stages; scanned documents fall back to the
+    default pipeline), optionally restricted to `pages`. Tables come back
+    as markdown (default), structured JSON (columns + rows), CSV or Arrow
+    IPC. For csv/arrow a single table is returned when `table_index` is
+    given, otherwise a zip archive with one file per table.
+    """
     try:
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-            content = await pdf_file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save uploaded PDF: {str(e)}")
+        page_ranges = parse_page_ranges(pages) if pages else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format == "arrow" and not PYARROW_AVAILABLE:
+        raise HTTPException(status_code=400, detail="Arrow output requires pyarrow to be installed.")
+
+    spooled = await save_pdf_upload(pdf_file)
     try:
-        converter = DocumentConverter()
-        conv_res = converter.convert(tmp_path)
-        tables = []
-        for idx, table in enumerate(conv_res.document.tables):
-            df = table.export_to_dataframe()
-            markdown = df.to_markdown()
-            tables.append({"table_index": idx, "markdown": markdown})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+        tables = await convert_for_tables(spooled, page_ranges, full_pipeline)
     finally:
-        os.remove(tmp_path)
-    return {"tables": tables}
+        spooled.discard()
+
+    if format == "markdown":
+        return {"tables": [{"table_index": t["table_index"], "markdown": t["markdown"]} for t in tables]}
+    if format == "json":
+        return {
+            "tables": [
+                {"table_index": t["table_index"], "page_no": t["page_no"], "columns": t["columns"], "data": t["data"]}
+                for t in tables
+            ]
+        }
+
+    encode, extension, media_type = {
+        "csv": (table_to_csv, "csv", "text/csv"),
+        "arrow": (table_to_arrow, "arrow", "application/vnd.apache.arrow.stream"),
+    }[format]
+    if table_index is not None:
+        if table_index >= len(tables):
+            raise HTTPException(status_code=404, detail="Table not found.")
+        return Response(content=encode(tables[table_index]), media_type=media_type)
+    return Response(
+        content=zip_tables(tables, encode, extension),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="tables_{extension}.zip"'},
+    )
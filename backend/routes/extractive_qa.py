@@ -1,73 +1,46 @@
-from fastapi import APIRouter, HTTPException, File, UploadFile, Form
-from haystack import Document, Pipeline
-from haystack.document_stores.in_memory import InMemoryDocumentStore
-from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
-from haystack.components.readers import ExtractiveReader
-from haystack.components.embedders import SentenceTransformersDocumentEmbedder, SentenceTransformersTextEmbedder
-from haystack.components.writers import DocumentWriter
-from utils.pdf_processing import process_pdf_to_markdown
+from fastapi import APIRouter, HTTPException, File, UploadFile, Form, Body
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+import os
+from utils.pdf_processing import save_pdf_upload, convert_spooled_pdf
+from utils.qa_models import qa_models
+from utils.qa_index import document_index, index_markdown, ask_document, ask_document_batch, ask_corpus, add_to_corpus, index_settings, DOC_ID_RE
+from utils.corpus_index import corpus_index
 
 router = APIRouter(tags=["Data Extraction"])
 
-@router.post("/process")
-async def process_extractive_qa(
-    pdf_file: UploadFile = File(...),
-    query: str = Form(...)
-):
+QA_BATCH_MAX_QUESTIONS = int(os.environ.get("QA_BATCH_MAX_QUESTIONS", "100"))
+QA_CORPUS_MAX_TOP_K = int(os.environ.get("QA_CORPUS_MAX_TOP_K", "50"))
+
+@router.on_event("startup")
+def on_startup():
     """
-    Accepts a PDF file upload and a form field 'query'.
-    Processes the PDF using docling, builds a minimal Haystack extractive QA pipeline,
-    indexes the resulting markdown as a single document, and returns the QA results.
-    """
-    markdown = await process_pdf_to_markdown(pdf_file)
-
-    # Create a document store and index the provided markdown as one document.
-    document_store = InMemoryDocumentStore()
-    document = Document(content=markdown, meta={"source": "docling", "split_id": 0, "source_id": "docling", "split_idx_start": 0})
-    model = "sentence-transformers/multi-qa-mpnet-base-dot-v1"
-    embedder = SentenceTransformersDocumentEmbedder(model=model)
-    writer = DocumentWriter(document_store=document_store)
-
-    indexing_pipeline = Pipeline()
-    indexing_pipeline.add_component(instance=embedder, name="embedder")
-    indexing_pipeline.add_component(instance=writer, name="writer")
-    indexing_pipeline.connect("embedder.documents", "writer.documents")
-    indexing_pipeline.run({"documents": [document]})
-
-    # Build the extractive QA pipeline.
-    retriever = InMemoryEmbeddingRetriever(document_store=document_store)
-    reader = ExtractiveReader(no_answer=True)
-    reader.warm_up()
-
-    qa_pipeline = Pipeline()
-    qa_pipeline.add_component(instance=SentenceTransformersTextEmbedder(model=model), name="text_embedder")
-    qa_pipeline.add_component(instance=retriever, name="retriever")
-    qa_pipeline.add_component(instance=reader, name="reader")
-    qa_pipeline.connect("text_embedder.embedding", "retriever.query_embedding")
-    qa_pipeline.connect("retriever.documents", "reader.documents")
-
-    result = qa_pipeline.run(
-        data={
-            "text_embedder": {"text": query},
-            "retriever": {"top_k": 3},
-            "reader": {"query": query, "top_k": 2}
-        }
-    )
-    # Post-process results: retrieve contextual window for each answer and remove unnecessary document details.
-    from haystack.components.retrievers import SentenceWindowRetriever
-    window_retriever = SentenceWindowRetriever(document_store=document_store, window_size=2)
+    Load and warm up the QA embedders and reader once (QA_PRELOAD=0 defers
+    this to the first request).
+    """
+    if os.environ.get("QA_PRELOAD", "1") == "1":
+        try:
+            qa_models.load()
+        except Exception as e:
+            print("Error loading QA models:", e)
+
+def clean_answers(result, context_window=None):
+    """
+    Post-process results: retrieve contextual window for each answer and remove unnecessary document details.
+    """
+    context_window = context_window or qa_models.context_window
     if "reader" in result and "answers" in result["reader"]:
         for answer in result["reader"]["answers"]:
             if getattr(answer, "document", None):
                 # Retrieve context window around the matching sentence.
-                context_result = window_retriever.run(retrieved_documents=[answer.document])
+                context_result = context_window(answer.document)
                 if "context_windows" in context_result and context_result["context_windows"]:
                     answer.context = context_result["context_windows"][0]
                 else:
                     answer.context = ""
                 # Clean document details.
                 if not isinstance(answer.document, dict):
-                    doc = answer.document.__dict__
+                    doc = dict(answer.document.__dict__)
                     for key in ["content", "embedding", "sparse_embedding", "dataframe", "blob"]:
                         doc.pop(key, None)
                     answer.document = doc
@@ -75,3 +48,146 @@ async def process_extractive_qa(
                     for key in ["content", "embedding", "sparse_embedding", "dataframe", "blob"]:
                         answer.document.pop(key, None)
     return result
+
+async def index_pdf_upload(pdf_file: UploadFile) -> dict:
+    """
+    Convert and index an uploaded PDF unless an index for the same bytes
+    already exists. The doc_id is the SHA-256 of the PDF.
+    """
+    spooled = await save_pdf_upload(pdf_file)
+    try:
+        doc_id = spooled.sha256
+        if document_index.exists(doc_id, index_settings()):
+            await run_in_threadpool(add_to_corpus, doc_id)
+            return {**document_index.manifest(doc_id), "cached": True}
+        payload = await convert_spooled_pdf(spooled)
+    finally:
+        spooled.discard()
+    manifest = await run_in_threadpool(
+        index_markdown, doc_id, payload["markdown"], {"filename": pdf_file.filename, "num_pages": payload["num_pages"]}
+    )
+    return {**manifest, "cached": False}
+
+def check_doc_id(doc_id: str):
+    if not DOC_ID_RE.match(doc_id):
+        raise HTTPException(status_code=400, detail="Invalid doc_id: expected the 64-character hex SHA-256 returned by /index.")
+
+def answer_question(doc_id: str, query: str):
+    check_doc_id(doc_id)
+    try:
+        # Stay resident until the context windows are built.
+        with document_index.resident(doc_id):
+            return clean_answers(ask_document(doc_id, query))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Document not indexed. Upload it to /index first.")
+
+def answer_questions(doc_id: str, queries: List[str]):
+    check_doc_id(doc_id)
+    queries = [query for query in queries if query.strip()]
+    if not queries:
+        raise HTTPException(status_code=400, detail="No questions provided.")
+    if len(queries) > QA_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {QA_BATCH_MAX_QUESTIONS} questions per request.")
+    try:
+        with document_index.resident(doc_id):
+            results = ask_document_batch(doc_id, queries)
+            return {
+                "doc_id": doc_id,
+                "results": [{"query": query, **clean_answers(result)} for query, result in zip(queries, results)],
+            }
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Document not indexed. Upload it to /index first.")
+
+@router.post("/index")
+async def index_document(pdf_file: UploadFile = File(...)):
+    """
+    Index a PDF once for extractive QA and return its `doc_id`. Passage
+    embeddings are persisted, so questions can be asked against the doc_id
+    (via /ask) any number of times, across restarts, without re-uploading.
+    """
+    return await index_pdf_upload(pdf_file)
+
+@router.post("/ask")
+async def ask_indexed_document(doc_id: str = Body(...), query: str = Body(...)):
+    """
+    Ask a question against a previously indexed document:
+       { "doc_id": "...", "query": "What is the fund size?" }
+    Only the query is embedded; retrieval and the reader run on the stored passages.
+    """
+    return await run_in_threadpool(answer_question, doc_id, query)
+
+@router.post("/ask_batch")
+async def ask_indexed_document_batch(doc_id: str = Body(...), queries: List[str] = Body(...)):
+    """
+    Ask many questions against a previously indexed document in one go:
+       { "doc_id": "...", "queries": ["What is the fund size?", "What is the vintage?"] }
+    Questions are embedded together, retrieved with one matrix multiply and
+    read in shared batches, which is much faster than one /ask per question.
+    """
+    return await run_in_threadpool(answer_questions, doc_id, queries)
+
+@router.delete("/index/{doc_id}")
+def delete_document_index(doc_id: str):
+    check_doc_id(doc_id)
+    if not document_index.exists(doc_id):
+        raise HTTPException(status_code=404, detail="Document not indexed.")
+    document_index.remove(doc_id)
+    corpus_index.remove(doc_id)
+    return {"deleted": doc_id}
+
+@router.post("/process")
+async def process_extractive_qa(
+    pdf_file: UploadFile = File(...),
+    query: str = Form(...)
+):
+    """
+    Accepts a PDF file upload and a form field 'query'.
+    Indexes the PDF (reusing an existing index for the same bytes) and
+    returns the QA results for the query.
+    """
+    manifest = await index_pdf_upload(pdf_file)
+    return await run_in_threadpool(answer_question, manifest["doc_id"], query)
+
+@router.post("/process_batch")
+async def process_extractive_qa_batch(
+    pdf_file: UploadFile = File(...),
+    queries: List[str] = Form(...)
+):
+    """
+    Like /process, but takes the form field 'queries' repeated once per
+    question and answers them all in one batched pass.
+    """
+    manifest = await index_pdf_upload(pdf_file)
+    return await run_in_threadpool(answer_questions, manifest["doc_id"], queries)
+
+def answer_corpus_question(query: str, top_k: Optional[int], doc_ids: Optional[List[str]]):
+    for doc_id in doc_ids or []:
+        check_doc_id(doc_id)
+    result = clean_answers(ask_corpus(query, retriever_top_k=top_k, doc_ids=doc_ids), context_window=corpus_index.context_window)
+    doc_ids = {answer.document["meta"]["doc_id"] for answer in result["reader"]["answers"] if answer.document}
+    return {"query": query, **result, "documents": {doc_id: corpus_index.document(doc_id) for doc_id in doc_ids}}
+
+@router.post("/corpus/ask")
+async def ask_corpus_question(
+    query: str = Body(...),
+    top_k: Optional[int] = Body(None, ge=1, le=QA_CORPUS_MAX_TOP_K),
+    doc_ids: Optional[List[str]] = Body(None)
+):
+    """
+    Ask a question across every indexed document:
+       { "query": "Which GPs mention a key-person event?", "top_k": 10 }
+    `top_k` passages are retrieved from the whole corpus (or only `doc_ids`)
+    and read; each answer's document meta names the doc_id it came from.
+    """
+    return await run_in_threadpool(answer_corpus_question, query, top_k, doc_ids)
+
+@router.get("/corpus/stats")
+def get_corpus_stats():
+    return corpus_index.stats()
+
+@router.get("/models")
+def get_qa_models():
+    """
+    Which QA models are loaded and how long loading took.
+    """
+    return qa_models.stats()
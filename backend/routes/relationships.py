@@ -1,9 +1,20 @@
-from fastapi import APIRouter, Body
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from neo4j import GraphDatabase
+from typing import List, Optional
 import os
 
-from utils.graph_utils import get_full_graph
-from utils.cypher_queries import run_named_query
+from utils.graph_utils import (
+    get_full_graph, export_graph, format_graph_export, get_neighbourhood,
+    EXPORT_FORMATS, NODE_KEYS, NEIGHBOURHOOD_MAX_HOPS, NEIGHBOURHOOD_MAX_NODES, NEIGHBOURHOOD_MAX_DEGREE,
+)
+from utils.graph_payload import graph_response, encode_graph
+from utils.graph_cache import cached_graph_response, graph_snapshots, graph_version
+from utils.graph_analytics import (
+    graph_analytics, degree, pagerank, betweenness, components, path_between,
+    SCIPY_AVAILABLE, BETWEENNESS_SAMPLES, BETWEENNESS_MAX_SAMPLES, ANALYTICS_MAX_TOP,
+)
+from utils.cypher_queries import run_named_query, query_stats, QUERIES
 
 router = APIRouter(prefix="/relationships", tags=["Relationships"])
 
@@ -55,12 +66,7 @@ def on_startup():
     except Exception as e:
         print("Error initializing GDS Graph 'myGraph':", e)
 
-@router.get("/people")
-def get_people_from_neo4j(limit: int = 10):
-    """
-    Query Neo4j for Person nodes.
-    Returns a list of basic person data: personId, fullName, primaryTitle.
-    """
+def fetch_people(limit):
     with driver.session() as session:
         query = """
         MATCH (p:Person)
@@ -77,26 +83,206 @@ def get_people_from_neo4j(limit: int = 10):
             })
         return {"people": results}
 
+@router.get("/people")
+def get_people_from_neo4j(request: Request, limit: int = 10):
+    """
+    Query Neo4j for Person nodes.
+    Returns a list of basic person data: personId, fullName, primaryTitle.
+    Served from the graph snapshot cache (see /graph).
+    """
+    return cached_graph_response(
+        driver, request, ("people", limit), lambda: encode_graph(fetch_people(limit), "json")
+    )
+
 @router.get("/graph")
-def get_full_graph_data():
+def get_full_graph_data(request: Request, format: str = "json", part: str = "nodes"):
     """
     Return the entire graph (all nodes and relationships)
     in a JSON structure that the frontend can use to visualize.
+
+    format=columnar (JSON), msgpack or arrow returns the compact columnar
+    layout instead (see utils/graph_payload.py); arrow sends one table,
+    picked with part=nodes|relationships. Responses are gzipped when the
+    client accepts it.
+
+    Serialized responses are cached per graph version and carry an ETag, so
+    revalidating an unchanged graph returns 304 Not Modified, and a new
+    client is served without a Neo4j scan.
     """
-    return get_full_graph(driver)
+    return cached_graph_response(
+        driver, request, ("graph", format, part), lambda: encode_graph(get_full_graph(driver), format, part)
+    )
+
+@router.get("/graph/cache")
+def get_graph_cache_stats():
+    return {"version": graph_version.current(driver), **graph_snapshots.stats()}
+
+@router.get("/graph/export")
+def export_graph_data(
+    format: str = "ndjson",
+    entity: str = "all",
+    labels: Optional[List[str]] = Query(None),
+    types: Optional[List[str]] = Query(None),
+    fields: Optional[List[str]] = Query(None),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, gt=0),
+):
+    """
+    Stream the graph without materializing it, straight from the Neo4j cursor
+    (unordered; a page taken with `limit` is sorted by id on the server first).
+
+    - format: ndjson (one node/relationship per line, then an "end" line) or
+      json (a single {"nodes": [...], "relationships": [...]} document)
+    - entity: all | nodes | relationships
+    - labels / types: only nodes with these labels (and relationships between
+      them) / only these relationship types, e.g. ?labels=Person&labels=Deal
+    - fields: only these property keys, e.g. ?fields=fullName&fields=personId
+    - limit + cursor: page through the graph by internal id; pass the "next"
+      value of the last page as `cursor` (it is null once the export is done)
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {EXPORT_FORMATS}")
+    try:
+        records = export_graph(driver, entity=entity, labels=labels, rel_types=types, properties=fields, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(format_graph_export(records, format), media_type=media_type)
+
+@router.get("/neighbourhood")
+def get_neighbourhood_graph(
+    request: Request,
+    personId: Optional[str] = None,
+    dealId: Optional[str] = None,
+    orgId: Optional[str] = None,
+    hops: int = Query(1, ge=1, le=NEIGHBOURHOOD_MAX_HOPS),
+    max_nodes: int = Query(NEIGHBOURHOOD_MAX_NODES, ge=1, le=NEIGHBOURHOOD_MAX_NODES),
+    max_degree: int = Query(NEIGHBOURHOOD_MAX_DEGREE, ge=1, le=NEIGHBOURHOOD_MAX_DEGREE),
+    types: Optional[List[str]] = Query(None),
+    format: str = "json",
+    part: str = "nodes",
+):
+    """
+    The k-hop neighbourhood around one person, deal or organization, e.g.
+    /relationships/neighbourhood?personId=...&hops=2&types=WORKS_AT&types=INVOLVED_IN
+    At most `max_degree` relationships are followed per node and at most
+    `max_nodes` nodes are returned; `capped` / `truncated` tell when that happened.
+    `format` / `part` work as for /graph.
+    """
+    keys = {key: value for key, value in (("personId", personId), ("dealId", dealId), ("orgId", orgId)) if value}
+    if len(keys) != 1:
+        raise HTTPException(status_code=400, detail="Pass exactly one of personId, dealId or orgId.")
+    (key, value), = keys.items()
+    try:
+        result = get_neighbourhood(driver, key, value, hops=hops, max_nodes=max_nodes, max_degree=max_degree, rel_types=types)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No node with {key} {value!r}.")
+    return graph_response(result, format, request, part)
+
+def require_scipy():
+    if not SCIPY_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Local graph analytics require scipy to be installed.")
+
+@router.get("/analytics/degree")
+def get_degree(top: int = Query(20, ge=1, le=ANALYTICS_MAX_TOP), label: Optional[str] = None):
+    """
+    Degree centrality computed in-process (no GDS needed), over the same
+    undirected projection of all relationship types as 'myGraph'.
+    Results are cached per graph version, as for all /analytics endpoints.
+    """
+    require_scipy()
+    snapshot, scores = graph_analytics.compute(driver, "degree", (), lambda s: degree(s.adjacency))
+    return {"version": snapshot.version, "results": snapshot.top(scores, top, label)}
+
+@router.get("/analytics/pagerank")
+def get_pagerank(top: int = Query(20, ge=1, le=ANALYTICS_MAX_TOP), label: Optional[str] = None, damping: float = Query(0.85, gt=0, lt=1)):
+    require_scipy()
+    snapshot, (scores, iterations) = graph_analytics.compute(
+        driver, "pagerank", (damping,), lambda s: pagerank(s.adjacency, damping)
+    )
+    return {"version": snapshot.version, "iterations": iterations, "results": snapshot.top(scores, top, label)}
+
+@router.get("/analytics/betweenness")
+def get_betweenness(
+    top: int = Query(20, ge=1, le=ANALYTICS_MAX_TOP),
+    label: Optional[str] = None,
+    samples: int = Query(BETWEENNESS_SAMPLES, ge=1, le=BETWEENNESS_MAX_SAMPLES),
+    seed: int = 0,
+):
+    """
+    Betweenness estimated from `samples` random BFS sources; more samples are
+    slower but closer to the exact value.
+    """
+    require_scipy()
+    snapshot, scores = graph_analytics.compute(
+        driver, "betweenness", (samples, seed), lambda s: betweenness(s.adjacency, samples, seed)
+    )
+    return {"version": snapshot.version, "samples": min(samples, snapshot.num_nodes), "results": snapshot.top(scores, top, label)}
+
+@router.get("/analytics/components")
+def get_components(top: int = Query(10, ge=1, le=ANALYTICS_MAX_TOP)):
+    """Connected components: how many, and the largest ones with a sample member."""
+    require_scipy()
+    snapshot, (count, labels, sizes) = graph_analytics.compute(driver, "components", (), lambda s: components(s.adjacency))
+    largest = sizes.argsort()[::-1][:top]
+    return {
+        "version": snapshot.version,
+        "count": int(count),
+        "components": [
+            {"component": int(c), "size": int(sizes[c]), "member": snapshot.describe(int((labels == c).argmax()))}
+            for c in largest
+        ],
+    }
+
+@router.get("/analytics/shortest-path")
+def get_shortest_path(source: str, target: str, source_key: str = "personId", target_key: str = "personId"):
+    """
+    A shortest path (fewest hops, any relationship type or direction) between
+    two nodes, each given by a key (personId, orgId, dealId or schoolId) and
+    its value, e.g. ?source=...&target=...&target_key=dealId
+    """
+    require_scipy()
+    for key in (source_key, target_key):
+        if key not in NODE_KEYS:
+            raise HTTPException(status_code=400, detail=f"key must be one of {tuple(NODE_KEYS)}")
+    snapshot = graph_analytics.snapshot(driver)
+    rows = []
+    for key, value in ((source_key, source), (target_key, target)):
+        row = snapshot.index_of_key(key, value)
+        if row is None:
+            raise HTTPException(status_code=404, detail=f"No node with {key} {value!r}.")
+        rows.append(row)
+    path = path_between(snapshot.adjacency, *rows)
+    if path is None:
+        return {"version": snapshot.version, "hops": None, "path": []}
+    return {"version": snapshot.version, "hops": len(path) - 1, "path": [snapshot.describe(i) for i in path]}
+
+@router.get("/analytics/stats")
+def get_analytics_stats():
+    return {"scipy": SCIPY_AVAILABLE, **graph_analytics.stats()}
 
 @router.post("/run-query")
-def run_query(queryName: str = Body(..., embed=True)):
+def run_query(queryName: str = Body(..., embed=True), params: Optional[dict] = Body(None, embed=True)):
     """
-    Accepts a queryName in the body:
-       { "queryName": "degree_centrality" }
-    and runs the corresponding query from cypher_queries.py
+    Accepts a queryName and optional parameters in the body:
+       { "queryName": "pagerank", "params": {"damping": 0.9, "limit": 50} }
+    and runs the corresponding query from utils/cypher_queries.py
     returning the raw results (keys, _fields, etc.).
+    Unknown queries or parameters give 400; see /queries for what is available.
     """
     try:
-        results = run_named_query(driver, queryName)
-        return results
+        return run_named_query(driver, queryName, params)
     except ValueError as e:
-        return {"error": str(e)}
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
-        return {"error": str(e)}
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@router.get("/queries")
+def list_queries():
+    """The named queries with their parameters, plus per-query execution stats."""
+    return {
+        "queries": [query.describe() for query in QUERIES.values()],
+        "stats": query_stats.snapshot(),
+    }
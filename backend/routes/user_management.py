@@ -1,13 +1,19 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Request, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Request, Depends, Response, BackgroundTasks
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 import os
 from sqlmodel import Session
 from models.user import User
 from db.session import get_session
+from utils.user_cache import user_cache, user_etag
+from utils.http_cache import etag_matches
+from utils.uploads import store_avatar, generate_avatar_thumbnail, avatar_thumbnail_path
 
 router = APIRouter()
 
 @router.post("/upload-profile-picture")
 async def upload_profile_picture(
+    background_tasks: BackgroundTasks,
     user_id: int = Form(...),
     file: UploadFile = File(None),       # <-- Now optional
     displayname: str = Form(None)        # <-- Added display name
@@ -25,23 +31,57 @@ async def upload_profile_picture(
     if file:
         if file.content_type not in ["image/jpeg", "image/png"]:
             raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG and PNG are allowed.")
-        uploads_dir = "uploads"
-        if not os.path.exists(uploads_dir):
-            os.makedirs(uploads_dir)
-        file_location = os.path.join(uploads_dir, file.filename)
-        content = await file.read()
-        with open(file_location, "wb") as f:
-            f.write(content)
+        file_location = await store_avatar(file)
+        background_tasks.add_task(generate_avatar_thumbnail, file_location)
+        # Background tasks run in order: refresh the cached record once the thumbnail exists.
+        background_tasks.add_task(user_cache.invalidate, user_id=user_id)
         user.profile_picture = file_location
 
     session.add(user)
     session.commit()
     session.refresh(user)
+    user_cache.invalidate(user_id=user.id)
     return user
 
+def with_profile_thumbnail(record):
+    """
+    Add `profile_picture_thumbnail` once the background thumbnail exists.
+    """
+    picture = record.get("profile_picture")
+    if picture:
+        thumbnail = avatar_thumbnail_path(picture)
+        if os.path.exists(thumbnail):
+            return {**record, "profile_picture_thumbnail": thumbnail}
+    return record
+
+@router.get("/cache/stats")
+def get_user_cache_stats():
+    """
+    Hit/miss counters for the in-process user lookup cache.
+    """
+    return user_cache.stats()
+
 @router.get("/{user_id}")
-async def get_user(user_id: int, session: Session = Depends(get_session)):
-    user = session.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found.")
-    return user
+async def get_user(user_id: int, request: Request, session: Session = Depends(get_session)):
+    """
+    Return a user record, served from the in-process cache when possible.
+    Responses carry an ETag (with no-cache) so clients can revalidate cheaply
+    and receive 304 Not Modified when nothing changed. There is no
+    Last-Modified: users have no modification time, and the cache load time
+    differs between workers and reloads.
+    """
+    record = user_cache.get_by_id(user_id)
+    if record is None:
+        user = session.get(User, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found.")
+        record = user_cache.put(user)
+    record = with_profile_thumbnail(record)
+
+    headers = {
+        "ETag": user_etag(record),
+        "Cache-Control": "no-cache",
+    }
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=jsonable_encoder(record), headers=headers)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Measure how PDF conversions affect the latency of unrelated endpoints.
+
+Against a running backend, this samples a cheap endpoint (by default
+GET /performance/timeseries?steps=10) first with the server idle, then while
+`--concurrency` PDF uploads are being converted, and prints p50/p95/p99 for
+both phases. With conversions offloaded to worker processes the two
+distributions should be close; with conversions on the event loop the p99
+during conversion jumps to the length of a conversion.
+
+Usage:
+    python scripts/bench_event_loop.py sample.pdf --base-url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+import numpy as np
+
+
+async def sample_latencies(client, path, duration, interval):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def convert_repeatedly(client, pdf_path, stop):
+    with open(pdf_path, "rb") as f:
+        content = f.read()
+    count = 0
+    while not stop.is_set():
+        files = {"pdf_file": (os.path.basename(pdf_path), content, "application/pdf")}
+        response = await client.post("/data-extraction/process_pdf", files=files)
+        response.raise_for_status()
+        count += 1
+    return count
+
+
+def summarize(label, latencies):
+    arr = np.asarray(latencies)
+    print(
+        f"{label:<18} n={len(arr):<5} "
+        f"p50={np.percentile(arr, 50):8.1f}ms  p95={np.percentile(arr, 95):8.1f}ms  "
+        f"p99={np.percentile(arr, 99):8.1f}ms  max={arr.max():8.1f}ms"
+    )
+
+
+async def run(args):
+    timeout = httpx.Timeout(None)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout) as client:
+        idle = await sample_latencies(client, args.probe_path, args.duration, args.interval)
+
+        stop = asyncio.Event()
+        converters = [asyncio.create_task(convert_repeatedly(client, args.pdf, stop)) for _ in range(args.concurrency)]
+        # Give the first uploads a moment to reach the converter.
+        await asyncio.sleep(1.0)
+        busy = await sample_latencies(client, args.probe_path, args.duration, args.interval)
+        stop.set()
+        converted = sum(await asyncio.gather(*converters))
+
+    print(f"probe: {args.probe_path}  conversions completed: {converted}")
+    summarize("idle", idle)
+    summarize("during conversion", busy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", help="PDF to upload repeatedly")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--probe-path", default="/performance/timeseries?steps=10")
+    parser.add_argument("--concurrency", type=int, default=2, help="Concurrent PDF uploads")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to sample each phase")
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between probe requests")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Compare the extractive QA inference backends (torch, onnx, onnx-int8) on
+CPU for accuracy and latency.
+
+The document is chunked into passages the way /index does it. Each backend
+then embeds the passages, embeds the questions, and runs the reader over the
+top-k passages of every question. Every backend is compared with torch:
+  - embedding agreement (cosine similarity of passage and query vectors),
+  - retrieval agreement (overlap of the top-k passages),
+  - reader agreement (same best answer text).
+The script also prints load time and per-stage latency.
+
+Usage (from the backend directory):
+    python scripts/bench_qa_backends.py converted.md --questions questions.txt --repeat 3
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.passages import split_markdown  # noqa: E402
+from utils.qa_models import QAModels, QA_RETRIEVER_TOP_K  # noqa: E402
+from utils.qa_onnx import INFERENCE_BACKENDS  # noqa: E402
+from utils.corpus_index import top_k_rows  # noqa: E402
+
+from haystack import Document  # noqa: E402
+
+DEFAULT_QUESTIONS = [
+    "What is the fund size?",
+    "What is the vintage year?",
+    "What is the net IRR?",
+    "What is the DPI?",
+    "Who are the key persons?",
+    "What is the management fee?",
+    "What is the carried interest?",
+    "What is the investment period?",
+]
+
+
+def best_answer(answers):
+    for answer in answers:
+        if answer.data:
+            return answer.data.strip()
+    return None
+
+
+def run_backend(backend, passages, questions, top_k, repeat):
+    started = time.perf_counter()
+    models = QAModels(backend=backend).load()
+    load_seconds = time.perf_counter() - started
+
+    embed_times, query_times, reader_times = [], [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        documents = models.embed_documents([Document(content=text) for text in passages])
+        embed_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        queries = models.embed_queries(questions)
+        query_times.append(time.perf_counter() - started)
+
+        matrix = np.asarray([d.embedding for d in documents], dtype=np.float32)
+        best = top_k_rows(queries @ matrix.T, top_k)
+        started = time.perf_counter()
+        answers = models.read_many(questions, [[documents[j] for j in row] for row in best], top_k=1)
+        reader_times.append(time.perf_counter() - started)
+
+    return {
+        "load": load_seconds,
+        "embed": statistics.median(embed_times),
+        "query": statistics.median(query_times),
+        "reader": statistics.median(reader_times),
+        "passage_vectors": matrix,
+        "query_vectors": queries,
+        "retrieved": [set(row) for row in best],
+        "answers": [best_answer(a) for a in answers],
+    }
+
+
+def cosine(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("markdown", help="Markdown of a converted document (e.g. from /process_pdf)")
+    parser.add_argument("--questions", help="Text file with one question per line")
+    parser.add_argument("--backends", nargs="+", default=list(INFERENCE_BACKENDS), choices=INFERENCE_BACKENDS)
+    parser.add_argument("--top-k", type=int, default=QA_RETRIEVER_TOP_K)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.markdown) as f:
+        passages = [p["content"] for p in split_markdown(f.read())]
+    if args.questions:
+        with open(args.questions) as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        questions = DEFAULT_QUESTIONS
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    print(f"{len(passages)} passages, {len(questions)} questions, top_k={args.top_k}, repeat={args.repeat}")
+
+    results = {}
+    for backend in backends:
+        results[backend] = run_backend(backend, passages, questions, args.top_k, args.repeat)
+
+    baseline = results["torch"]
+    print(f"\n{'backend':<10} {'load s':>8} {'embed s':>8} {'psg/s':>8} {'query s':>8} {'reader s':>9} {'q/s':>7}")
+    for backend, r in results.items():
+        print(
+            f"{backend:<10} {r['load']:>8.2f} {r['embed']:>8.3f} {len(passages) / r['embed']:>8.1f} "
+            f"{r['query']:>8.3f} {r['reader']:>9.3f} {len(questions) / (r['query'] + r['reader']):>7.2f}"
+        )
+
+    print(f"\n{'backend':<10} {'cos psg':>8} {'cos min':>8} {'cos q':>8} {'top-k overlap':>14} {'same answer':>12}")
+    for backend, r in results.items():
+        if backend == "torch":
+            continue
+        passage_cos = cosine(baseline["passage_vectors"], r["passage_vectors"])
+        query_cos = cosine(baseline["query_vectors"], r["query_vectors"])
+        overlap = statistics.mean(
+            len(a & b) / max(len(a), 1) for a, b in zip(baseline["retrieved"], r["retrieved"])
+        )
+        same = statistics.mean(a == b for a, b in zip(baseline["answers"], r["answers"]))
+        print(
+            f"{backend:<10} {passage_cos.mean():>8.4f} {passage_cos.min():>8.4f} {query_cos.mean():>8.4f} "
+            f"{overlap:>14.2%} {same:>12.2%}"
+        )
+        print(f"  speedup vs torch: embed {baseline['embed'] / r['embed']:.2f}x, reader {baseline['reader'] / r['reader']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
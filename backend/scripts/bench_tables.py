@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Compare the full docling pipeline with the tables-only profile used by
+/data-extraction/tables on a directory of sample PDFs.
+
+Each converter is built once (init time reported separately), then every PDF
+is converted `--repeat` times per pipeline. Prints per-document timings, the
+number of tables each pipeline found, and the overall speedup.
+
+Usage (from the backend directory):
+    python scripts/bench_tables.py path/to/sample_pdfs --repeat 3
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.docling_pool import _build_converter_timed, conversion_payload, merge_payloads, parse_page_ranges  # noqa: E402
+
+PROFILES = ("default", "tables")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="Directory containing sample PDFs")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pages", default=None, help='Restrict the tables profile to pages, e.g. "1-5,9-10" (one conversion per range)')
+    args = parser.parse_args()
+
+    pdfs = sorted(glob.glob(os.path.join(args.corpus, "*.pdf")))
+    if not pdfs:
+        parser.error(f"no PDFs found in {args.corpus}")
+
+    converters = {}
+    for profile in PROFILES:
+        converters[profile], init_seconds = _build_converter_timed(profile)
+        print(f"init {profile:<8} {init_seconds:8.2f}s")
+
+    page_ranges = parse_page_ranges(args.pages) if args.pages else None
+
+    totals = {profile: [] for profile in PROFILES}
+    print(f"\n{'document':<40} {'default s':>10} {'tables s':>10} {'speedup':>8} {'#tables':>9}")
+    for path in pdfs:
+        medians = {}
+        counts = {}
+        for profile in PROFILES:
+            # Like /data-extraction/tables, convert each selected range separately.
+            ranges = page_ranges if page_ranges and profile == "tables" else [None]
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                payload = merge_payloads([
+                    conversion_payload(converters[profile].convert(path, **({"page_range": r} if r else {})), profile)
+                    for r in ranges
+                ])
+                timings.append(time.perf_counter() - started)
+            medians[profile] = statistics.median(timings)
+            counts[profile] = len(payload["tables"])
+            totals[profile].append(medians[profile])
+        name = os.path.basename(path)[:40]
+        speedup = medians["default"] / medians["tables"] if medians["tables"] else float("inf")
+        print(
+            f"{name:<40} {medians['default']:10.2f} {medians['tables']:10.2f} {speedup:7.2f}x "
+            f"{counts['default']:>4}/{counts['tables']:<4}"
+        )
+
+    total_default = sum(totals["default"])
+    total_tables = sum(totals["tables"])
+    print(f"\ntotal (median per doc): default {total_default:.2f}s, tables {total_tables:.2f}s, "
+          f"speedup {total_default / total_tables:.2f}x over {len(pdfs)} documents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Add every persisted per-document QA index to the corpus index, reusing the
+stored embeddings (nothing is re-embedded). Documents indexed after the
+corpus index was introduced are added automatically; this backfills older
+ones, or rebuilds the corpus from scratch with --rebuild.
+
+Usage (from the backend directory):
+    python scripts/build_corpus_index.py [--rebuild] [--compact]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.corpus_index import corpus_index  # noqa: E402
+from utils.qa_index import add_to_corpus, document_index, index_settings  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="Clear the corpus index first")
+    parser.add_argument("--compact", action="store_true", help="Drop rows of removed documents afterwards")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        corpus_index.clear()
+    started = time.perf_counter()
+    added = skipped = 0
+    names = sorted(os.listdir(document_index.directory)) if os.path.isdir(document_index.directory) else []
+    for doc_id in names:
+        if doc_id.startswith(".") or not document_index.exists(doc_id, index_settings()):
+            continue
+        if corpus_index.contains(doc_id):
+            skipped += 1
+            continue
+        add_to_corpus(doc_id)
+        added += 1
+        print(f"added {doc_id}")
+    if args.compact:
+        corpus_index.compact()
+    print(f"{added} added, {skipped} already present in {time.perf_counter() - started:.1f}s")
+    print(corpus_index.stats())
+
+
+if __name__ == "__main__":
+    main()
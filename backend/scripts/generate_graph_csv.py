@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic relationship graph of any size as CSV files for
+`neo4j-admin database import full`, for load-testing the relationships
+endpoints.
+
+The output is deterministic for a given --seed and --scale. At scale 1 the
+graph has 10k people, 1k organizations, 5k deals and 200 schools; every
+count grows linearly with --scale. Degrees are heavy-tailed: organization
+size, investor activity, school popularity and deal popularity follow Pareto
+weights, and the number of deals per person follows a Zipf law. A few deals
+and people therefore act as hubs, and so does the co-investment graph derived
+from shared deals (CO_INVESTED_WITH, one edge per kept pair, like
+populate_neo4j). Rows are generated and written in chunks, so memory stays
+bounded apart from the INVOLVED_IN index used to pair co-investors.
+
+The node and relationship files match the schema of populate_neo4j.py.
+Import them into an empty database with the command the script prints (also
+saved as import.sh):
+    python scripts/generate_graph_csv.py --scale 100 --out /tmp/graph_csv
+    sh /tmp/graph_csv/import.sh
+"""
+
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+
+BASE_COUNTS = {"Person": 10_000, "Organization": 1_000, "Deal": 5_000, "School": 200}
+
+# Stable UUID-shaped ids derived from (label, index), so relationships can
+# reference nodes without keeping their ids in memory.
+LABEL_CODES = {"Person": 1, "Organization": 2, "Deal": 3, "School": 4}
+
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+               "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Wei", "Priya",
+               "Carlos", "Sofia", "Hiroshi", "Amara", "Lars", "Ingrid", "Omar", "Fatima", "Luca", "Chiara"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+              "Chen", "Patel", "Kim", "Nguyen", "Müller", "Rossi", "Tanaka", "Silva", "Okafor", "Larsen",
+              "Cohen", "Dubois", "Novak", "Haddad", "Kowalski", "O'Brien", "Schmidt", "Singh", "Ivanov", "Costa"]
+COMPANY_WORDS = ["Summit", "Harbor", "Granite", "Northwind", "Blue Ridge", "Crescent", "Atlas", "Meridian", "Sterling",
+                 "Evergreen", "Pioneer", "Beacon", "Redwood", "Keystone", "Horizon", "Ironbridge", "Silverlake", "Oakmont"]
+COMPANY_SUFFIXES = ["Capital", "Partners", "Holdings", "Group", "Ventures", "Advisors", "Equity", "Investments"]
+CITIES = ["New York", "London", "Boston", "San Francisco", "Chicago", "Paris", "Frankfurt", "Hong Kong", "Singapore",
+          "Tokyo", "Toronto", "Stockholm", "Zurich", "Sydney", "Dubai", "Mumbai"]
+TITLES = ["Managing Director", "Partner", "Associate", "Principal"]
+SOURCES = ["internal_db", "external_provider", "manual_entry"]
+ORG_TYPES = ["PE Firm", "VC Firm", "Investment Bank", "Asset Manager"]
+SECTORS = ["Technology", "Healthcare", "Finance", "Consumer", "Energy", "Industrial"]
+SCHOOL_TYPES = ["Business School", "University", "College"]
+WORK_ROLES = ["Analyst", "Associate", "Principal", "Director", "Partner"]
+DEAL_ROLES = ["Lead", "Co-Lead", "Board Member"]
+DEGREES = ["MBA", "BSc", "BA", "PhD"]
+NOTES = ["Strong performance", "Moderate performance", "Underperformed"]
+
+EPOCH = np.datetime64("2000-01-01")
+TODAY = np.datetime64("2025-01-01")
+
+
+def node_ids(label, indexes):
+    code = LABEL_CODES[label]
+    return [f"{code:08x}-0000-4000-8000-{i:012x}" for i in indexes.tolist()]
+
+
+def iso_dates(days):
+    return (EPOCH + days.astype("timedelta64[D]")).astype(str)
+
+
+def pareto_weights(rng, n, alpha):
+    """Popularity weights with a heavy tail (a few nodes get most of the edges)."""
+    weights = rng.pareto(alpha, n) + 1.0
+    return weights / weights.sum()
+
+
+class CsvOut:
+    """One import file with its neo4j-admin header; counts rows as they are written."""
+
+    def __init__(self, directory, name, header):
+        self.path = os.path.join(directory, name)
+        self.file = open(self.path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(header)
+        self.rows = 0
+
+    def write(self, columns):
+        rows = list(zip(*columns))
+        self.writer.writerows(rows)
+        self.rows += len(rows)
+
+    def close(self):
+        self.file.close()
+
+
+def chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(start + size, total)
+
+
+def generate(out_dir, scale, seed, chunk_rows, coinvest_probability, max_team):
+    rng = np.random.default_rng(seed)
+    counts = {label: max(1, int(round(base * scale))) for label, base in BASE_COUNTS.items()}
+    os.makedirs(out_dir, exist_ok=True)
+    files = {}
+
+    def out(name, header):
+        files[name] = CsvOut(out_dir, name, header)
+        return files[name]
+
+    def pick(values, n):
+        return np.asarray(values, dtype=object)[rng.integers(0, len(values), n)]
+
+    # A previous run's import.sh must not point at files that are being rewritten.
+    import_script = os.path.join(out_dir, "import.sh")
+    if os.path.exists(import_script):
+        os.remove(import_script)
+    try:
+        now = str(TODAY) + "T00:00:00"
+
+        # --- Nodes ---
+        people = out("people.csv", ["personId:ID(Person)", "fullName", "primaryTitle", "sourceOfData", "createdAt", "updatedAt"])
+        for start, end in chunks(counts["Person"], chunk_rows):
+            n = end - start
+            names = pick(FIRST_NAMES, n) + " " + pick(LAST_NAMES, n)
+            people.write([node_ids("Person", np.arange(start, end)), names, pick(TITLES, n), pick(SOURCES, n), [now] * n, [now] * n])
+
+        orgs = out("organizations.csv", ["orgId:ID(Organization)", "name", "type", "location", "foundedYear:int"])
+        for start, end in chunks(counts["Organization"], chunk_rows):
+            n = end - start
+            names = pick(COMPANY_WORDS, n) + " " + pick(COMPANY_SUFFIXES, n)
+            orgs.write([node_ids("Organization", np.arange(start, end)), names, pick(ORG_TYPES, n), pick(CITIES, n),
+                        rng.integers(1970, 2024, n)])
+
+        deal_days = rng.integers(0, (TODAY - EPOCH).astype(int), counts["Deal"])
+        deals = out("deals.csv", ["dealId:ID(Deal)", "name", "dealDate", "sector", "dealSize:float"])
+        metrics = out("deal_metrics.csv", ["dealId:ID(DealMetrics)", "entryDate", "exitDate", "IRR:float", "MOIC:float", "multiple:float", "notes"])
+        has_metrics = out("has_metrics.csv", [":START_ID(Deal)", ":END_ID(DealMetrics)"])
+        for start, end in chunks(counts["Deal"], chunk_rows):
+            n = end - start
+            ids = node_ids("Deal", np.arange(start, end))
+            names = pick(COMPANY_WORDS, n) + " " + pick(COMPANY_SUFFIXES, n) + " Acquisition"
+            # Deal sizes are log-normal: many small deals, a few very large ones.
+            sizes = np.round(np.clip(rng.lognormal(4.5, 1.2, n), 10.0, 20000.0), 2)
+            deals.write([ids, names, iso_dates(deal_days[start:end]), pick(SECTORS, n), sizes])
+            keep = np.flatnonzero(rng.random(n) < 0.7)
+            entry = deal_days[start:end][keep]
+            exit_days = entry + rng.integers(180, 3650, len(keep))
+            metric_ids = [ids[i] for i in keep.tolist()]
+            metrics.write([metric_ids, iso_dates(entry), iso_dates(np.minimum(exit_days, (TODAY - EPOCH).astype(int))),
+                           np.round(rng.uniform(-0.2, 0.5, len(keep)), 2), np.round(rng.uniform(0.5, 5.0, len(keep)), 2),
+                           np.round(rng.uniform(0.5, 5.0, len(keep)), 2), pick(NOTES, len(keep))])
+            has_metrics.write([metric_ids, metric_ids])
+
+        schools = out("schools.csv", ["schoolId:ID(School)", "name", "type", "location"])
+        for start, end in chunks(counts["School"], chunk_rows):
+            n = end - start
+            schools.write([node_ids("School", np.arange(start, end)), pick(COMPANY_WORDS, n) + " University",
+                           pick(SCHOOL_TYPES, n), pick(CITIES, n)])
+
+        # --- Relationships ---
+        org_weights = pareto_weights(rng, counts["Organization"], 1.2)
+        investor_weights = pareto_weights(rng, counts["Organization"], 1.1)
+        deal_weights = pareto_weights(rng, counts["Deal"], 1.5)
+        school_weights = pareto_weights(rng, counts["School"], 1.0)
+        span = (TODAY - EPOCH).astype(int)
+
+        works_at = out("works_at.csv", [":START_ID(Person)", ":END_ID(Organization)", "role", "startDate", "endDate"])
+        involved_in = out("involved_in.csv", [":START_ID(Person)", ":END_ID(Deal)", "role", "startDate"])
+        educated_at = out("educated_at.csv", [":START_ID(Person)", ":END_ID(School)", "degree", "startDate", "endDate"])
+        involved_person, involved_deal = [], []
+        for start, end in chunks(counts["Person"], chunk_rows):
+            n = end - start
+            person_index = np.arange(start, end)
+
+            # One employer each, a second one for 20%; big firms employ most people.
+            jobs = np.concatenate([person_index, person_index[rng.random(n) < 0.2]])
+            job_start = rng.integers(0, span, len(jobs))
+            ended = rng.random(len(jobs)) < 0.5
+            job_end = np.where(ended, job_start + rng.integers(1, 3650, len(jobs)), -1)
+            end_dates = np.where(job_end >= 0, iso_dates(np.clip(job_end, 0, span)), "")
+            works_at.write([node_ids("Person", jobs), node_ids("Organization", rng.choice(len(org_weights), len(jobs), p=org_weights)),
+                            pick(WORK_ROLES, len(jobs)), iso_dates(job_start), end_dates])
+
+            # Deals per person follow a Zipf law; popular deals attract most participants.
+            per_person = np.minimum(rng.zipf(2.2, n), 100)
+            participants = np.repeat(person_index, per_person)
+            chosen = rng.choice(len(deal_weights), len(participants), p=deal_weights)
+            # Sampling with replacement can pick the same deal twice for a person;
+            # keep one INVOLVED_IN per pair, as populate_neo4j's MERGE does.
+            pairs = np.unique(participants.astype(np.int64) * len(deal_weights) + chosen)
+            participants, chosen = np.divmod(pairs, len(deal_weights))
+            involved_in.write([node_ids("Person", participants), node_ids("Deal", chosen), pick(DEAL_ROLES, len(participants)),
+                               iso_dates(deal_days[chosen])])
+            involved_person.append(participants.astype(np.int64))
+            involved_deal.append(chosen.astype(np.int64))
+
+            educated = person_index[rng.random(n) < 0.5]
+            study_start = rng.integers(0, span // 2, len(educated))
+            educated_at.write([node_ids("Person", educated), node_ids("School", rng.choice(len(school_weights), len(educated), p=school_weights)),
+                               pick(DEGREES, len(educated)), iso_dates(study_start), iso_dates(study_start + rng.integers(365, 2190, len(educated)))])
+
+        invested_in = out("invested_in.csv", [":START_ID(Organization)", ":END_ID(Deal)", "amount:float", "ownershipShare:float", "date"])
+        for start, end in chunks(counts["Deal"], chunk_rows):
+            n = end - start
+            deal_index = np.arange(start, end)
+            investors = np.repeat(deal_index, 1 + rng.poisson(0.5, n))
+            invested_in.write([node_ids("Organization", rng.choice(len(investor_weights), len(investors), p=investor_weights)),
+                               node_ids("Deal", investors), np.round(rng.uniform(1.0, 1000.0, len(investors)), 2),
+                               np.round(rng.uniform(0.01, 0.5, len(investors)), 2), iso_dates(deal_days[investors])])
+
+        # CO_INVESTED_WITH: pairs of people on the same deal, each pair kept with
+        # `coinvest_probability`. Very large deal teams are sampled down to
+        # `max_team` people so one hub deal cannot dominate the output.
+        co_invested = out("co_invested_with.csv", [":START_ID(Person)", ":END_ID(Person)", "dealId", "date"])
+        persons = np.concatenate(involved_person)
+        deals_of = np.concatenate(involved_deal)
+        order = np.argsort(deals_of, kind="stable")
+        persons, deals_of = persons[order], deals_of[order]
+        boundaries = np.flatnonzero(np.diff(deals_of)) + 1
+        starts = np.concatenate([[0], boundaries])
+        ends = np.concatenate([boundaries, [len(deals_of)]])
+        pending_a, pending_b, pending_deal = [], [], []
+        pending = 0
+        for lo, hi in zip(starts.tolist(), ends.tolist()):
+            team = np.unique(persons[lo:hi])
+            if len(team) < 2:
+                continue
+            if len(team) > max_team:
+                team = np.sort(rng.choice(team, max_team, replace=False))
+            i, j = np.triu_indices(len(team), 1)
+            keep = rng.random(len(i)) < coinvest_probability
+            if not keep.any():
+                continue
+            pending_a.append(team[i[keep]])
+            pending_b.append(team[j[keep]])
+            pending_deal.append(np.full(int(keep.sum()), deals_of[lo]))
+            pending += int(keep.sum())
+            if pending >= chunk_rows:
+                _write_pairs(co_invested, rng, pending_a, pending_b, pending_deal, span)
+                pending_a, pending_b, pending_deal, pending = [], [], [], 0
+        if pending:
+            _write_pairs(co_invested, rng, pending_a, pending_b, pending_deal, span)
+    except BaseException:
+        # Leave no partial files behind.
+        for f in files.values():
+            f.close()
+            os.remove(f.path)
+        raise
+    for f in files.values():
+        f.close()
+    return counts, files
+
+
+def _write_pairs(out, rng, a, b, deal, span):
+    a, b, deal = np.concatenate(a), np.concatenate(b), np.concatenate(deal)
+    out.write([node_ids("Person", a), node_ids("Person", b), node_ids("Deal", deal),
+               iso_dates(rng.integers(span - 5 * 365, span, len(a)))])
+
+
+IMPORT_FILES = [
+    ("nodes", "Person", "people.csv"),
+    ("nodes", "Organization", "organizations.csv"),
+    ("nodes", "Deal", "deals.csv"),
+    ("nodes", "DealMetrics", "deal_metrics.csv"),
+    ("nodes", "School", "schools.csv"),
+    ("relationships", "WORKS_AT", "works_at.csv"),
+    ("relationships", "INVOLVED_IN", "involved_in.csv"),
+    ("relationships", "INVESTED_IN", "invested_in.csv"),
+    ("relationships", "EDUCATED_AT", "educated_at.csv"),
+    ("relationships", "HAS_METRICS", "has_metrics.csv"),
+    ("relationships", "CO_INVESTED_WITH", "co_invested_with.csv"),
+]
+
+
+def import_command(out_dir, database):
+    args = [f"--{kind}={name}={os.path.join(os.path.abspath(out_dir), file)}" for kind, name, file in IMPORT_FILES]
+    return " \\\n  ".join(["neo4j-admin database import full", *args, "--overwrite-destination", database])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="Scale factor (1 = 10k people)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="graph_csv", help="Output directory")
+    parser.add_argument("--chunk-rows", type=int, default=200_000, help="Rows generated and written per chunk")
+    parser.add_argument("--coinvest-probability", type=float, default=0.3)
+    parser.add_argument("--max-team", type=int, default=200, help="Largest deal team paired for CO_INVESTED_WITH")
+    parser.add_argument("--database", default="neo4j")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts, files = generate(args.out, args.scale, args.seed, args.chunk_rows, args.coinvest_probability, args.max_team)
+    seconds = time.perf_counter() - started
+
+    for name, f in files.items():
+        print(f"{name:<24} {f.rows:>12} rows")
+    total = sum(f.rows for f in files.values())
+    print(f"{'total':<24} {total:>12} rows in {seconds:.1f}s ({total / seconds:.0f} rows/s)")
+
+    command = import_command(args.out, args.database)
+    with open(os.path.join(args.out, "import.sh"), "w") as f:
+        f.write(command + "\n")
+    print("\nImport with (Neo4j stopped):\n" + command)
+
+
+if __name__ == "__main__":
+    main()
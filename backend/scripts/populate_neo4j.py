@@ -1,70 +1,86 @@
 #!/usr/bin/env python3
 
+import argparse
+import os
 import random
+import sys
+import time
 from datetime import datetime, date
 from faker import Faker
 from neo4j import GraphDatabase
 
-NEO4J_URI = "bolt://localhost:7687"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.graph_meta import bump_graph_version  # noqa: E402
+
+NEO4J_URI = os.environ.get("NEO4J_URI", "bolt://localhost:7687")
+# Rows per UNWIND transaction in --bulk mode.
+BULK_BATCH_SIZE = int(os.environ.get("NEO4J_BULK_BATCH_SIZE", "5000"))
+# Deals handled per transaction when building CO_INVESTED_WITH edges.
+CO_INVEST_DEALS_PER_TX = int(os.environ.get("NEO4J_CO_INVEST_DEALS_PER_TX", "500"))
 fake = Faker()
 
-def generate_fake_person_data(num_people=10):
-    people = []
+def iter_fake_person_data(num_people=10):
     for _ in range(num_people):
         p_id = fake.uuid4()
         now = datetime.now().isoformat()
-        people.append({
+        yield {
             "personId": p_id,
             "fullName": fake.name(),
             "primaryTitle": random.choice(["Managing Director", "Partner", "Associate", "Principal"]),
             "sourceOfData": random.choice(["internal_db", "external_provider", "manual_entry"]),
             "createdAt": now,
             "updatedAt": now
-        })
-    return people
+        }
 
-def generate_fake_org_data(num_orgs=5):
+def generate_fake_person_data(num_people=10):
+    return list(iter_fake_person_data(num_people))
+
+def iter_fake_org_data(num_orgs=5):
     org_types = ["PE Firm", "VC Firm", "Investment Bank", "Asset Manager"]
-    orgs = []
     for _ in range(num_orgs):
         org_id = fake.uuid4()
-        orgs.append({
+        yield {
             "orgId": org_id,
             "name": fake.company(),
             "type": random.choice(org_types),
             "location": fake.city(),
             "foundedYear": random.randint(1970, 2023)
-        })
-    return orgs
+        }
 
-def generate_fake_deal_data(num_deals=5):
+def generate_fake_org_data(num_orgs=5):
+    return list(iter_fake_org_data(num_orgs))
+
+def iter_fake_deal_data(num_deals=5):
     sectors = ["Technology", "Healthcare", "Finance", "Consumer", "Energy", "Industrial"]
-    deals = []
     for _ in range(num_deals):
         d_id = fake.uuid4()
         # Store date as ISO (YYYY-MM-DD)
         deal_date = fake.date_between(start_date="-10y", end_date="today").isoformat()
-        deals.append({
+        yield {
             "dealId": d_id,
             "name": f"{fake.company()} Acquisition",
             "dealDate": deal_date,
             "sector": random.choice(sectors),
             "dealSize": round(random.uniform(10.0, 2000.0), 2)
-        })
-    return deals
+        }
 
-def generate_fake_school_data(num_schools=3):
+def generate_fake_deal_data(num_deals=5):
+    return list(iter_fake_deal_data(num_deals))
+
+def iter_fake_school_data(num_schools=3):
     school_types = ["Business School", "University", "College"]
-    schools = []
     for _ in range(num_schools):
         s_id = fake.uuid4()
-        schools.append({
+        yield {
             "schoolId": s_id,
             "name": fake.company() + " University",
             "type": random.choice(school_types),
             "location": fake.city()
-        })
-    return schools
+        }
+
+def generate_fake_school_data(num_schools=3):
+    return list(iter_fake_school_data(num_schools))
 
 def generate_fake_deal_metrics(deal_id):
     entry_date = fake.date_between(start_date="-5y", end_date="-2y")
@@ -84,6 +100,40 @@ def generate_fake_deal_metrics(deal_id):
         "notes": notes
     }
 
+# Set-based CO_INVESTED_WITH construction, entirely server side.
+# INVOLVED_IN edges are marked with coInvestIndexed once paired. An
+# incremental run ($full = false) therefore only visits deals with unmarked
+# edges, and only pairs that include a newly involved person. Every pair is
+# kept with $probability and created once, pointing from the lower to the
+# higher personId. Deals are processed in batches of $deals_per_tx per
+# transaction.
+BUILD_CO_INVESTED_WITH_QUERY = """
+MATCH (:Person)-[pending:INVOLVED_IN]->(d:Deal)
+WHERE $full OR pending.coInvestIndexed IS NULL
+WITH DISTINCT d
+CALL {
+  WITH d
+  CALL {
+    WITH d
+    MATCH (d)<-[r:INVOLVED_IN]-(p:Person)
+    WITH d, p, max(CASE WHEN $full OR r.coInvestIndexed IS NULL THEN 1 ELSE 0 END) = 1 AS isNew
+    WITH d, collect({person: p, isNew: isNew}) AS members
+    WITH d, members, toString(date() - duration({days: toInteger(rand() * 1825)})) AS date
+    UNWIND members AS m1
+    UNWIND members AS m2
+    WITH d, date, m1, m2
+    WHERE m1.person.personId < m2.person.personId AND (m1.isNew OR m2.isNew) AND rand() < $probability
+    WITH d, date, m1.person AS a, m2.person AS b
+    MERGE (a)-[c:CO_INVESTED_WITH { dealId: d.dealId }]->(b)
+    ON CREATE SET c.date = date
+    RETURN count(*) AS pairs
+  }
+  MATCH (d)<-[r:INVOLVED_IN]-(:Person)
+  WHERE r.coInvestIndexed IS NULL
+  SET r.coInvestIndexed = true
+} IN TRANSACTIONS OF $deals_per_tx ROWS
+"""
+
 class Neo4jInserter:
     def __init__(self, uri):
         # Connect with auth disabled (auth=None)
@@ -92,6 +142,31 @@ class Neo4jInserter:
     def close(self):
         self.driver.close()
 
+    def bump_graph_version(self):
+        """Invalidate cached graph snapshots served by the backend."""
+        with self.driver.session() as session:
+            return bump_graph_version(session)
+
+    def flush(self):
+        """Writes are immediate; kept for parity with Neo4jBulkLoader."""
+
+    def build_co_invested_with(self, probability=0.3, full=False, deals_per_tx=CO_INVEST_DEALS_PER_TX):
+        """
+        Create CO_INVESTED_WITH edges between people involved in the same deal
+        in one server-side statement (no per-pair round trips). Incremental
+        by default: only INVOLVED_IN edges added since the last run are paired.
+        Returns the number of relationships created.
+        """
+        started = time.perf_counter()
+        with self.driver.session() as session:
+            summary = session.run(
+                BUILD_CO_INVESTED_WITH_QUERY, full=full, probability=probability, deals_per_tx=deals_per_tx
+            ).consume()
+        created = summary.counters.relationships_created
+        print(f"CO_INVESTED_WITH: {created} relationships created in {time.perf_counter() - started:.2f}s"
+              f" ({'full' if full else 'incremental'}).")
+        return created
+
     def create_constraints(self):
         with self.driver.session() as session:
             session.run("CREATE CONSTRAINT IF NOT EXISTS FOR (p:Person) REQUIRE p.personId IS UNIQUE")
@@ -284,6 +359,158 @@ class Neo4jInserter:
                 date=date
             )
 
+# One UNWIND query per entity / relationship type; they mirror the
+# per-row MERGEs of Neo4jInserter. Kinds are flushed in this order, so the
+# nodes a relationship batch MATCHes have always been written first.
+BULK_QUERIES = {
+    "Person": """
+        UNWIND $rows AS row
+        MERGE (p:Person { personId: row.personId })
+        ON CREATE SET p.createdAt = row.createdAt
+        SET p.fullName = row.fullName,
+            p.primaryTitle = row.primaryTitle,
+            p.sourceOfData = row.sourceOfData,
+            p.updatedAt = row.updatedAt
+        """,
+    "Organization": """
+        UNWIND $rows AS row
+        MERGE (o:Organization { orgId: row.orgId })
+        SET o.name = row.name, o.type = row.type, o.location = row.location, o.foundedYear = row.foundedYear
+        """,
+    "Deal": """
+        UNWIND $rows AS row
+        MERGE (d:Deal { dealId: row.dealId })
+        SET d.name = row.name, d.dealDate = row.dealDate, d.sector = row.sector, d.dealSize = row.dealSize
+        """,
+    "School": """
+        UNWIND $rows AS row
+        MERGE (s:School { schoolId: row.schoolId })
+        SET s.name = row.name, s.type = row.type, s.location = row.location
+        """,
+    "DealMetrics": """
+        UNWIND $rows AS row
+        MERGE (dm:DealMetrics { dealId: row.dealId })
+        SET dm.entryDate = row.entryDate, dm.exitDate = row.exitDate, dm.IRR = row.IRR,
+            dm.MOIC = row.MOIC, dm.multiple = row.multiple, dm.notes = row.notes
+        WITH dm, row
+        MATCH (d:Deal { dealId: row.dealId })
+        MERGE (d)-[:HAS_METRICS]->(dm)
+        """,
+    "WORKS_AT": """
+        UNWIND $rows AS row
+        MATCH (p:Person { personId: row.personId })
+        MATCH (o:Organization { orgId: row.orgId })
+        MERGE (p)-[r:WORKS_AT { role: row.role, startDate: row.startDate }]->(o)
+        FOREACH (_ IN CASE WHEN row.endDate IS NULL THEN [] ELSE [1] END | SET r.endDate = row.endDate)
+        """,
+    "INVOLVED_IN": """
+        UNWIND $rows AS row
+        MATCH (p:Person { personId: row.personId })
+        MATCH (d:Deal { dealId: row.dealId })
+        MERGE (p)-[r:INVOLVED_IN { role: row.role, startDate: row.startDate }]->(d)
+        FOREACH (_ IN CASE WHEN row.endDate IS NULL THEN [] ELSE [1] END | SET r.endDate = row.endDate)
+        """,
+    "INVESTED_IN": """
+        UNWIND $rows AS row
+        MATCH (o:Organization { orgId: row.orgId })
+        MATCH (d:Deal { dealId: row.dealId })
+        MERGE (o)-[r:INVESTED_IN { amount: row.amount, ownershipShare: row.ownershipShare, date: row.date }]->(d)
+        """,
+    "EDUCATED_AT": """
+        UNWIND $rows AS row
+        MATCH (p:Person { personId: row.personId })
+        MATCH (s:School { schoolId: row.schoolId })
+        MERGE (p)-[r:EDUCATED_AT { degree: row.degree, startDate: row.startDate, endDate: row.endDate }]->(s)
+        """,
+    "CO_INVESTED_WITH": """
+        UNWIND $rows AS row
+        MATCH (pA:Person { personId: row.personIdA })
+        MATCH (pB:Person { personId: row.personIdB })
+        MERGE (pA)-[r:CO_INVESTED_WITH { dealId: row.dealId, date: row.date }]->(pB)
+        """,
+}
+BULK_KINDS = list(BULK_QUERIES)
+
+class Neo4jBulkLoader(Neo4jInserter):
+    """
+    Drop-in replacement for Neo4jInserter that buffers rows per entity /
+    relationship type and writes each buffer as one `UNWIND $rows ... MERGE`
+    transaction of `batch_size` rows, instead of one session and round trip
+    per row. Call flush() before reading back what was written, and report()
+    for per-type throughput.
+    """
+
+    def __init__(self, uri, batch_size=BULK_BATCH_SIZE):
+        super().__init__(uri)
+        self.batch_size = batch_size
+        self.buffers = {kind: [] for kind in BULK_KINDS}
+        self.rows = {kind: 0 for kind in BULK_KINDS}
+        self.seconds = {kind: 0.0 for kind in BULK_KINDS}
+        self.started = time.perf_counter()
+
+    def add(self, kind, row):
+        buffer = self.buffers[kind]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush(kind)
+
+    def _write(self, kind):
+        rows = self.buffers[kind]
+        if not rows:
+            return
+        self.buffers[kind] = []
+        started = time.perf_counter()
+        with self.driver.session() as session:
+            session.execute_write(lambda tx: tx.run(BULK_QUERIES[kind], rows=rows).consume())
+        self.seconds[kind] += time.perf_counter() - started
+        self.rows[kind] += len(rows)
+
+    def flush(self, kind=None):
+        """Write buffered rows of `kind` (and of every kind it depends on), or of all kinds."""
+        last = BULK_KINDS.index(kind) if kind is not None else len(BULK_KINDS) - 1
+        for earlier in BULK_KINDS[:last + 1]:
+            self._write(earlier)
+
+    def report(self):
+        self.flush()
+        total_rows = sum(self.rows.values())
+        elapsed = time.perf_counter() - self.started
+        for kind in BULK_KINDS:
+            if self.rows[kind]:
+                rate = self.rows[kind] / self.seconds[kind] if self.seconds[kind] else float("inf")
+                print(f"{kind:<18} {self.rows[kind]:>10} rows  {self.seconds[kind]:>8.2f}s write  {rate:>10.0f} rows/s")
+        print(f"{'total':<18} {total_rows:>10} rows  {elapsed:>8.2f}s wall   {total_rows / elapsed if elapsed else 0:>10.0f} rows/s")
+
+    def insert_person(self, person):
+        self.add("Person", person)
+
+    def insert_organization(self, org):
+        self.add("Organization", org)
+
+    def insert_deal(self, deal):
+        self.add("Deal", deal)
+
+    def insert_school(self, school):
+        self.add("School", school)
+
+    def insert_deal_metrics(self, metrics):
+        self.add("DealMetrics", metrics)
+
+    def create_works_at_relationship(self, personId, orgId, startDate, role, endDate=None):
+        self.add("WORKS_AT", {"personId": personId, "orgId": orgId, "startDate": startDate, "role": role, "endDate": endDate})
+
+    def create_involved_in_relationship(self, personId, dealId, role, startDate, endDate=None):
+        self.add("INVOLVED_IN", {"personId": personId, "dealId": dealId, "role": role, "startDate": startDate, "endDate": endDate})
+
+    def create_invested_in_relationship(self, orgId, dealId, amount, ownershipShare, date):
+        self.add("INVESTED_IN", {"orgId": orgId, "dealId": dealId, "amount": amount, "ownershipShare": ownershipShare, "date": date})
+
+    def create_educated_at_relationship(self, personId, schoolId, degree, startDate, endDate=None):
+        self.add("EDUCATED_AT", {"personId": personId, "schoolId": schoolId, "degree": degree, "startDate": startDate, "endDate": endDate})
+
+    def create_co_invested_with_relationship(self, personIdA, personIdB, dealId, date):
+        self.add("CO_INVESTED_WITH", {"personIdA": personIdA, "personIdB": personIdB, "dealId": dealId, "date": date})
+
 def connect_data(inserter, people, orgs, deals, schools):
     # (1) Person -> Organization
     for p in people:
@@ -382,50 +609,58 @@ def connect_data(inserter, people, orgs, deals, schools):
                 end_date_obj.isoformat()
             )
 
-    # (5) CO_INVESTED_WITH: For each deal, get all involved persons and create some pairwise edges
-    with inserter.driver.session() as session:
-        result = session.run("""
-            MATCH (p:Person)-[r:INVOLVED_IN]->(d:Deal)
-            RETURN d.dealId as dealId, collect(p.personId) as personIds
-        """)
-        for record in result:
-            deal_id = record["dealId"]
-            person_ids = record["personIds"]
-            if len(person_ids) > 1:
-                date_str = fake.date_between(start_date="-5y", end_date="today").isoformat()
-                for i in range(len(person_ids)):
-                    for j in range(i + 1, len(person_ids)):
-                        if random.random() < 0.3:
-                            inserter.create_co_invested_with_relationship(
-                                person_ids[i],
-                                person_ids[j],
-                                deal_id,
-                                date_str
-                            )
+    # (5) CO_INVESTED_WITH: pair up the people involved in each deal (only
+    # the INVOLVED_IN edges written since the last run), server side.
+    inserter.flush()
+    inserter.build_co_invested_with(probability=0.3)
 
 def main():
-    inserter = Neo4jInserter(NEO4J_URI)
+    parser = argparse.ArgumentParser(description="Populate Neo4j with fake relationship data.")
+    parser.add_argument("--people", type=int, default=10)
+    parser.add_argument("--orgs", type=int, default=5)
+    parser.add_argument("--deals", type=int, default=5)
+    parser.add_argument("--schools", type=int, default=3)
+    parser.add_argument("--bulk", action="store_true", help="Write batched UNWIND transactions instead of one MERGE per row")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="Rows per transaction with --bulk")
+    parser.add_argument("--co-invest-only", action="store_true",
+                        help="Only add CO_INVESTED_WITH edges for INVOLVED_IN edges that are not paired yet")
+    parser.add_argument("--co-invest-full", action="store_true",
+                        help="With --co-invest-only, re-pair every deal instead of only new INVOLVED_IN edges")
+    args = parser.parse_args()
+
+    inserter = Neo4jBulkLoader(NEO4J_URI, args.batch_size) if args.bulk else Neo4jInserter(NEO4J_URI)
     inserter.create_constraints()
 
-    people = generate_fake_person_data(10)
-    orgs = generate_fake_org_data(5)
-    deals = generate_fake_deal_data(5)
-    schools = generate_fake_school_data(3)
+    if args.co_invest_only:
+        inserter.build_co_invested_with(full=args.co_invest_full)
+        inserter.bump_graph_version()
+        inserter.close()
+        return
 
-    for p in people:
+    # Generated rows stream straight into the inserter; only the keys that
+    # connect_data needs are kept in memory.
+    people, orgs, deals, schools = [], [], [], []
+    for p in iter_fake_person_data(args.people):
         inserter.insert_person(p)
-    for o in orgs:
+        people.append({"personId": p["personId"]})
+    for o in iter_fake_org_data(args.orgs):
         inserter.insert_organization(o)
-    for d in deals:
+        orgs.append({"orgId": o["orgId"]})
+    for d in iter_fake_deal_data(args.deals):
         inserter.insert_deal(d)
+        deals.append({"dealId": d["dealId"], "dealDate": d["dealDate"]})
         if random.random() < 0.7:
             dm = generate_fake_deal_metrics(d["dealId"])
             inserter.insert_deal_metrics(dm)
-    for s in schools:
+    for s in iter_fake_school_data(args.schools):
         inserter.insert_school(s)
+        schools.append({"schoolId": s["schoolId"]})
 
     connect_data(inserter, people, orgs, deals, schools)
 
+    if args.bulk:
+        inserter.report()
+    inserter.bump_graph_version()
     inserter.close()
     print("Fake data insertion complete!")
 
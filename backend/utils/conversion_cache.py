@@ -0,0 +1,208 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+from importlib import metadata
+
+from starlette.concurrency import run_in_threadpool
+
+CONVERSION_CACHE_DIR = os.environ.get("CONVERSION_CACHE_DIR", os.path.join("cache", "conversions"))
+CONVERSION_CACHE_MAX_BYTES = int(os.environ.get("CONVERSION_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+try:
+    DOCLING_VERSION = metadata.version("docling")
+except metadata.PackageNotFoundError:
+    DOCLING_VERSION = "unknown"
+
+
+def cache_key(content_sha256, settings=None):
+    """
+    Cache key for a conversion: SHA-256 of the PDF bytes plus a fingerprint
+    of the converter settings (and docling version) that produced it.
+    """
+    fingerprint = json.dumps({"docling": DOCLING_VERSION, **(settings or {})}, sort_keys=True, default=str)
+    settings_hash = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+    return f"{content_sha256}-{settings_hash}"
+
+
+class ConversionCache:
+    """
+    On-disk cache of conversion payloads (markdown, tables, document JSON)
+    stored as gzipped JSON, evicted least-recently-used first once the
+    directory grows past `max_bytes`. Concurrent misses on the same key
+    share a single conversion.
+    """
+
+    def __init__(self, directory=CONVERSION_CACHE_DIR, max_bytes=CONVERSION_CACHE_MAX_BYTES):
+        self.directory = directory
+        # Inputs of in-flight conversions, owned by the conversion task.
+        self.work_dir = os.path.join(directory, "work")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json.gz")
+
+    def load(self, key):
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Warning: dropping unreadable conversion cache entry {path}:", e)
+            self._remove(path)
+            return None
+        # Touch so eviction sees this entry as recently used.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return payload
+
+    def store(self, key, payload):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Remove least-recently-used entries until under `max_bytes`."""
+        with self._lock:
+            entries = []
+            total = 0
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith(".json.gz"):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                self.evictions += 1
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    async def get(self, key):
+        """
+        The cached payload for `key`, waiting for an in-flight conversion of
+        it if there is one, or None (nothing is converted).
+        """
+        payload = await run_in_threadpool(self.load, key)
+        if payload is None:
+            task = self._inflight.get(key)
+            if task is None:
+                return None
+            try:
+                payload = await asyncio.shield(task)
+            except Exception:
+                return None
+        self._count("hits")
+        return payload
+
+    async def get_or_convert(self, key, convert, source_path):
+        """
+        Return the cached payload for `key`, or await `convert(path)` once
+        (even under concurrent requests) on a copy of `source_path` and cache
+        its result.
+
+        The conversion runs as its own task, and every caller (including the
+        one that started it) only waits on it, so a caller that is cancelled,
+        e.g. because its client disconnected, stops waiting without failing
+        the other requests sharing the conversion. The task holds its own
+        reference to the input, so callers may delete `source_path` as soon
+        as this returns or is cancelled.
+        """
+        payload = await run_in_threadpool(self.load, key)
+        if payload is not None:
+            self._count("hits")
+            return payload
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count("hits")
+        else:
+            self._count("misses")
+            path, handle = self._claim_input(key, source_path)
+            task = asyncio.ensure_future(self._convert_and_store(key, convert, path, handle))
+            # Mark a failure retrieved even if every caller has gone away.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    def _claim_input(self, key, source_path):
+        """
+        A hard link to `source_path` in the work directory or, where that is
+        not possible (e.g. across filesystems), an open handle to copy it from
+        once the conversion starts. Either survives the caller removing
+        `source_path`. Runs without awaiting, before the task is registered.
+        """
+        os.makedirs(self.work_dir, exist_ok=True)
+        path = os.path.join(self.work_dir, key + os.path.splitext(source_path)[1])
+        self._remove(path)
+        try:
+            os.link(source_path, path)
+            return path, None
+        except OSError:
+            return path, open(source_path, "rb")
+
+    @staticmethod
+    def _copy_input(handle, path):
+        with handle, open(path, "wb") as f:
+            shutil.copyfileobj(handle, f)
+
+    async def _convert_and_store(self, key, convert, path, handle):
+        try:
+            if handle is not None:
+                await run_in_threadpool(self._copy_input, handle, path)
+            payload = await convert(path)
+            # Stay registered as in-flight until the entry is on disk.
+            try:
+                await run_in_threadpool(self.store, key, payload)
+            except OSError as e:
+                print(f"Warning: could not write conversion cache entry {key}:", e)
+            return payload
+        finally:
+            if handle is not None:
+                handle.close()
+            self._remove(path)
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+        lookups = hits + misses
+        return {
+            "directory": self.directory,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": (hits / lookups) if lookups else 0.0,
+            "evictions": evictions,
+        }
+
+
+conversion_cache = ConversionCache()
@@ -0,0 +1,384 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from haystack import Document
+
+from utils.qa_models import qa_models
+
+CORPUS_INDEX_DIR = os.environ.get("CORPUS_INDEX_DIR", os.path.join("cache", "corpus_index"))
+# Rows scored per matrix multiply while searching; bounds search memory to
+# block_rows x dim floats no matter how large the corpus grows.
+CORPUS_SEARCH_BLOCK_ROWS = int(os.environ.get("CORPUS_SEARCH_BLOCK_ROWS", "65536"))
+# Rewrite the files once this fraction of rows belongs to removed documents.
+CORPUS_COMPACT_RATIO = float(os.environ.get("CORPUS_COMPACT_RATIO", "0.5"))
+
+MANIFEST = "manifest.json"
+EMBEDDINGS = "embeddings.f32"  # rows x dim float32, memory-mapped
+PASSAGES = "passages.jsonl"    # one JSON line per row: doc_id, id, content, meta
+OFFSETS = "offsets.i64"        # byte offset of each row's line in PASSAGES
+HASHES = "hashes.bin"          # HASH_BYTES per row, keys of the embedding cache
+HASH_BYTES = 16
+
+
+def passage_hash(content, embedding_model):
+    """Embedding-cache key: the same text under the same model embeds the same."""
+    return hashlib.sha256(f"{embedding_model}\0{content}".encode("utf-8")).digest()[:HASH_BYTES]
+
+
+def top_k_rows(scores, k):
+    """Column indices of the `k` highest scores in each row, best first."""
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def _empty_manifest():
+    return {"embedding_model": None, "dim": None, "rows": 0, "passages_bytes": 0, "removed_rows": 0, "documents": {}}
+
+
+class CorpusIndex:
+    """
+    Append-only vector index over the passages of every ingested document.
+
+    Embeddings live in one float32 file that is memory-mapped for search, so
+    the corpus does not need to fit in RAM. Passage text and meta sit in a
+    JSON-lines sidecar addressed through a row -> byte offset table. Each
+    document owns a contiguous range of rows; removing a document only drops
+    it from the manifest, and the files are compacted once enough rows are dead.
+
+    Every row also stores the hash of its text, which doubles as an embedding
+    cache: passages already seen (in any document, under the same model) are
+    copied from the matrix instead of being embedded again.
+
+    Search is exact: rows are scored block by block with one matrix multiply
+    per block (dot product, like the in-memory retriever) while a running
+    top-k is kept, which stays CPU-friendly into the millions of passages.
+    """
+
+    def __init__(self, directory=CORPUS_INDEX_DIR, block_rows=CORPUS_SEARCH_BLOCK_ROWS, compact_ratio=CORPUS_COMPACT_RATIO):
+        self.directory = directory
+        self.block_rows = block_rows
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self._manifest = None
+        self._matrix = None
+        self._live = None
+        self._hash_rows = None
+        # Bumped whenever rows are renumbered (compact, clear), so row ids
+        # from an earlier search can be recognised as stale.
+        self._generation = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.last_search_seconds = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _state(self):
+        """The manifest, reset if it was built with another embedding model."""
+        if self._manifest is None:
+            try:
+                with open(self._path(MANIFEST)) as f:
+                    self._manifest = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._manifest = _empty_manifest()
+        model = self._manifest["embedding_model"]
+        if model is not None and model != qa_models.embedding_model:
+            print(f"Corpus index was built with {model}; clearing it for {qa_models.embedding_model}.")
+            self.clear()
+        return self._manifest
+
+    def _write_manifest(self):
+        tmp_path = self._path(MANIFEST + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp_path, self._path(MANIFEST))
+
+    def _write_at(self, name, offset, data):
+        # Rows past the manifest's count are leftovers of an interrupted add.
+        with open(self._path(name), "r+b" if os.path.exists(self._path(name)) else "wb") as f:
+            f.seek(offset)
+            f.write(data)
+            f.truncate()
+
+    def _invalidate(self):
+        self._matrix = None
+        self._live = None
+
+    def _embeddings(self):
+        state = self._manifest
+        if self._matrix is None and state["rows"]:
+            self._matrix = np.memmap(self._path(EMBEDDINGS), dtype=np.float32, mode="r", shape=(state["rows"], state["dim"]))
+        return self._matrix
+
+    def _live_mask(self, doc_ids=None):
+        state = self._manifest
+        if doc_ids is None and self._live is not None:
+            return self._live
+        mask = np.zeros(state["rows"], dtype=bool)
+        documents = state["documents"]
+        for doc_id in (documents if doc_ids is None else doc_ids):
+            entry = documents.get(doc_id)
+            if entry is not None:
+                mask[entry["start"]:entry["end"]] = True
+        if doc_ids is None:
+            self._live = mask
+        return mask
+
+    def _hash_index(self):
+        if self._hash_rows is None:
+            rows = self._manifest["rows"]
+            hash_rows = {}
+            if rows:
+                with open(self._path(HASHES), "rb") as f:
+                    data = f.read(rows * HASH_BYTES)
+                for row in range(rows):
+                    hash_rows.setdefault(data[row * HASH_BYTES:(row + 1) * HASH_BYTES], row)
+            self._hash_rows = hash_rows
+        return self._hash_rows
+
+    def contains(self, doc_id):
+        with self._lock:
+            return doc_id in self._state()["documents"]
+
+    def document(self, doc_id):
+        with self._lock:
+            return self._state()["documents"].get(doc_id)
+
+    def fill_embeddings(self, documents, embed):
+        """
+        Return `documents` with embeddings, copying cached ones from the corpus
+        and calling `embed` (e.g. qa_models.embed_documents) only for the rest.
+        """
+        model = qa_models.embedding_model
+        with self._lock:
+            self._state()
+            hash_rows = self._hash_index()
+            matrix = self._embeddings()
+        cached = []
+        missing = []
+        for document in documents:
+            row = hash_rows.get(passage_hash(document.content, model))
+            if row is not None and matrix is not None and row < len(matrix):
+                cached.append(Document(id=document.id, content=document.content, meta=document.meta, embedding=matrix[row].tolist()))
+            else:
+                cached.append(None)
+                missing.append(document)
+        self.cache_hits += len(documents) - len(missing)
+        self.cache_misses += len(missing)
+        embedded = iter(embed(missing) if missing else [])
+        return [document if document is not None else next(embedded) for document in cached]
+
+    def add(self, doc_id, documents, extra=None):
+        """Append a document's embedded passages (replacing an older copy of it)."""
+        with self._lock:
+            state = self._state()
+            if doc_id in state["documents"]:
+                self._remove(doc_id, compact=False)
+            os.makedirs(self.directory, exist_ok=True)
+            start = state["rows"]
+            if documents:
+                embeddings = np.asarray([d.embedding for d in documents], dtype=np.float32)
+                if state["dim"] is None:
+                    state["dim"] = int(embeddings.shape[1])
+                    state["embedding_model"] = qa_models.embedding_model
+                lines = [
+                    (json.dumps({"doc_id": doc_id, "id": d.id, "content": d.content, "meta": d.meta}) + "\n").encode("utf-8")
+                    for d in documents
+                ]
+                offsets = np.cumsum([state["passages_bytes"]] + [len(line) for line in lines[:-1]], dtype=np.int64)
+                hashes = [passage_hash(d.content, state["embedding_model"]) for d in documents]
+                self._write_at(EMBEDDINGS, start * state["dim"] * 4, embeddings.tobytes())
+                self._write_at(PASSAGES, state["passages_bytes"], b"".join(lines))
+                self._write_at(OFFSETS, start * 8, offsets.tobytes())
+                self._write_at(HASHES, start * HASH_BYTES, b"".join(hashes))
+                state["rows"] += len(documents)
+                state["passages_bytes"] += sum(len(line) for line in lines)
+                if self._hash_rows is not None:
+                    for i, key in enumerate(hashes):
+                        self._hash_rows.setdefault(key, start + i)
+            state["documents"][doc_id] = {"start": start, "end": state["rows"], "added_at": time.time(), **(extra or {})}
+            self._write_manifest()
+            self._invalidate()
+            return state["documents"][doc_id]
+
+    def _remove(self, doc_id, compact=True):
+        state = self._manifest
+        entry = state["documents"].pop(doc_id, None)
+        if entry is None:
+            return False
+        state["removed_rows"] += entry["end"] - entry["start"]
+        self._write_manifest()
+        self._invalidate()
+        if compact and state["rows"] and state["removed_rows"] / state["rows"] > self.compact_ratio:
+            self.compact()
+        return True
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._state()
+            return self._remove(doc_id)
+
+    def compact(self):
+        """Rewrite the files without the rows of removed documents."""
+        with self._lock:
+            state = self._state()
+            tmp_dir = self.directory.rstrip(os.sep) + ".compact.tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            compacted = CorpusIndex(directory=tmp_dir, block_rows=self.block_rows, compact_ratio=self.compact_ratio)
+            compacted._manifest = _empty_manifest()
+            for doc_id, entry in sorted(state["documents"].items(), key=lambda item: item[1]["start"]):
+                rows = range(entry["start"], entry["end"])
+                documents = self._documents(rows, with_embeddings=True)
+                for document in documents:
+                    document.meta.pop("corpus_row", None)
+                    document.meta.pop("corpus_generation", None)
+                extra = {k: v for k, v in entry.items() if k not in ("start", "end")}
+                compacted.add(doc_id, documents, extra)
+            os.makedirs(tmp_dir, exist_ok=True)
+            compacted._write_manifest()
+            old_dir = self.directory.rstrip(os.sep) + ".old"
+            shutil.rmtree(old_dir, ignore_errors=True)
+            if os.path.exists(self.directory):
+                os.replace(self.directory, old_dir)
+            os.replace(tmp_dir, self.directory)
+            shutil.rmtree(old_dir, ignore_errors=True)
+            self._manifest = None
+            self._hash_rows = None
+            self._generation += 1
+            self._invalidate()
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self._manifest = _empty_manifest()
+            self._hash_rows = None
+            self._generation += 1
+            self._invalidate()
+
+    def search(self, query_embeddings, top_k=10, doc_ids=None):
+        """
+        Exact nearest passages for each query embedding. Returns, per query,
+        a list of (row, score) best first; `doc_ids` restricts the search.
+        Row ids are only valid until the next compaction; use
+        `search_passages` to get the passages themselves.
+        """
+        return self._search(query_embeddings, top_k, doc_ids)[1]
+
+    def search_passages(self, query_embeddings, top_k=10, doc_ids=None):
+        """
+        Like `search`, but returns, per query, the passage Documents (with
+        scores). They are resolved from the same row numbering the search
+        ran on: if a compaction renumbered rows in between, the search is
+        repeated.
+        """
+        while True:
+            generation, hits = self._search(query_embeddings, top_k, doc_ids)
+            with self._lock:
+                if generation == self._generation:
+                    self._state()
+                    return [
+                        self._documents([row for row, _ in query_hits], scores=[score for _, score in query_hits])
+                        for query_hits in hits
+                    ]
+
+    def _search(self, query_embeddings, top_k, doc_ids):
+        with self._lock:
+            generation = self._generation
+            state = self._state()
+            matrix = self._embeddings()
+            mask = self._live_mask(doc_ids)
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if matrix is None or not top_k:
+            return generation, [[] for _ in queries]
+        started = time.perf_counter()
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, state["rows"], self.block_rows):
+            block_mask = mask[start:start + self.block_rows]
+            if not block_mask.any():
+                continue
+            scores = queries @ np.asarray(matrix[start:start + self.block_rows]).T
+            scores[:, ~block_mask] = -np.inf
+            rows = np.broadcast_to(np.arange(start, start + len(block_mask)), scores.shape)
+            scores = np.hstack([best_scores, scores])
+            rows = np.hstack([best_rows, rows])
+            keep = top_k_rows(scores, top_k)
+            best_scores = np.take_along_axis(scores, keep, axis=1)
+            best_rows = np.take_along_axis(rows, keep, axis=1)
+        self.last_search_seconds = time.perf_counter() - started
+        return generation, [
+            [(int(row), float(score)) for row, score in zip(rows, scores) if np.isfinite(score)]
+            for rows, scores in zip(best_rows, best_scores)
+        ]
+
+    def _documents(self, rows, with_embeddings=False, scores=None):
+        offsets = np.memmap(self._path(OFFSETS), dtype=np.int64, mode="r", shape=(self._manifest["rows"],))
+        matrix = self._embeddings() if with_embeddings else None
+        documents = []
+        with open(self._path(PASSAGES), "rb") as f:
+            for i, row in enumerate(rows):
+                f.seek(int(offsets[row]))
+                passage = json.loads(f.readline())
+                documents.append(Document(
+                    id=passage["id"],
+                    content=passage["content"],
+                    meta={**passage["meta"], "corpus_row": row, "corpus_generation": self._generation},
+                    embedding=matrix[row].tolist() if matrix is not None else None,
+                    score=scores[i] if scores is not None else None,
+                ))
+        return documents
+
+    def passages(self, hits):
+        """Documents (with scores) for the (row, score) pairs returned by `search`."""
+        with self._lock:
+            self._state()
+            return self._documents([row for row, _ in hits], scores=[score for _, score in hits])
+
+    def context_window(self, document, window_size=1):
+        """
+        Neighbouring passages of the same document around a hit, in the
+        SentenceWindowRetriever result shape.
+        """
+        with self._lock:
+            state = self._state()
+            entry = state["documents"].get(document.meta.get("doc_id"))
+            row = document.meta.get("corpus_row")
+            # Rows were renumbered since this hit was found.
+            if entry is None or row is None or document.meta.get("corpus_generation") != self._generation:
+                return {"context_windows": []}
+            rows = range(max(entry["start"], row - window_size), min(entry["end"], row + window_size + 1))
+            return {"context_windows": ["\n\n".join(d.content for d in self._documents(rows))]}
+
+    def stats(self):
+        with self._lock:
+            state = self._state()
+            live_rows = state["rows"] - state["removed_rows"]
+            size = sum(
+                os.path.getsize(self._path(name))
+                for name in (EMBEDDINGS, PASSAGES, OFFSETS, HASHES)
+                if os.path.exists(self._path(name))
+            )
+        return {
+            "documents": len(state["documents"]),
+            "passages": live_rows,
+            "rows": state["rows"],
+            "dim": state["dim"],
+            "embedding_model": state["embedding_model"],
+            "bytes": size,
+            "embedding_cache_hits": self.cache_hits,
+            "embedding_cache_misses": self.cache_misses,
+            "last_search_seconds": round(self.last_search_seconds, 4) if self.last_search_seconds is not None else None,
+        }
+
+
+corpus_index = CorpusIndex()
@@ -0,0 +1,388 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from neo4j import Query
+from neo4j.exceptions import ClientError
+
+from utils.graph_cache import graph_version
+from utils.graph_analytics import (
+    graph_analytics, degree, pagerank, betweenness, components,
+    SCIPY_AVAILABLE, BETWEENNESS_SAMPLES,
+)
+
+QUERY_TIMEOUT_SECONDS = float(os.environ.get("QUERY_TIMEOUT_SECONDS", "30"))
+QUERY_DEFAULT_LIMIT = int(os.environ.get("QUERY_DEFAULT_LIMIT", "25"))
+QUERY_MAX_ROWS = int(os.environ.get("QUERY_MAX_ROWS", "1000"))
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", "256"))
+
+# When the GDS plugin or the 'myGraph' projection is missing, queries with a
+# local fallback are answered by utils/graph_analytics.py instead. Other GDS
+# failures (bad config, out of memory, timeouts) are errors, not fallbacks.
+GDS_PROCEDURE_NOT_FOUND = "Neo.ClientError.Procedure.ProcedureNotFound"
+GDS_PROCEDURE_CALL_FAILED = "Neo.ClientError.Procedure.ProcedureCallFailed"
+GDS_GRAPH_NAME = "myGraph"
+
+
+def gds_unavailable(error):
+    """True if `error` means GDS or the 'myGraph' projection is not there."""
+    if error.code == GDS_PROCEDURE_NOT_FOUND:
+        return True
+    message = error.message or ""
+    return error.code == GDS_PROCEDURE_CALL_FAILED and GDS_GRAPH_NAME in message and "does not exist" in message
+
+
+class NamedQuery:
+    """
+    A Cypher query that can be run by name from /relationships/run-query.
+
+    `params` declares the accepted parameters as {name: (type, default)} and
+    `bounds` optional exclusive {name: (low, high)} ranges for them; every
+    query also takes `limit` (default `limit`, at most QUERY_MAX_ROWS),
+    which the Cypher must use. Cached queries are re-run only when the graph
+    version or the parameters change.
+    """
+
+    def __init__(self, name, text, params=None, bounds=None, timeout=QUERY_TIMEOUT_SECONDS, limit=QUERY_DEFAULT_LIMIT,
+                 cache=False, fallback=None, description=""):
+        self.name = name
+        self.text = text
+        self.params = {**(params or {}), "limit": (int, limit)}
+        self.bounds = bounds or {}
+        self.timeout = timeout
+        self.cache = cache
+        self.fallback = fallback
+        self.description = description
+
+    def bind(self, params):
+        """Validated parameters: declared names only, coerced to their type, defaults filled in."""
+        params = params or {}
+        unknown = sorted(set(params) - set(self.params))
+        if unknown:
+            raise ValueError(f"Unknown parameter(s) for {self.name}: {', '.join(unknown)}")
+        bound = {}
+        for key, (kind, default) in self.params.items():
+            value = params.get(key, default)
+            try:
+                bound[key] = kind(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Parameter {key} of {self.name} must be {kind.__name__}, got {value!r}")
+        if not 1 <= bound["limit"] <= QUERY_MAX_ROWS:
+            raise ValueError(f"limit must be between 1 and {QUERY_MAX_ROWS}")
+        for key, (low, high) in self.bounds.items():
+            if not low < bound[key] < high:
+                raise ValueError(f"{key} must be strictly between {low} and {high}")
+        return bound
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "description": self.description,
+            "params": {
+                key: {"type": kind.__name__, "default": default, **({"bounds": self.bounds[key]} if key in self.bounds else {})}
+                for key, (kind, default) in self.params.items()
+            },
+            "timeout": self.timeout,
+            "cached": self.cache,
+            "local_fallback": self.fallback is not None,
+        }
+
+
+def _ranked_rows(snapshot, scores, limit):
+    """The same (label, name, score) rows as the GDS centrality queries."""
+    return [
+        {"label": row["label"], "name": row["name"], "score": row["score"]}
+        for row in snapshot.top(scores, limit)
+    ]
+
+
+# Local fallbacks share their cache entries with the /relationships/analytics endpoints.
+def _local_degree(driver, params):
+    snapshot, scores = graph_analytics.compute(driver, "degree", (), lambda s: degree(s.adjacency))
+    return _ranked_rows(snapshot, scores, params["limit"])
+
+
+def _local_pagerank(driver, params):
+    damping = params["damping"]
+    snapshot, (scores, _) = graph_analytics.compute(
+        driver, "pagerank", (damping,), lambda s: pagerank(s.adjacency, damping)
+    )
+    return _ranked_rows(snapshot, scores, params["limit"])
+
+
+def _local_betweenness(driver, params):
+    snapshot, scores = graph_analytics.compute(
+        driver, "betweenness", (BETWEENNESS_SAMPLES, 0), lambda s: betweenness(s.adjacency)
+    )
+    return _ranked_rows(snapshot, scores, params["limit"])
+
+
+def _local_wcc(driver, params):
+    snapshot, (count, labels, sizes) = graph_analytics.compute(
+        driver, "components", (), lambda s: components(s.adjacency)
+    )
+    rows = []
+    for component in sizes.argsort()[::-1][:params["limit"]]:
+        members = (labels == component).nonzero()[0][:5]
+        rows.append({
+            "componentId": int(component),
+            "size": int(sizes[component]),
+            "sampleMembers": [snapshot.names[i] for i in members],
+        })
+    return rows
+
+
+def _centrality(procedure, config=""):
+    return f"""
+    CALL {procedure}('{GDS_GRAPH_NAME}'{config})
+    YIELD nodeId, score
+    WITH gds.util.asNode(nodeId) AS n, score
+    RETURN labels(n)[0] AS label, coalesce(n.fullName, n.name) AS name, score
+    ORDER BY score DESC
+    LIMIT $limit
+    """
+
+
+def _communities(procedure, id_key):
+    return f"""
+    CALL {procedure}('{GDS_GRAPH_NAME}')
+    YIELD nodeId, {id_key}
+    WITH {id_key}, collect(coalesce(gds.util.asNode(nodeId).fullName, gds.util.asNode(nodeId).name)) AS members
+    RETURN {id_key}, size(members) AS size, members[0..5] AS sampleMembers
+    ORDER BY size DESC
+    LIMIT $limit
+    """
+
+
+QUERIES = {query.name: query for query in (
+    NamedQuery(
+        "degree_centrality", _centrality("gds.degree.stream"), cache=True,
+        fallback=_local_degree,
+        description="Number of relationships of each node.",
+    ),
+    NamedQuery(
+        "betweenness_centrality", _centrality("gds.betweenness.stream"), timeout=120, cache=True,
+        fallback=_local_betweenness,
+        description="Nodes that lie on many shortest paths.",
+    ),
+    NamedQuery(
+        "pagerank", _centrality("gds.pageRank.stream", ", {dampingFactor: $damping}"),
+        params={"damping": (float, 0.85)}, bounds={"damping": (0, 1)}, cache=True,
+        fallback=_local_pagerank,
+        description="Influence in the network via PageRank.",
+    ),
+    NamedQuery(
+        "louvain_community", _communities("gds.louvain.stream", "communityId"), timeout=120, cache=True,
+        description="Communities of densely interconnected nodes.",
+    ),
+    NamedQuery(
+        "wcc", _communities("gds.wcc.stream", "componentId"), cache=True,
+        fallback=_local_wcc,
+        description="Subgraphs that are not connected to each other.",
+    ),
+    NamedQuery(
+        "jaccard_similarity",
+        """
+        MATCH (p1:Person)-[:INVOLVED_IN]->(d:Deal)<-[:INVOLVED_IN]-(p2:Person)
+        WHERE p1.personId < p2.personId
+        WITH p1, p2, count(DISTINCT d) AS shared
+        ORDER BY shared DESC
+        LIMIT $limit * 10
+        MATCH (p1)-[:INVOLVED_IN]->(d1:Deal)
+        WITH p1, p2, shared, count(DISTINCT d1) AS deals1
+        MATCH (p2)-[:INVOLVED_IN]->(d2:Deal)
+        WITH p1, p2, shared, deals1, count(DISTINCT d2) AS deals2
+        RETURN p1.fullName AS person1, p2.fullName AS person2, shared,
+               toFloat(shared) / (deals1 + deals2 - shared) AS jaccard
+        ORDER BY jaccard DESC, shared DESC
+        LIMIT $limit
+        """,
+        cache=True,
+        description="Deals in common for pairs of people.",
+    ),
+    NamedQuery(
+        "triadic_closure",
+        """
+        MATCH (a:Person)-[:CO_INVESTED_WITH]-(b:Person)-[:CO_INVESTED_WITH]-(c:Person)
+        WHERE a.personId < c.personId AND NOT (a)-[:CO_INVESTED_WITH]-(c)
+        RETURN a.fullName AS person1, c.fullName AS person2, count(DISTINCT b) AS commonCoInvestors
+        ORDER BY commonCoInvestors DESC
+        LIMIT $limit
+        """,
+        cache=True,
+        description="Potential co-investments spotted from open triangles.",
+    ),
+    NamedQuery(
+        "shortest_path_example",
+        """
+        MATCH (a:Person) WHERE a.fullName STARTS WITH $source
+        WITH a LIMIT 1
+        MATCH (b:Person) WHERE b.fullName STARTS WITH $target AND b <> a
+        WITH a, b LIMIT 1
+        MATCH p = shortestPath((a)-[*..6]-(b))
+        RETURN [n IN nodes(p) | coalesce(n.fullName, n.name)] AS path, length(p) AS hops
+        LIMIT $limit
+        """,
+        params={"source": (str, "Alice"), "target": (str, "Bob")},
+        limit=1,
+        description="Shortest path between the first people whose names start with `source` and `target`.",
+    ),
+    NamedQuery(
+        "top_schools",
+        """
+        MATCH (p:Person)-[:EDUCATED_AT]->(s:School)
+        RETURN s.name AS school, count(DISTINCT p) AS alumni
+        ORDER BY alumni DESC
+        LIMIT $limit
+        """,
+        cache=True,
+        description="Schools with the most alumni.",
+    ),
+    NamedQuery(
+        "co_invested_alumni",
+        """
+        MATCH (s:School)<-[:EDUCATED_AT]-(p1:Person)-[:CO_INVESTED_WITH]-(p2:Person)-[:EDUCATED_AT]->(s)
+        WHERE p1.personId < p2.personId
+        RETURN DISTINCT s.name AS school, p1.fullName AS person1, p2.fullName AS person2
+        LIMIT $limit
+        """,
+        cache=True,
+        description="Pairs of alumni from the same school who co-invested.",
+    ),
+)}
+
+
+class QueryResultCache:
+    """Results of cached named queries by (name, params), valid for one graph version; LRU."""
+
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, rows):
+        with self._lock:
+            self._entries[key] = (version, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class QueryStats:
+    """Per-query call counts, cache hits, fallbacks, errors and execution times."""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, outcome, seconds=None):
+        with self._lock:
+            stats = self._stats.setdefault(name, {
+                "runs": 0, "cache_hits": 0, "fallbacks": 0, "errors": 0,
+                "total_seconds": 0.0, "max_seconds": 0.0, "last_seconds": None,
+            })
+            if outcome == "cache_hit":
+                stats["cache_hits"] += 1
+                return
+            if outcome == "error":
+                stats["errors"] += 1
+            else:
+                stats["runs"] += 1
+                if outcome == "fallback":
+                    stats["fallbacks"] += 1
+            if seconds is not None:
+                stats["total_seconds"] = round(stats["total_seconds"] + seconds, 4)
+                stats["max_seconds"] = round(max(stats["max_seconds"], seconds), 4)
+                stats["last_seconds"] = round(seconds, 4)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+
+query_results = QueryResultCache()
+query_stats = QueryStats()
+
+
+def to_records(rows):
+    """
+    Rows in the shape the frontend renders (that of neo4j-javascript-driver
+    records): keys, length, _fields and _fieldLookup.
+    """
+    records = []
+    for row in rows:
+        keys = list(row.keys())
+        records.append({
+            "keys": keys,
+            "length": len(keys),
+            "_fields": [row[key] for key in keys],
+            "_fieldLookup": {key: i for i, key in enumerate(keys)},
+        })
+    return records
+
+
+def _run_cypher(driver, query, params):
+    with driver.session() as session:
+        result = session.run(Query(query.text, timeout=query.timeout), params)
+        rows = []
+        for record in result:
+            rows.append(dict(record))
+            if len(rows) >= params["limit"]:
+                break
+        result.consume()
+    return rows
+
+
+def run_named_query(driver, name, params=None):
+    """
+    Run the registered query `name` with `params` and return its rows as
+    records (see to_records). Raises ValueError for unknown queries or bad
+    parameters. GDS queries fall back to the local analytics engine when GDS
+    is not available.
+    """
+    query = QUERIES.get(name)
+    if query is None:
+        raise ValueError(f"Unknown query {name!r}. Available: {', '.join(sorted(QUERIES))}")
+    params = query.bind(params)
+
+    key = (name, tuple(sorted(params.items())))
+    version = graph_version.current(driver) if query.cache else None
+    if query.cache:
+        records = query_results.get(key, version)
+        if records is not None:
+            query_stats.record(name, "cache_hit")
+            return records
+
+    started = time.perf_counter()
+    outcome = "run"
+    try:
+        try:
+            rows = _run_cypher(driver, query, params)
+        except ClientError as e:
+            if query.fallback is None or not SCIPY_AVAILABLE or not gds_unavailable(e):
+                raise
+            print(f"GDS unavailable for {name} ({e.code}); using the local analytics engine.")
+            outcome = "fallback"
+            rows = query.fallback(driver, params)
+    except Exception:
+        query_stats.record(name, "error", time.perf_counter() - started)
+        raise
+    query_stats.record(name, outcome, time.perf_counter() - started)
+
+    records = to_records(rows)
+    if query.cache:
+        query_results.put(key, version, records)
+    return records
@@ -0,0 +1,518 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from docling.datamodel.base_models import InputFormat
+from docling.datamodel.pipeline_options import PdfPipelineOptions, TableFormerMode
+from docling.document_converter import DocumentConverter, PdfFormatOption
+from starlette.concurrency import run_in_threadpool
+
+DOCLING_POOL_SIZE = int(os.environ.get("DOCLING_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+# "process" runs conversions in worker processes (one warm converter each);
+# "thread" uses the in-process converter pool on the threadpool.
+DOCLING_EXECUTOR = os.environ.get("DOCLING_EXECUTOR", "process")
+# Conversions allowed to wait for a worker before new ones are rejected.
+DOCLING_MAX_PENDING = int(os.environ.get("DOCLING_MAX_PENDING", str(DOCLING_POOL_SIZE * 8)))
+# Page-sharded conversion: documents with more than DOCLING_SHARD_MIN_PAGES pages
+# are split into DOCLING_SHARD_PAGES-page ranges converted concurrently.
+DOCLING_SHARD_PAGES = int(os.environ.get("DOCLING_SHARD_PAGES", "20"))
+DOCLING_SHARD_MIN_PAGES = int(os.environ.get("DOCLING_SHARD_MIN_PAGES", "40"))
+DOCLING_SHARD_PARALLELISM = int(os.environ.get("DOCLING_SHARD_PARALLELISM", str(DOCLING_POOL_SIZE)))
+# Smallest shard a request may ask for; smaller shards mostly add per-shard overhead.
+DOCLING_MIN_SHARD_PAGES = int(os.environ.get("DOCLING_MIN_SHARD_PAGES", "5"))
+# TableFormer mode for the tables-only profile: "accurate" or "fast".
+DOCLING_TABLE_MODE = os.environ.get("DOCLING_TABLE_MODE", "accurate")
+
+CONVERTER_PROFILES = ("default", "tables")
+# Pages with fewer embedded characters than this are treated as scanned.
+PDF_TEXT_MIN_CHARS = int(os.environ.get("PDF_TEXT_MIN_CHARS", "16"))
+
+
+class ConversionQueueFull(RuntimeError):
+    pass
+
+
+class ConversionMetrics:
+    """
+    Running counters that keep converter initialization time separate from
+    per-document conversion time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.init_count = 0
+        self.init_seconds_total = 0.0
+        self.conversion_count = 0
+        self.conversion_errors = 0
+        self.conversion_seconds_total = 0.0
+        self.conversion_seconds_max = 0.0
+
+    def record_init(self, seconds):
+        with self._lock:
+            self.init_count += 1
+            self.init_seconds_total += seconds
+
+    def record_conversion(self, seconds, ok=True):
+        with self._lock:
+            self.conversion_count += 1
+            if not ok:
+                self.conversion_errors += 1
+            self.conversion_seconds_total += seconds
+            self.conversion_seconds_max = max(self.conversion_seconds_max, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "init_count": self.init_count,
+                "init_seconds_total": round(self.init_seconds_total, 4),
+                "init_seconds_mean": round(self.init_seconds_total / self.init_count, 4) if self.init_count else None,
+                "conversion_count": self.conversion_count,
+                "conversion_errors": self.conversion_errors,
+                "conversion_seconds_total": round(self.conversion_seconds_total, 4),
+                "conversion_seconds_mean": round(self.conversion_seconds_total / self.conversion_count, 4) if self.conversion_count else None,
+                "conversion_seconds_max": round(self.conversion_seconds_max, 4),
+            }
+
+
+metrics = ConversionMetrics()
+
+
+def tables_pipeline_options():
+    """
+    PDF pipeline options for table extraction only: layout and TableFormer
+    stay on, while OCR, page/picture image generation and enrichment
+    models are switched off.
+    """
+    options = PdfPipelineOptions()
+    options.do_ocr = False
+    options.do_table_structure = True
+    options.table_structure_options.mode = TableFormerMode.FAST if DOCLING_TABLE_MODE == "fast" else TableFormerMode.ACCURATE
+    for flag in (
+        "generate_page_images",
+        "generate_picture_images",
+        "generate_table_images",
+        "do_picture_classification",
+        "do_picture_description",
+        "do_code_enrichment",
+        "do_formula_enrichment",
+    ):
+        # Not every docling release has every stage.
+        if hasattr(options, flag):
+            setattr(options, flag, False)
+    return options
+
+
+def _build_converter_timed(profile="default"):
+    started = time.perf_counter()
+    if profile == "tables":
+        converter = DocumentConverter(
+            format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=tables_pipeline_options())}
+        )
+    else:
+        converter = DocumentConverter()
+    if hasattr(converter, "initialize_pipeline"):
+        converter.initialize_pipeline(InputFormat.PDF)
+    return converter, time.perf_counter() - started
+
+
+def build_converter(profile="default"):
+    """
+    Create a DocumentConverter and eagerly load its PDF pipeline (layout and
+    table models), so the cost is paid here rather than on first convert.
+    """
+    converter, seconds = _build_converter_timed(profile)
+    metrics.record_init(seconds)
+    return converter
+
+
+def conversion_payload(conv_res, profile="default"):
+    """
+    Reduce a docling ConversionResult to a picklable, JSON-friendly dict:
+    markdown, tables (with page numbers) and the document JSON. The
+    "tables" profile only fills in tables.
+    """
+    document = conv_res.document
+    tables = []
+    for idx, table in enumerate(document.tables):
+        df = table.export_to_dataframe()
+        tables.append({
+            "table_index": idx,
+            "page_no": table.prov[0].page_no if table.prov else None,
+            "markdown": df.to_markdown(),
+            "columns": [str(c) for c in df.columns],
+            "data": df.astype(object).where(df.notna(), None).values.tolist(),
+        })
+    if profile == "tables":
+        return {"num_pages": len(document.pages), "markdown": "", "tables": tables, "documents": []}
+    return {
+        "num_pages": len(document.pages),
+        "markdown": document.export_to_markdown(),
+        "tables": tables,
+        "documents": [document.export_to_dict()],
+    }
+
+
+class ConverterPool:
+    """
+    Application-scoped pool of warm DocumentConverter instances.
+
+    Converters are created lazily up to `size`; callers borrow one with
+    `acquire()` and block when all of them are busy.
+    """
+
+    def __init__(self, size=DOCLING_POOL_SIZE, profile="default"):
+        self.size = size
+        self.profile = profile
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def warm_up(self, count=None):
+        """Pre-create converters (all of them by default), e.g. at startup."""
+        count = self.size if count is None else min(count, self.size)
+        while True:
+            with self._lock:
+                if self._created >= count:
+                    return
+                self._created += 1
+            self._add_new()
+
+    def _add_new(self):
+        try:
+            self._idle.put(build_converter(self.profile))
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def acquire(self):
+        try:
+            converter = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                self._add_new()
+            converter = self._idle.get()
+        try:
+            yield converter
+        finally:
+            self._idle.put(converter)
+
+    def stats(self):
+        return {"size": self.size, "created": self._created, "idle": self._idle.qsize()}
+
+
+converter_pools = {profile: ConverterPool(profile=profile) for profile in CONVERTER_PROFILES}
+
+
+# --- Worker-process offload -------------------------------------------------
+#
+# Conversions are CPU-heavy and take seconds, so they must not run on the
+# event loop. Each worker process builds the default converter in its
+# initializer (other profiles on first use) and reuses it for every job it
+# receives; results come back as plain dicts.
+
+_worker_converters = {}
+_worker_init_seconds = None
+
+
+def _worker_get_converter(profile):
+    global _worker_init_seconds
+    converter = _worker_converters.get(profile)
+    if converter is None:
+        converter, seconds = _build_converter_timed(profile)
+        _worker_converters[profile] = converter
+        _worker_init_seconds = (_worker_init_seconds or 0.0) + seconds
+    return converter
+
+
+def _worker_init():
+    _worker_get_converter("default")
+
+
+def _take_worker_init_seconds():
+    global _worker_init_seconds
+    seconds, _worker_init_seconds = _worker_init_seconds, None
+    return seconds
+
+
+def _worker_ping():
+    return _take_worker_init_seconds()
+
+
+def _worker_convert(source, kwargs, profile="default"):
+    converter = _worker_get_converter(profile)
+    started = time.perf_counter()
+    payload = conversion_payload(converter.convert(source, **kwargs), profile)
+    return payload, time.perf_counter() - started, _take_worker_init_seconds()
+
+
+class ProcessConversionPool:
+    """
+    Bounded pool of worker processes, each holding a warm converter.
+    """
+
+    def __init__(self, size=DOCLING_POOL_SIZE, max_pending=DOCLING_MAX_PENDING):
+        self.size = size
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_worker_init,
+                )
+            return self._executor
+
+    def warm_up(self):
+        """Start the worker processes so their converters load up front."""
+        futures = [self.executor.submit(_worker_ping) for _ in range(self.size)]
+        for future in futures:
+            seconds = future.result()
+            if seconds is not None:
+                metrics.record_init(seconds)
+
+    async def convert(self, source, profile="default", **kwargs):
+        with self._lock:
+            if self._pending >= self.size + self.max_pending:
+                raise ConversionQueueFull("Too many PDF conversions in progress, try again later.")
+            self._pending += 1
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        executor = self.executor
+        try:
+            payload, seconds, init_seconds = await loop.run_in_executor(executor, _worker_convert, source, kwargs, profile)
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory); the executor is unusable
+            # from now on, so drop it and let the next call start a new one.
+            metrics.record_conversion(time.perf_counter() - started, ok=False)
+            self._discard(executor)
+            raise RuntimeError("PDF conversion worker crashed; the worker pool has been restarted.") from e
+        except Exception:
+            metrics.record_conversion(time.perf_counter() - started, ok=False)
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+        if init_seconds is not None:
+            metrics.record_init(init_seconds)
+        metrics.record_conversion(seconds)
+        return payload
+
+    def _discard(self, executor):
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self):
+        return {"size": self.size, "started": self._executor is not None, "pending": self._pending}
+
+
+process_pool = ProcessConversionPool()
+
+
+def _convert_payload_with_pool(source, kwargs, profile="default"):
+    with converter_pools[profile].acquire() as converter:
+        started = time.perf_counter()
+        ok = False
+        try:
+            payload = conversion_payload(converter.convert(source, **kwargs), profile)
+            ok = True
+            return payload
+        finally:
+            metrics.record_conversion(time.perf_counter() - started, ok=ok)
+
+
+async def _convert_unsharded(source, profile="default", **kwargs):
+    if DOCLING_EXECUTOR == "thread":
+        return await run_in_threadpool(_convert_payload_with_pool, source, kwargs, profile)
+    return await process_pool.convert(source, profile=profile, **kwargs)
+
+
+def pdf_page_count(source):
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(source)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def pdf_text_less_pages(source, page_ranges=None, min_chars=PDF_TEXT_MIN_CHARS):
+    """
+    1-based pages (within `page_ranges`, default all) that have next to no
+    embedded text, i.e. scanned pages that need OCR.
+    """
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(source)
+    try:
+        num_pages = len(pdf)
+        ranges = page_ranges or [(1, num_pages)]
+        text_less = []
+        for start, end in ranges:
+            for page_no in range(start, min(end, num_pages) + 1):
+                page = pdf[page_no - 1]
+                textpage = page.get_textpage()
+                try:
+                    if textpage.count_chars() < min_chars:
+                        text_less.append(page_no)
+                finally:
+                    textpage.close()
+                    page.close()
+        return text_less
+    finally:
+        pdf.close()
+
+
+def parse_page_ranges(spec):
+    """
+    Parse a 1-based page selection such as "1-3,7,10-12" into sorted,
+    merged inclusive (start, end) ranges.
+    """
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        start = int(start)
+        end = int(end) if end else start
+        if start < 1 or end < start:
+            raise ValueError(f"Invalid page range: {part!r}")
+        ranges.append((start, end))
+    if not ranges:
+        raise ValueError("Empty page selection")
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def page_shards(num_pages, shard_pages):
+    """Split pages 1..num_pages into inclusive (start, end) ranges."""
+    return [(start, min(start + shard_pages - 1, num_pages)) for start in range(1, num_pages + 1, shard_pages)]
+
+
+async def gather_or_cancel(coros):
+    """
+    asyncio.gather, except that the first failure cancels the coroutines
+    still queued or running instead of leaving them to convert for nobody.
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def merge_payloads(payloads):
+    """
+    Merge per-shard payloads (already in page order) into one payload,
+    renumbering tables so `table_index` stays document-wide.
+    """
+    tables = []
+    for payload in payloads:
+        for table in payload["tables"]:
+            tables.append({**table, "table_index": len(tables)})
+    return {
+        "num_pages": sum(p["num_pages"] for p in payloads),
+        "markdown": "\n\n".join(p["markdown"] for p in payloads if p["markdown"]),
+        "tables": tables,
+        "documents": [doc for p in payloads for doc in p["documents"]],
+    }
+
+
+async def convert_pdf(source, shard_pages=None, parallelism=None, profile="default", page_ranges=None, **kwargs):
+    """
+    Convert a PDF off the event loop and return its conversion payload
+    (see `conversion_payload`).
+
+    Large documents are split into `shard_pages`-page ranges that are
+    converted concurrently (at most `parallelism` at a time) and merged back
+    in page order. `shard_pages=0` disables sharding; None uses the
+    DOCLING_SHARD_* defaults; other values are raised to
+    DOCLING_MIN_SHARD_PAGES, and `parallelism` is capped at the pool size.
+    `page_ranges` restricts conversion to the given (start, end) ranges, and
+    `profile` picks the converter configuration ("default" or "tables").
+    If one shard fails, the rest are cancelled.
+    """
+    kwargs["profile"] = profile
+    parallelism = min(parallelism or DOCLING_SHARD_PARALLELISM, DOCLING_POOL_SIZE)
+    if page_ranges:
+        semaphore = asyncio.Semaphore(parallelism)
+
+        async def convert_range(page_range):
+            async with semaphore:
+                return await _convert_unsharded(source, page_range=tuple(page_range), **kwargs)
+
+        return merge_payloads(await gather_or_cancel(convert_range(r) for r in page_ranges))
+
+    if shard_pages is None:
+        shard_pages = DOCLING_SHARD_PAGES
+        min_pages = DOCLING_SHARD_MIN_PAGES
+    elif shard_pages > 0:
+        shard_pages = max(shard_pages, DOCLING_MIN_SHARD_PAGES)
+        min_pages = shard_pages
+    if shard_pages <= 0 or "page_range" in kwargs:
+        return await _convert_unsharded(source, **kwargs)
+
+    num_pages = await run_in_threadpool(pdf_page_count, source)
+    if num_pages <= min_pages:
+        return await _convert_unsharded(source, **kwargs)
+
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def convert_shard(page_range):
+        async with semaphore:
+            return await _convert_unsharded(source, page_range=page_range, **kwargs)
+
+    payloads = await gather_or_cancel(convert_shard(r) for r in page_shards(num_pages, shard_pages))
+    return merge_payloads(payloads)
+
+
+def warm_up():
+    if DOCLING_EXECUTOR == "thread":
+        converter_pools["default"].warm_up()
+    else:
+        process_pool.warm_up()
+
+
+def shutdown():
+    process_pool.shutdown()
+
+
+def pool_stats():
+    if DOCLING_EXECUTOR == "thread":
+        return {"executor": "thread", "profiles": {name: pool.stats() for name, pool in converter_pools.items()}}
+    return {"executor": "process", **process_pool.stats()}
@@ -0,0 +1,311 @@
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.graph_cache import GRAPH_META_LABEL, graph_version
+from utils.graph_utils import GRAPH_EXPORT_FETCH_SIZE, NODE_KEYS
+
+# scipy is only needed for the local analytics engine.
+try:
+    import scipy.sparse as sp
+    from scipy.sparse.csgraph import connected_components, shortest_path
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+PAGERANK_MAX_ITERATIONS = int(os.environ.get("PAGERANK_MAX_ITERATIONS", "100"))
+PAGERANK_TOLERANCE = float(os.environ.get("PAGERANK_TOLERANCE", "1e-7"))
+# Sources used to estimate betweenness, and the budget (nodes x sources
+# cells) of one batched BFS.
+BETWEENNESS_SAMPLES = int(os.environ.get("BETWEENNESS_SAMPLES", "64"))
+BETWEENNESS_MAX_SAMPLES = int(os.environ.get("BETWEENNESS_MAX_SAMPLES", "1024"))
+BETWEENNESS_BATCH_CELLS = int(os.environ.get("BETWEENNESS_BATCH_CELLS", str(8 * 1024 * 1024)))
+# Results (per metric and parameters) kept for the current graph version.
+ANALYTICS_CACHE_MAX_RESULTS = int(os.environ.get("ANALYTICS_CACHE_MAX_RESULTS", "32"))
+# Most rows an /analytics endpoint returns.
+ANALYTICS_MAX_TOP = int(os.environ.get("ANALYTICS_MAX_TOP", "1000"))
+
+# A node's key is the id property of its own label (see NODE_KEYS), so e.g.
+# DealMetrics nodes, which carry their deal's dealId, have none.
+NODE_KEY_CASE = "CASE labels(n)[0] " + " ".join(
+    f"WHEN '{label}' THEN n.{key}" for key, label in NODE_KEYS.items()
+) + " END"
+
+NODES_QUERY = f"""
+MATCH (n) WHERE NOT n:{GRAPH_META_LABEL}
+RETURN id(n) AS id, labels(n)[0] AS label,
+       {NODE_KEY_CASE} AS key,
+       coalesce(n.fullName, n.name) AS name
+"""
+
+RELATIONSHIPS_QUERY = """
+MATCH (a)-[r]->(b)
+RETURN id(a) AS source, id(b) AS target
+"""
+
+
+class GraphSnapshot:
+    """
+    The graph exported once into memory: node metadata plus an undirected,
+    unweighted CSR adjacency matrix over all relationship types (the same
+    projection as the GDS 'myGraph').
+    """
+
+    def __init__(self, version, node_ids, label_codes, label_names, keys, names, adjacency, export_seconds):
+        self.version = version
+        self.node_ids = node_ids
+        self.label_codes = label_codes
+        self.label_names = label_names
+        self.keys = keys
+        self.names = names
+        self.adjacency = adjacency
+        self.export_seconds = export_seconds
+        self._index_of_key = None
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    def index_of_key(self, key, value):
+        """Row of the node whose `key` (personId, orgId, dealId or schoolId) is `value`, or None."""
+        if self._index_of_key is None:
+            self._index_of_key = {
+                (self.label_names[self.label_codes[i]], k): i for i, k in enumerate(self.keys) if k is not None
+            }
+        return self._index_of_key.get((NODE_KEYS.get(key), value))
+
+    def label_mask(self, label):
+        if label is None:
+            return np.ones(self.num_nodes, dtype=bool)
+        if label not in self.label_names:
+            return np.zeros(self.num_nodes, dtype=bool)
+        return self.label_codes == self.label_names.index(label)
+
+    def describe(self, index, **values):
+        return {
+            "id": int(self.node_ids[index]),
+            "label": self.label_names[self.label_codes[index]],
+            "key": self.keys[index],
+            "name": self.names[index],
+            **values,
+        }
+
+    def top(self, scores, top=20, label=None, name="score"):
+        """The `top` highest-scoring nodes (optionally of one label), best first."""
+        candidates = np.flatnonzero(self.label_mask(label))
+        if len(candidates) > top:
+            candidates = candidates[np.argpartition(-scores[candidates], top - 1)[:top]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [self.describe(i, **{name: float(scores[i])}) for i in candidates]
+
+
+def export_snapshot(driver, version):
+    """Stream nodes and relationships out of Neo4j into a GraphSnapshot."""
+    started = time.perf_counter()
+    node_ids = array("q")
+    label_codes = array("i")
+    label_names, label_index = [], {}
+    keys, names = [], []
+    sources, targets = array("q"), array("q")
+    with driver.session(fetch_size=GRAPH_EXPORT_FETCH_SIZE) as session:
+        for record in session.run(NODES_QUERY):
+            label = record["label"]
+            if label not in label_index:
+                label_index[label] = len(label_names)
+                label_names.append(label)
+            node_ids.append(record["id"])
+            label_codes.append(label_index[label])
+            keys.append(record["key"])
+            names.append(record["name"])
+        row_of = {node_id: i for i, node_id in enumerate(node_ids)}
+        for record in session.run(RELATIONSHIPS_QUERY):
+            source, target = row_of.get(record["source"]), row_of.get(record["target"])
+            if source is not None and target is not None:
+                sources.append(source)
+                targets.append(target)
+
+    n = len(node_ids)
+    sources = np.frombuffer(sources, dtype=np.int64) if len(sources) else np.empty(0, dtype=np.int64)
+    targets = np.frombuffer(targets, dtype=np.int64) if len(targets) else np.empty(0, dtype=np.int64)
+    adjacency = sp.coo_matrix((np.ones(len(sources), dtype=np.float64), (sources, targets)), shape=(n, n)).tocsr()
+    # Undirected, no self-loops, parallel relationships collapsed to one edge.
+    adjacency = (adjacency + adjacency.T).tocsr()
+    adjacency.setdiag(0)
+    adjacency.eliminate_zeros()
+    adjacency.data[:] = 1.0
+    return GraphSnapshot(
+        version,
+        np.frombuffer(node_ids, dtype=np.int64) if n else np.empty(0, dtype=np.int64),
+        np.frombuffer(label_codes, dtype=np.int32) if n else np.empty(0, dtype=np.int32),
+        label_names, keys, names, adjacency, time.perf_counter() - started,
+    )
+
+
+def degree(adjacency):
+    return np.diff(adjacency.indptr).astype(np.float64)
+
+
+def pagerank(adjacency, damping=0.85, max_iterations=PAGERANK_MAX_ITERATIONS, tolerance=PAGERANK_TOLERANCE):
+    """Power iteration; dangling nodes spread their rank uniformly."""
+    n = adjacency.shape[0]
+    if n == 0:
+        return np.empty(0), 0
+    out_degree = degree(adjacency)
+    inverse = np.divide(1.0, out_degree, out=np.zeros(n), where=out_degree > 0)
+    dangling = out_degree == 0
+    rank = np.full(n, 1.0 / n)
+    for iteration in range(1, max_iterations + 1):
+        # The adjacency is symmetric, so A @ x is also A.T @ x.
+        new_rank = damping * (adjacency @ (rank * inverse))
+        new_rank += (damping * rank[dangling].sum() + 1.0 - damping) / n
+        converged = np.abs(new_rank - rank).sum() < tolerance
+        rank = new_rank
+        if converged:
+            break
+    return rank, iteration
+
+
+def betweenness(adjacency, samples=BETWEENNESS_SAMPLES, seed=0):
+    """
+    Sampled Brandes betweenness: exact dependencies from `samples` random
+    sources, scaled to all n. A batch of sources is processed together, so
+    every BFS level (forward path counting and backward dependency
+    accumulation) is one sparse x dense matrix product.
+    """
+    n = adjacency.shape[0]
+    scores = np.zeros(n)
+    if n == 0:
+        return scores
+    rng = np.random.default_rng(seed)
+    sources = rng.choice(n, min(samples, n), replace=False)
+    batch_size = max(1, min(len(sources), BETWEENNESS_BATCH_CELLS // n))
+    for start in range(0, len(sources), batch_size):
+        batch = sources[start:start + batch_size]
+        columns = np.arange(len(batch))
+        sigma = np.zeros((n, len(batch)))
+        sigma[batch, columns] = 1.0
+        visited = sigma > 0
+        frontier = sigma.copy()
+        levels = [visited.copy()]
+        while True:
+            reached = adjacency @ frontier
+            reached[visited] = 0.0
+            level = reached > 0
+            if not level.any():
+                break
+            visited |= level
+            sigma += reached
+            frontier = reached
+            levels.append(level)
+        delta = np.zeros((n, len(batch)))
+        safe_sigma = np.where(sigma > 0, sigma, 1.0)
+        for depth in range(len(levels) - 1, 0, -1):
+            coefficient = np.where(levels[depth], (1.0 + delta) / safe_sigma, 0.0)
+            delta += np.where(levels[depth - 1], sigma * (adjacency @ coefficient), 0.0)
+        delta[batch, columns] = 0.0
+        scores += delta.sum(axis=1)
+    # Scale the sample up to all sources; each undirected path is counted from both ends.
+    return scores * (n / len(sources)) / 2.0
+
+
+def components(adjacency):
+    count, labels = connected_components(adjacency, directed=False)
+    return count, labels, np.bincount(labels, minlength=count)
+
+
+def path_between(adjacency, source, target):
+    """Rows on a shortest (unweighted) path from source to target, or None."""
+    _, predecessors = shortest_path(adjacency, directed=False, unweighted=True, indices=source, return_predecessors=True)
+    if source != target and predecessors[target] < 0:
+        return None
+    path = [target]
+    while path[-1] != source:
+        path.append(int(predecessors[path[-1]]))
+    return path[::-1]
+
+
+class GraphAnalytics:
+    """
+    Local graph analytics that need neither GDS nor any Neo4j plugin.
+
+    The graph is exported once per graph version (see utils/graph_cache.py)
+    into a SciPy sparse adjacency matrix. Results are cached per version and
+    parameters (at most ANALYTICS_CACHE_MAX_RESULTS, least recently used
+    dropped first), so dashboards re-reading the same metric cost nothing
+    until the graph changes.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self._exports = {}
+        self._timings = {}
+
+    def _current(self, version):
+        with self._lock:
+            if self._snapshot is not None and self._snapshot.version == version:
+                return self._snapshot
+            return None
+
+    def snapshot(self, driver):
+        """
+        The snapshot of the current graph version. A new version is exported
+        once, by the first caller, while the others wait for it; the export
+        runs outside the main lock, so stats and cached results stay available.
+        """
+        version = graph_version.current(driver)
+        snapshot = self._current(version)
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            export_lock = self._exports.setdefault(version, threading.Lock())
+        with export_lock:
+            snapshot = self._current(version)
+            if snapshot is not None:
+                return snapshot
+            snapshot = export_snapshot(driver, version)
+            with self._lock:
+                self._snapshot = snapshot
+                self._results.clear()
+                self._exports.pop(version, None)
+            print(f"Graph snapshot {version} exported in {snapshot.export_seconds:.2f}s "
+                  f"({snapshot.num_nodes} nodes, {snapshot.adjacency.nnz // 2} edges).")
+            return snapshot
+
+    def compute(self, driver, name, params, fn):
+        """fn(snapshot) cached under (name, params) for the current graph version."""
+        snapshot = self.snapshot(driver)
+        key = (snapshot.version, name, params)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return snapshot, self._results[key]
+        started = time.perf_counter()
+        value = fn(snapshot)
+        with self._lock:
+            if self._snapshot is snapshot:
+                self._results[key] = value
+                while len(self._results) > ANALYTICS_CACHE_MAX_RESULTS:
+                    self._results.popitem(last=False)
+            self._timings[name] = round(time.perf_counter() - started, 4)
+        return snapshot, value
+
+    def stats(self):
+        with self._lock:
+            snapshot = self._snapshot
+            return {
+                "version": snapshot.version if snapshot else None,
+                "nodes": snapshot.num_nodes if snapshot else None,
+                "edges": snapshot.adjacency.nnz // 2 if snapshot else None,
+                "export_seconds": round(snapshot.export_seconds, 3) if snapshot else None,
+                "cached_results": len(self._results),
+                "last_compute_seconds": dict(self._timings),
+            }
+
+
+graph_analytics = GraphAnalytics()
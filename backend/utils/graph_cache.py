@@ -0,0 +1,149 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi.responses import Response
+
+from utils.graph_payload import accepts_gzip, maybe_gzip
+from utils.http_cache import etag_matches
+from utils.graph_meta import GRAPH_META_LABEL, BUMP_GRAPH_VERSION_QUERY, bump_graph_version  # noqa: F401
+
+# The graph version is probed at most this often; within the window the last
+# probe result is reused, so a burst of page loads costs one probe.
+GRAPH_VERSION_PROBE_SECONDS = float(os.environ.get("GRAPH_VERSION_PROBE_SECONDS", "2"))
+GRAPH_SNAPSHOT_MAX_BYTES = int(os.environ.get("GRAPH_SNAPSHOT_MAX_BYTES", str(256 * 1024 * 1024)))
+
+GRAPH_VERSION_QUERY = f"""
+OPTIONAL MATCH (m:{GRAPH_META_LABEL} {{key: 'graph'}})
+WITH coalesce(m.version, 0) AS version
+CALL {{ MATCH (n) RETURN count(n) AS nodes }}
+CALL {{ MATCH ()-[r]->() RETURN count(r) AS relationships }}
+RETURN version, nodes, relationships
+"""
+
+
+class GraphVersion:
+    """
+    The current graph version as a string token. It combines the writers'
+    counter with the node and relationship counts, which Neo4j answers from
+    its count store, so writers that forget to bump are caught too, as long
+    as they add or delete something.
+    """
+
+    def __init__(self, probe_seconds=GRAPH_VERSION_PROBE_SECONDS):
+        self.probe_seconds = probe_seconds
+        self._token = None
+        self._probed_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self, driver):
+        with self._lock:
+            if self._token is not None and time.monotonic() - self._probed_at < self.probe_seconds:
+                return self._token
+        with driver.session() as session:
+            record = session.run(GRAPH_VERSION_QUERY).single()
+        token = f"{record['version']}.{record['nodes']}.{record['relationships']}"
+        with self._lock:
+            self._token = token
+            self._probed_at = time.monotonic()
+        return token
+
+    def invalidate(self):
+        """Forget the last probe (e.g. after this process wrote to the graph)."""
+        with self._lock:
+            self._token = None
+
+
+class GraphSnapshotCache:
+    """
+    Serialized graph responses keyed by request (endpoint, parameters,
+    encoding) and tagged with the graph version they were built from. An
+    entry is only served while the version is unchanged. Entries are evicted
+    least recently used first, by total size.
+    """
+
+    def __init__(self, max_bytes=GRAPH_SNAPSHOT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, body, media_type, headers):
+        entry = (version, body, media_type, headers)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            if len(body) > self.max_bytes:
+                return entry
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[1])
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+            }
+
+
+graph_version = GraphVersion()
+graph_snapshots = GraphSnapshotCache()
+
+
+def snapshot_etag(version, key):
+    return '"' + hashlib.sha256(repr((version, key)).encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def cached_graph_response(driver, request, key, build):
+    """
+    Serve a graph response from the snapshot cache, with an ETag tied to the
+    graph version and `no-cache` so clients revalidate. An If-None-Match that
+    still matches gets 304 without touching the graph or serializing anything.
+    `build()` returns (body bytes, media type) and only runs on a cache miss.
+    """
+    use_gzip = accepts_gzip(request)
+    key = (*key, use_gzip)
+    version = graph_version.current(driver)
+    etag = snapshot_etag(version, key)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag_matches(request, etag):
+        graph_snapshots.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    entry = graph_snapshots.get(key, version)
+    if entry is None:
+        body, media_type = build()
+        body, encoding_headers = maybe_gzip(body, use_gzip)
+        entry = graph_snapshots.put(key, version, body, media_type, encoding_headers)
+    _, body, media_type, encoding_headers = entry
+    return Response(content=body, media_type=media_type, headers={**headers, **encoding_headers})
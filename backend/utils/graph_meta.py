@@ -0,0 +1,19 @@
+# The graph version marker, shared by the API and standalone scripts such as
+# scripts/populate_neo4j.py, so it must not import the web stack.
+
+# Singleton node holding the version counter that writers bump.
+GRAPH_META_LABEL = "GraphMeta"
+
+BUMP_GRAPH_VERSION_QUERY = f"""
+MERGE (m:{GRAPH_META_LABEL} {{key: 'graph'}})
+SET m.version = coalesce(m.version, 0) + 1, m.updatedAt = datetime()
+RETURN m.version AS version
+"""
+
+
+def bump_graph_version(session):
+    """
+    Mark the graph as changed. Every writer (ingestion, populate_neo4j, ...)
+    calls this after committing, so cached snapshots are invalidated.
+    """
+    return session.run(BUMP_GRAPH_VERSION_QUERY).single()["version"]
@@ -0,0 +1,178 @@
+import gzip
+import io
+import json
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+# msgpack and pyarrow are only needed for the binary graph formats.
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# json: the original one-dict-per-element payload; the others use the columnar layout.
+GRAPH_FORMATS = ("json", "columnar", "msgpack", "arrow")
+ARROW_PARTS = ("nodes", "relationships")
+GZIP_MIN_BYTES = 1024
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "columnar": "application/json",
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def _columns(elements, fixed_keys):
+    """
+    Split graph elements into per-key columns: the keys other than
+    `fixed_keys` (e.g. a node's `hop`) and each property become one array,
+    with null where an element lacks the key.
+    """
+    extra = {}
+    properties = {}
+    for i, element in enumerate(elements):
+        for target, values in ((extra, {k: v for k, v in element.items() if k not in fixed_keys}),
+                               (properties, element.get("properties") or {})):
+            for key, value in values.items():
+                target.setdefault(key, [None] * i).append(value)
+            for column in target.values():
+                if len(column) <= i:
+                    column.append(None)
+    return extra, properties
+
+
+def columnar_graph(graph):
+    """
+    Re-encode a {"nodes": [...], "relationships": [...]} graph column-wise:
+
+      labels / types          dictionaries of label sets and relationship types
+      nodes.id, .label_code   parallel arrays, one entry per node
+      relationships.src/.dst  start / end node ids, with .type_code and .id
+      *.properties            one array per property key (null where absent)
+
+    Other top-level keys (e.g. `center`, `truncated`) are passed through.
+    """
+    label_sets, label_codes = [], {}
+    types, type_codes = [], {}
+    nodes = graph.get("nodes", [])
+    relationships = graph.get("relationships", [])
+
+    node_label_codes = []
+    for node in nodes:
+        labels = tuple(node.get("labels") or ())
+        if labels not in label_codes:
+            label_codes[labels] = len(label_sets)
+            label_sets.append(list(labels))
+        node_label_codes.append(label_codes[labels])
+    node_extra, node_properties = _columns(nodes, ("id", "labels", "properties"))
+
+    rel_type_codes = []
+    for rel in relationships:
+        if rel["type"] not in type_codes:
+            type_codes[rel["type"]] = len(types)
+            types.append(rel["type"])
+        rel_type_codes.append(type_codes[rel["type"]])
+    rel_extra, rel_properties = _columns(relationships, ("id", "type", "startNode", "endNode", "properties"))
+
+    return {
+        **{k: v for k, v in graph.items() if k not in ("nodes", "relationships")},
+        "layout": "columnar",
+        "labels": label_sets,
+        "types": types,
+        "nodes": {
+            "id": [node["id"] for node in nodes],
+            "label_code": node_label_codes,
+            **node_extra,
+            "properties": node_properties,
+        },
+        "relationships": {
+            "id": [rel["id"] for rel in relationships],
+            "src": [rel["startNode"] for rel in relationships],
+            "dst": [rel["endNode"] for rel in relationships],
+            "type_code": rel_type_codes,
+            **rel_extra,
+            "properties": rel_properties,
+        },
+    }
+
+
+def _arrow_column(values):
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed types in one property: fall back to strings.
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def _arrow_table(columnar, part):
+    section = columnar[part]
+    dictionary = [":".join(labels) for labels in columnar["labels"]] if part == "nodes" else columnar["types"]
+    code_key = "label_code" if part == "nodes" else "type_code"
+    columns = {}
+    for key, values in section.items():
+        if key == "properties":
+            continue
+        if key == code_key:
+            columns["labels" if part == "nodes" else "type"] = pa.DictionaryArray.from_arrays(
+                pa.array(values, type=pa.int32()), pa.array(dictionary, type=pa.string())
+            )
+        else:
+            columns[key] = _arrow_column(values)
+    for key, values in section["properties"].items():
+        columns[f"properties.{key}"] = _arrow_column(values)
+    return pa.table(columns)
+
+
+def encode_graph(graph, fmt="json", part="nodes"):
+    """
+    Serialize a graph payload. Returns (body bytes, media type). Arrow holds
+    one table per stream, so `part` picks nodes or relationships.
+    """
+    if fmt not in GRAPH_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {GRAPH_FORMATS}")
+    if fmt == "json":
+        return json.dumps(graph, default=str).encode("utf-8"), MEDIA_TYPES[fmt]
+    columnar = columnar_graph(graph)
+    if fmt == "columnar":
+        return json.dumps(columnar, default=str, separators=(",", ":")).encode("utf-8"), MEDIA_TYPES[fmt]
+    if fmt == "msgpack":
+        if not MSGPACK_AVAILABLE:
+            raise HTTPException(status_code=400, detail="msgpack output requires msgpack to be installed.")
+        return msgpack.packb(columnar, default=str, use_bin_type=True), MEDIA_TYPES[fmt]
+    if not PYARROW_AVAILABLE:
+        raise HTTPException(status_code=400, detail="Arrow output requires pyarrow to be installed.")
+    if part not in ARROW_PARTS:
+        raise HTTPException(status_code=400, detail=f"part must be one of {ARROW_PARTS}")
+    table = _arrow_table(columnar, part)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue(), MEDIA_TYPES[fmt]
+
+
+def accepts_gzip(request):
+    return "gzip" in request.headers.get("accept-encoding", "").lower()
+
+
+def maybe_gzip(body, use_gzip):
+    """Returns (body, headers), gzip-compressing bodies worth compressing."""
+    if use_gzip and len(body) >= GZIP_MIN_BYTES:
+        return gzip.compress(body, compresslevel=6), {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+    return body, {"Vary": "Accept-Encoding"}
+
+
+def graph_response(graph, fmt, request, part="nodes"):
+    """Encode a graph payload and gzip it when the client accepts it."""
+    body, media_type = encode_graph(graph, fmt, part)
+    body, headers = maybe_gzip(body, accepts_gzip(request))
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -1,4 +1,32 @@
 from neo4j import GraphDatabase
+from collections import defaultdict
+import json
+import os
+import re
+
+from utils.graph_meta import GRAPH_META_LABEL
+
+# Records pulled from Neo4j per network round trip while streaming an export.
+GRAPH_EXPORT_FETCH_SIZE = int(os.environ.get("GRAPH_EXPORT_FETCH_SIZE", "2000"))
+
+# Bounds for k-hop neighbourhood requests.
+NEIGHBOURHOOD_MAX_HOPS = int(os.environ.get("NEIGHBOURHOOD_MAX_HOPS", "3"))
+NEIGHBOURHOOD_MAX_NODES = int(os.environ.get("NEIGHBOURHOOD_MAX_NODES", "500"))
+NEIGHBOURHOOD_MAX_DEGREE = int(os.environ.get("NEIGHBOURHOOD_MAX_DEGREE", "100"))
+
+# Lookup keys backed by the unique constraints created in scripts/populate_neo4j.py.
+NODE_KEYS = {
+    "personId": "Person",
+    "orgId": "Organization",
+    "dealId": "Deal",
+    "schoolId": "School",
+}
+
+EXPORT_ENTITIES = ("all", "nodes", "relationships")
+EXPORT_FORMATS = ("ndjson", "json")
+
+# Labels, relationship types and property keys are spliced into Cypher, so only plain names are accepted.
+NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
 
 def get_full_graph(driver):
     """
@@ -6,8 +34,8 @@ def get_full_graph(driver):
     """
     with driver.session() as session:
         # Fetch all nodes
-        query_nodes = """
-        MATCH (n)
+        query_nodes = f"""
+        MATCH (n) WHERE NOT n:{GRAPH_META_LABEL}
         RETURN ID(n) as id, labels(n) as labels, properties(n) as props
         """
         nodes_result = session.run(query_nodes)
@@ -47,3 +75,236 @@ def get_full_graph(driver):
             "nodes": nodes,
             "relationships": relationships
         }
+
+def check_names(names, what):
+    """Validate labels / relationship types / property keys before they go into Cypher."""
+    if not names:
+        return None
+    for name in names:
+        if not NAME_RE.match(name):
+            raise ValueError(f"Invalid {what}: {name!r}")
+    return list(names)
+
+def property_projection(var, properties):
+    """`properties(n)`, or a map projection of only the requested keys."""
+    if properties is None:
+        return f"properties({var})"
+    return var + " {" + ", ".join(f".{key}" for key in properties) + "}"
+
+def label_predicate(var, labels):
+    if not labels:
+        return "true"
+    return "(" + " OR ".join(f"{var}:{label}" for label in labels) + ")"
+
+def parse_export_cursor(cursor):
+    """
+    Export cursors look like "nodes:<id>" or "relationships:<id>": the phase
+    to resume in and the last internal id already sent.
+    """
+    if not cursor:
+        return "nodes", -1
+    phase, _, after = cursor.partition(":")
+    if phase not in ("nodes", "relationships"):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    try:
+        return phase, int(after)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+def export_graph(driver, entity="all", labels=None, rel_types=None, properties=None, cursor=None, limit=None):
+    """
+    Stream the graph (or the part matching the filters) straight from the
+    Neo4j result cursor. Pages (`limit`) are ordered by internal id, which
+    makes Neo4j sort the matching rows before sending the first one; an
+    unpaginated export is sent unordered, as rows are found.
+
+    Arguments are validated eagerly; the returned generator yields one dict
+    per node ({"kind": "node", ...}) and relationship ({"kind":
+    "relationship", ...}), then a final {"kind": "end", "next": cursor}.
+    `next` resumes the export when `limit` cut the page short, and is None
+    once everything was sent. With `labels`, only relationships between
+    matching nodes are exported. `properties` restricts the property keys returned.
+    """
+    if entity not in EXPORT_ENTITIES:
+        raise ValueError(f"entity must be one of {EXPORT_ENTITIES}")
+    labels = check_names(labels, "label")
+    rel_types = check_names(rel_types, "relationship type")
+    properties = check_names(properties, "property") if properties is not None else None
+    phase, after = parse_export_cursor(cursor)
+    if entity == "relationships" and phase == "nodes":
+        phase, after = "relationships", -1
+    if limit is not None and limit <= 0:
+        raise ValueError("limit must be positive")
+
+    node_query = f"""
+    MATCH (n)
+    WHERE id(n) > $after AND NOT n:{GRAPH_META_LABEL} AND {label_predicate("n", labels)}
+    RETURN id(n) AS id, labels(n) AS labels, {property_projection("n", properties)} AS props
+    """
+    rel_pattern = ":" + "|".join(rel_types) if rel_types else ""
+    rel_query = f"""
+    MATCH (a)-[r{rel_pattern}]->(b)
+    WHERE id(r) > $after AND {label_predicate("a", labels)} AND {label_predicate("b", labels)}
+    RETURN id(r) AS id, type(r) AS type, id(a) AS startNode, id(b) AS endNode, {property_projection("r", properties)} AS props
+    """
+    # Cursors need id order, but ORDER BY is an eager sort of every matching
+    # row, so only pages pay for it.
+    node_page = " ORDER BY id(n) LIMIT $limit" if limit is not None else ""
+    rel_page = " ORDER BY id(r) LIMIT $limit" if limit is not None else ""
+
+    def records():
+        sent = {"nodes": 0, "relationships": 0}
+        remaining = limit
+        next_cursor = None
+        with driver.session(fetch_size=GRAPH_EXPORT_FETCH_SIZE) as session:
+            if phase == "nodes" and entity in ("all", "nodes"):
+                last_id = after
+                for record in session.run(node_query + node_page, after=after, limit=remaining):
+                    last_id = record["id"]
+                    sent["nodes"] += 1
+                    yield {"kind": "node", "id": last_id, "labels": record["labels"], "properties": record["props"]}
+                if remaining is not None:
+                    remaining -= sent["nodes"]
+                    if remaining == 0:
+                        next_cursor = f"nodes:{last_id}"
+            rel_after = after if phase == "relationships" else -1
+            if entity in ("all", "relationships") and next_cursor is None:
+                last_id = rel_after
+                for record in session.run(rel_query + rel_page, after=rel_after, limit=remaining):
+                    last_id = record["id"]
+                    sent["relationships"] += 1
+                    yield {
+                        "kind": "relationship",
+                        "id": last_id,
+                        "type": record["type"],
+                        "startNode": record["startNode"],
+                        "endNode": record["endNode"],
+                        "properties": record["props"],
+                    }
+                if remaining is not None and sent["relationships"] == remaining:
+                    next_cursor = f"relationships:{last_id}"
+        yield {"kind": "end", "next": next_cursor, "counts": sent}
+
+    return records()
+
+def format_graph_export(records, fmt="ndjson"):
+    """
+    Serialize `export_graph` records incrementally: one JSON object per line
+    (ndjson), or a single {"nodes": [...], "relationships": [...], "next": ...}
+    document written piece by piece (json).
+    """
+    if fmt == "ndjson":
+        for record in records:
+            yield json.dumps(record, default=str) + "\n"
+        return
+    section = None
+    for record in records:
+        kind = record.pop("kind")
+        if kind == "end":
+            opening = '{"nodes": [' if section is None else ""
+            if section in (None, "nodes"):
+                opening += '], "relationships": ['
+            yield opening + "], " + json.dumps(record, default=str)[1:]
+            return
+        target = "nodes" if kind == "node" else "relationships"
+        if section != target:
+            if section is None:
+                prefix = '{"nodes": [' if target == "nodes" else '{"nodes": [], "relationships": ['
+            else:
+                prefix = '], "relationships": ['
+            section = target
+        else:
+            prefix = ", "
+        yield prefix + json.dumps(record, default=str)
+
+def get_neighbourhood(driver, key, value, hops=1, max_nodes=NEIGHBOURHOOD_MAX_NODES,
+                      max_degree=NEIGHBOURHOOD_MAX_DEGREE, rel_types=None):
+    """
+    The k-hop ego network around the node whose `key` (personId, orgId,
+    dealId or schoolId) equals `value`, in the get_full_graph shape.
+
+    The centre is found through its unique-constraint index and the graph is
+    expanded one hop per query from the current frontier only, so the cost
+    follows the size of the neighbourhood rather than of the graph. At most
+    `max_degree` relationships are followed from any node (super-nodes are
+    listed in `capped`), and no more than `max_nodes` nodes are returned
+    (`truncated` is set when the budget cut the expansion short).
+    Returns None if no node matches.
+    """
+    label = NODE_KEYS.get(key)
+    if label is None:
+        raise ValueError(f"key must be one of {tuple(NODE_KEYS)}")
+    rel_types = check_names(rel_types, "relationship type")
+    rel_pattern = ":" + "|".join(rel_types) if rel_types else ""
+    hop_query = f"""
+    UNWIND $frontier AS nid
+    MATCH (n) WHERE id(n) = nid
+    CALL {{
+      WITH n
+      MATCH (n)-[r{rel_pattern}]-(m)
+      RETURN r, m
+      LIMIT $edge_limit
+    }}
+    RETURN nid, id(r) AS id, type(r) AS type, id(startNode(r)) AS startNode, id(endNode(r)) AS endNode,
+           properties(r) AS props, id(m) AS neighbour
+    """
+
+    with driver.session() as session:
+        center = session.run(f"MATCH (n:{label} {{{key}: $value}}) RETURN id(n) AS id", value=value).single()
+        if center is None:
+            return None
+        center_id = center["id"]
+        hop_of = {center_id: 0}
+        relationships = {}
+        capped = []
+        truncated = False
+        frontier = [center_id]
+        for hop in range(1, hops + 1):
+            if not frontier:
+                break
+            by_node = defaultdict(list)
+            for record in session.run(hop_query, frontier=frontier, edge_limit=max_degree + 1):
+                by_node[record["nid"]].append(record)
+            next_frontier = []
+            for node_id in frontier:
+                records = by_node.get(node_id, [])
+                if len(records) > max_degree:
+                    capped.append(node_id)
+                    records = records[:max_degree]
+                for record in records:
+                    neighbour = record["neighbour"]
+                    if neighbour not in hop_of:
+                        if len(hop_of) >= max_nodes:
+                            truncated = True
+                            continue
+                        hop_of[neighbour] = hop
+                        next_frontier.append(neighbour)
+                    relationships[record["id"]] = {
+                        "id": record["id"],
+                        "type": record["type"],
+                        "startNode": record["startNode"],
+                        "endNode": record["endNode"],
+                        "properties": record["props"],
+                    }
+            frontier = next_frontier
+
+        nodes = [
+            {"id": record["id"], "labels": record["labels"], "properties": record["props"], "hop": hop_of[record["id"]]}
+            for record in session.run(
+                """
+                UNWIND $ids AS nid
+                MATCH (n) WHERE id(n) = nid
+                RETURN id(n) AS id, labels(n) AS labels, properties(n) AS props
+                """,
+                ids=list(hop_of),
+            )
+        ]
+
+    return {
+        "center": center_id,
+        "hops": hops,
+        "nodes": nodes,
+        "relationships": list(relationships.values()),
+        "capped": capped,
+        "truncated": truncated,
+    }
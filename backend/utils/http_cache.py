@@ -0,0 +1,9 @@
+# Conditional GET helpers shared by the routes that send ETags.
+
+
+def etag_matches(request, etag):
+    """True if the request's If-None-Match lists `etag` (or is "*"), i.e. a 304 will do."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
@@ -0,0 +1,162 @@
+import os
+import re
+
+QA_PASSAGE_WORDS = int(os.environ.get("QA_PASSAGE_WORDS", "200"))
+QA_PASSAGE_OVERLAP_WORDS = int(os.environ.get("QA_PASSAGE_OVERLAP_WORDS", "40"))
+# Bumped whenever split_markdown chunks differently, so stored indexes are rebuilt.
+PASSAGE_SPLITTER_VERSION = 2
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def markdown_blocks(markdown):
+    """
+    Split markdown into blocks: ("heading", level, text, start),
+    ("table", None, text, start) and ("text", None, text, start), where
+    `start` is the character offset of the block in `markdown`. Consecutive
+    table rows form a single block.
+    """
+    blocks = []
+    current_kind = None
+    current_lines = []
+    current_start = 0
+    offset = 0
+
+    def flush():
+        if current_lines:
+            text = "\n".join(current_lines).strip()
+            if text:
+                blocks.append((current_kind, None, text, current_start))
+
+    for line in markdown.splitlines(keepends=True):
+        stripped = line.strip()
+        heading = HEADING_RE.match(stripped)
+        kind = "table" if stripped.startswith("|") else "text"
+        if heading or not stripped or kind != current_kind:
+            flush()
+            current_lines = []
+            current_kind = None
+        if heading:
+            blocks.append(("heading", len(heading.group(1)), heading.group(2).strip(), offset))
+        elif stripped:
+            if not current_lines:
+                current_kind = kind
+                current_start = offset
+            current_lines.append(line.rstrip("\n"))
+        offset += len(line)
+    flush()
+    return blocks
+
+
+def _split_long_text(text, max_words):
+    """Split an oversized paragraph on sentence boundaries (or words as a last resort)."""
+    pieces = []
+    current = []
+    for sentence in SENTENCE_RE.split(text):
+        words = sentence.split()
+        if len(words) > max_words:
+            if current:
+                pieces.append(" ".join(current))
+                current = []
+            pieces.extend(" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words))
+            continue
+        if len(current) + len(words) > max_words and current:
+            pieces.append(" ".join(current))
+            current = []
+        current.extend(words)
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def split_markdown(markdown, max_words=QA_PASSAGE_WORDS, overlap_words=QA_PASSAGE_OVERLAP_WORDS):
+    """
+    Chunk markdown into overlapping, section-aware passages.
+
+    - A new heading always starts a new passage, and every passage carries its
+      heading path (e.g. "Fund Overview > Key Terms") as `section`.
+    - Tables are never split: a table joins the current passage if it fits,
+      otherwise it becomes a passage of its own (however large).
+    - Text passages hold at most `max_words` words, overlap included (plus
+      the heading line); consecutive passages within a section share up to
+      `overlap_words` trailing words of text, less when the next block would
+      not fit otherwise.
+
+    Returns a list of dicts with `content`, `section`, `start` (character
+    offset of the passage's first block) and `has_table`.
+    """
+    passages = []
+    headings = []
+    current = []  # (kind, text) blocks of the passage being built
+    current_words = 0
+    current_start = None
+    carried = 0  # leading blocks of `current` that are overlap from the previous passage
+
+    def section():
+        return " > ".join(text for _, text in headings)
+
+    def emit():
+        nonlocal current, current_words, current_start, carried
+        if len(current) <= carried:
+            return
+        content = "\n\n".join(text for _, text in current)
+        if headings:
+            content = f"{'#' * headings[-1][0]} {headings[-1][1]}\n\n{content}"
+        passages.append({
+            "content": content,
+            "section": section(),
+            "start": current_start,
+            "has_table": any(kind == "table" for kind, _ in current),
+        })
+        # Carry trailing text (never tables) into the next passage as overlap.
+        overlap = []
+        if overlap_words > 0:
+            for kind, text in reversed(current):
+                if kind == "table":
+                    break
+                words = text.split()
+                take = words[-(overlap_words - len(overlap)):] if overlap_words > len(overlap) else []
+                overlap = take + overlap
+                if len(overlap) >= overlap_words:
+                    break
+        current = [("text", " ".join(overlap))] if overlap else []
+        current_words = len(overlap)
+        current_start = None
+        carried = len(current)
+
+    def add(kind, text, start):
+        nonlocal current, current_words, current_start, carried
+        words = len(text.split())
+        if len(current) > carried and current_words + words > max_words:
+            emit()
+        if carried and len(current) == carried and current_words + words > max_words:
+            # The overlap counts against max_words too: keep only what fits.
+            keep = max_words - words
+            overlap = current[0][1].split()[-keep:] if keep > 0 else []
+            current = [("text", " ".join(overlap))] if overlap else []
+            current_words = len(overlap)
+            carried = len(current)
+        if current_start is None:
+            current_start = start
+        current.append((kind, text))
+        current_words += words
+
+    for kind, level, text, start in markdown_blocks(markdown):
+        if kind == "heading":
+            emit()
+            current = []
+            current_words = 0
+            current_start = None
+            carried = 0
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, text))
+            continue
+        if kind == "text" and len(text.split()) > max_words:
+            for piece in _split_long_text(text, max_words):
+                add("text", piece, start)
+            continue
+        add(kind, text, start)
+    emit()
+    return passages
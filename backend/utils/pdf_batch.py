@@ -0,0 +1,163 @@
+import asyncio
+import os
+import time
+import zipfile
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from utils.docling_pool import DOCLING_POOL_SIZE, DOCLING_MAX_PENDING, DOCLING_SHARD_PARALLELISM
+from utils.pdf_processing import convert_spooled_pdf, save_pdf_stream, save_pdf_upload, MAX_PDF_UPLOAD_BYTES
+from utils.uploads import spool_upload
+
+BATCH_MAX_DOCUMENTS = int(os.environ.get("BATCH_MAX_DOCUMENTS", "500"))
+MAX_BATCH_UPLOAD_BYTES = int(os.environ.get("MAX_BATCH_UPLOAD_BYTES", str(2 * 1024 ** 3)))
+# Total uncompressed size of the PDFs extracted from one zip archive.
+MAX_BATCH_EXPANDED_BYTES = int(os.environ.get("MAX_BATCH_EXPANDED_BYTES", str(2 * MAX_BATCH_UPLOAD_BYTES)))
+# Each document may have up to DOCLING_SHARD_PARALLELISM shards in flight, so
+# more documents than this at once would overflow the pool's queue (503s).
+BATCH_MAX_CONCURRENCY = max(1, (DOCLING_POOL_SIZE + DOCLING_MAX_PENDING) // DOCLING_SHARD_PARALLELISM)
+BATCH_CONCURRENCY = min(int(os.environ.get("BATCH_CONCURRENCY", str(DOCLING_POOL_SIZE))), BATCH_MAX_CONCURRENCY)
+
+
+def _spool_zip_members(archive_path):
+    """
+    Save every PDF in a zip archive to its own temp file. Returns a list of
+    (filename, spooled or None, error or None); bad members don't stop the rest.
+    The archive is rejected with 413 once its PDFs add up to more than
+    MAX_BATCH_EXPANDED_BYTES, going by the sizes it declares and then by the
+    bytes actually extracted.
+    """
+    too_large = HTTPException(
+        status_code=413, detail=f"Archive expands to more than {MAX_BATCH_EXPANDED_BYTES} bytes of PDFs."
+    )
+    items = []
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            members = [m for m in archive.infolist() if not m.is_dir() and m.filename.lower().endswith(".pdf")]
+            if len(members) > BATCH_MAX_DOCUMENTS:
+                raise HTTPException(status_code=413, detail=f"Archive holds more than {BATCH_MAX_DOCUMENTS} PDFs.")
+            if sum(m.file_size for m in members) > MAX_BATCH_EXPANDED_BYTES:
+                raise too_large
+            remaining = MAX_BATCH_EXPANDED_BYTES
+            for member in members:
+                try:
+                    with archive.open(member) as fileobj:
+                        spooled = save_pdf_stream(fileobj, max_bytes=remaining)
+                    remaining -= spooled.size
+                    items.append((member.filename, spooled, None))
+                except HTTPException as e:
+                    # Declared sizes can lie; the batch budget ran out.
+                    if e.status_code == 413 and remaining < MAX_PDF_UPLOAD_BYTES:
+                        raise too_large
+                    items.append((member.filename, None, e.detail))
+                except Exception as e:
+                    items.append((member.filename, None, str(e)))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid zip archive.")
+    except BaseException:
+        for _, spooled, _ in items:
+            if spooled is not None:
+                spooled.discard()
+        raise
+    return items
+
+
+async def collect_batch_inputs(files=None, archive=None):
+    """
+    Spool multipart PDFs and/or the PDFs inside an uploaded zip archive to
+    disk. Returns a list of (filename, spooled or None, error or None).
+    """
+    items = []
+    try:
+        for upload in files or []:
+            try:
+                items.append((upload.filename, await save_pdf_upload(upload), None))
+            except HTTPException as e:
+                items.append((upload.filename, None, e.detail))
+        if archive is not None:
+            spooled_archive = await spool_upload(archive, suffix=".zip", max_bytes=MAX_BATCH_UPLOAD_BYTES)
+            try:
+                items.extend(await run_in_threadpool(_spool_zip_members, spooled_archive.path))
+            finally:
+                spooled_archive.discard()
+    except BaseException:
+        for _, spooled, _ in items:
+            if spooled is not None:
+                spooled.discard()
+        raise
+    if not items:
+        raise HTTPException(status_code=400, detail="No PDF files provided.")
+    if len(items) > BATCH_MAX_DOCUMENTS:
+        for _, spooled, _ in items:
+            if spooled is not None:
+                spooled.discard()
+        raise HTTPException(status_code=413, detail=f"Batch holds more than {BATCH_MAX_DOCUMENTS} PDFs.")
+    return items
+
+
+async def run_batch(items, concurrency=None, **convert_kwargs):
+    """
+    Convert spooled PDFs with at most `concurrency` in flight, yielding one
+    result per document as it finishes (errors are reported per document),
+    followed by a final {"summary": ...} with aggregate throughput.
+    `concurrency` is capped at BATCH_MAX_CONCURRENCY.
+    """
+    semaphore = asyncio.Semaphore(min(concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    started = time.perf_counter()
+
+    async def convert_one(index, filename, spooled, error):
+        if error is not None:
+            return {"index": index, "filename": filename, "status": "error", "detail": error}
+        async with semaphore:
+            doc_started = time.perf_counter()
+            try:
+                payload = await convert_spooled_pdf(spooled, **convert_kwargs)
+            except HTTPException as e:
+                return {"index": index, "filename": filename, "status": "error", "detail": e.detail}
+            except Exception as e:
+                return {"index": index, "filename": filename, "status": "error", "detail": str(e)}
+            finally:
+                spooled.discard()
+        return {
+            "index": index,
+            "filename": filename,
+            "status": "ok",
+            "sha256": spooled.sha256,
+            "num_pages": payload["num_pages"],
+            "seconds": round(time.perf_counter() - doc_started, 3),
+            "markdown": payload["markdown"],
+            "tables": [{"table_index": t["table_index"], "page_no": t["page_no"], "markdown": t["markdown"]} for t in payload["tables"]],
+        }
+
+    tasks = [asyncio.ensure_future(convert_one(i, *item)) for i, item in enumerate(items)]
+    succeeded = failed = pages = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            if result["status"] == "ok":
+                succeeded += 1
+                pages += result["num_pages"]
+            else:
+                failed += 1
+            yield result
+    finally:
+        # Client went away or we were cancelled: stop queued work and clean up.
+        for task in tasks:
+            task.cancel()
+        for _, spooled, _ in items:
+            if spooled is not None:
+                spooled.discard()
+
+    seconds = time.perf_counter() - started
+    yield {
+        "summary": {
+            "documents": len(items),
+            "succeeded": succeeded,
+            "failed": failed,
+            "pages": pages,
+            "seconds": round(seconds, 3),
+            "documents_per_second": round(len(items) / seconds, 3) if seconds else None,
+            "pages_per_second": round(pages / seconds, 3) if seconds else None,
+        }
+    }
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+
+from utils.docling_pool import (
+    convert_pdf, merge_payloads, pdf_page_count, ConversionQueueFull, DOCLING_SHARD_PARALLELISM,
+)
+from utils.conversion_cache import conversion_cache
+from utils.pdf_processing import conversion_key
+
+PDF_JOB_RETENTION_SECONDS = float(os.environ.get("PDF_JOB_RETENTION_SECONDS", "3600"))
+PDF_JOB_MAX_JOBS = int(os.environ.get("PDF_JOB_MAX_JOBS", "256"))
+# How long a page waits (with backoff) for room in a full conversion queue
+# before it is given up on.
+PDF_JOB_QUEUE_WAIT_SECONDS = float(os.environ.get("PDF_JOB_QUEUE_WAIT_SECONDS", "600"))
+PDF_JOB_QUEUE_RETRY_SECONDS = 0.5
+
+
+class PdfJob:
+    """
+    A PDF extraction running in the background, converted page by page.
+
+    Every state change is appended to `events`; followers replay the list
+    from the start and then wait for new entries, so late subscribers still
+    see every page.
+    """
+
+    def __init__(self, path, sha256, filename=None):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.sha256 = sha256
+        self.filename = filename
+        self.status = "queued"
+        self.num_pages = None
+        self.pages = {}
+        self.pages_done = 0
+        self.failed_pages = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.events = []
+        self._changed = asyncio.Condition()
+        self._task = None
+
+    @property
+    def finished(self):
+        return self.status in ("done", "partial", "error")
+
+    async def _emit(self, event, status=None):
+        async with self._changed:
+            self.events.append(event)
+            if status is not None:
+                # Set together with the final event so followers never see
+                # a finished job without its closing event.
+                self.status = status
+                self.finished_at = time.time()
+            self._changed.notify_all()
+
+    async def follow(self, start=0):
+        """Yield events from index `start`, waiting for new ones until the job finishes."""
+        index = start
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.events) > index or self.finished)
+                new_events = self.events[index:]
+            for event in new_events:
+                yield event
+            index += len(new_events)
+            if self.finished and index >= len(self.events):
+                return
+
+    async def _convert_page(self, page_no, semaphore):
+        """
+        Convert one page through the conversion cache (keyed like a
+        /process_pdf request for that page range). A full conversion queue is
+        waited out with backoff rather than failing the page.
+        """
+        page_ranges = [(page_no, page_no)]
+        key = conversion_key(self.sha256, page_ranges=page_ranges)
+        deadline = time.monotonic() + PDF_JOB_QUEUE_WAIT_SECONDS
+        delay = PDF_JOB_QUEUE_RETRY_SECONDS
+        async with semaphore:
+            while True:
+                try:
+                    return await conversion_cache.get_or_convert(
+                        key, lambda path: convert_pdf(path, page_ranges=page_ranges), self.path
+                    )
+                except ConversionQueueFull:
+                    if time.monotonic() + delay > deadline:
+                        raise
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 10.0)
+
+    async def run(self, parallelism=None):
+        started = time.perf_counter()
+        try:
+            self.status = "running"
+            self.num_pages = await run_in_threadpool(pdf_page_count, self.path)
+            await self._emit({"event": "started", "job_id": self.id, "num_pages": self.num_pages})
+
+            semaphore = asyncio.Semaphore(parallelism or DOCLING_SHARD_PARALLELISM)
+
+            async def convert_page(page_no):
+                try:
+                    return page_no, await self._convert_page(page_no, semaphore), None
+                except Exception as e:
+                    return page_no, None, str(e)
+
+            tasks = [convert_page(page_no) for page_no in range(1, self.num_pages + 1)]
+            for next_done in asyncio.as_completed(tasks):
+                page_no, payload, error = await next_done
+                if error is not None:
+                    self.failed_pages[page_no] = error
+                    await self._emit({"event": "page_error", "page_no": page_no, "detail": error})
+                    continue
+                self.pages[page_no] = payload
+                self.pages_done = len(self.pages)
+                await self._emit({
+                    "event": "page",
+                    "page_no": page_no,
+                    "pages_done": len(self.pages) + len(self.failed_pages),
+                    "num_pages": self.num_pages,
+                    "markdown": payload["markdown"],
+                    "tables": payload["tables"],
+                })
+
+            if self.num_pages and not self.pages:
+                raise RuntimeError(f"All {self.num_pages} pages failed to convert.")
+            merged = merge_payloads([self.pages[p] for p in sorted(self.pages)])
+            self.result = {"markdown": merged["markdown"], "tables": merged["tables"]}
+            status = "partial" if self.failed_pages else "done"
+            await self._emit({
+                "event": "done",
+                "status": status,
+                "num_pages": self.num_pages,
+                "failed_pages": sorted(self.failed_pages),
+                "seconds": round(time.perf_counter() - started, 3),
+            }, status=status)
+        except Exception as e:
+            self.error = str(e)
+            await self._emit({"event": "error", "detail": self.error}, status="error")
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._drop_page_payloads()
+
+    def _drop_page_payloads(self):
+        """
+        Once finished, keep only the merged result: forget the per-page
+        payloads (with their document JSON) and strip markdown and tables
+        from replayed page events, in place so followers' indexes stay valid.
+        """
+        self.pages = {}
+        self.events[:] = [
+            {k: v for k, v in event.items() if k not in ("markdown", "tables")} if event["event"] == "page" else event
+            for event in self.events
+        ]
+
+    def summary(self, include_result=False):
+        out = {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "num_pages": self.num_pages,
+            "pages_done": self.pages_done,
+            "failed_pages": self.failed_pages,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+        if include_result and self.result is not None:
+            out["result"] = {
+                "markdown": self.result["markdown"],
+                "tables": self.result["tables"],
+            }
+        return out
+
+
+class PdfJobRegistry:
+    """
+    In-process registry of extraction jobs. Finished jobs are kept for
+    PDF_JOB_RETENTION_SECONDS so their results can be fetched again.
+    """
+
+    def __init__(self, retention_seconds=PDF_JOB_RETENTION_SECONDS, max_jobs=PDF_JOB_MAX_JOBS):
+        self.retention_seconds = retention_seconds
+        self.max_jobs = max_jobs
+        self._jobs = {}
+
+    def _prune(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > self.retention_seconds:
+                del self._jobs[job_id]
+        finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished_at)
+        while len(self._jobs) >= self.max_jobs and finished:
+            del self._jobs[finished.pop(0).id]
+
+    def submit(self, path, sha256, filename=None, parallelism=None):
+        self._prune()
+        if len(self._jobs) >= self.max_jobs:
+            raise RuntimeError("Too many extraction jobs in progress, try again later.")
+        job = PdfJob(path, sha256, filename=filename)
+        self._jobs[job.id] = job
+        job._task = asyncio.create_task(job.run(parallelism=parallelism))
+        return job
+
+    def get(self, job_id):
+        self._prune()
+        return self._jobs.get(job_id)
+
+
+pdf_jobs = PdfJobRegistry()
+
+
+def format_event(event, fmt="ndjson"):
+    """Serialize one job event as an NDJSON line or a Server-Sent Event."""
+    data = json.dumps(event)
+    if fmt == "sse":
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
@@ -1,24 +1,95 @@
 from fastapi import UploadFile, HTTPException
-import tempfile
 import os
-from docling.document_converter import DocumentConverter
+from utils.docling_pool import convert_pdf, ConversionQueueFull
+from utils.conversion_cache import conversion_cache, cache_key
+from utils.uploads import spool_upload, spool_stream, SpooledUpload
 
-async def process_pdf_to_markdown(pdf_file: UploadFile) -> str:
-    if pdf_file.content_type != "application/pdf":
+MAX_PDF_UPLOAD_BYTES = int(os.environ.get("MAX_PDF_UPLOAD_BYTES", str(200 * 1024 ** 2)))
+PDF_MAGIC = b"%PDF-"
+
+async def save_pdf_upload(pdf_file: UploadFile) -> SpooledUpload:
+    """
+    Stream an uploaded PDF to a temporary file in fixed-size chunks, hashing
+    it on the way (the digest keys the conversion cache). Rejects uploads over
+    MAX_PDF_UPLOAD_BYTES (oversized request bodies are already refused by
+    UploadLimitMiddleware, see main.py) and anything without a PDF header,
+    whatever the declared content type. The caller removes the file.
+    """
+    spooled = await spool_upload(pdf_file, suffix=".pdf", max_bytes=MAX_PDF_UPLOAD_BYTES)
+    return check_pdf_header(spooled)
+
+def save_pdf_stream(fileobj, max_bytes=None) -> SpooledUpload:
+    """
+    Blocking variant of `save_pdf_upload` for file-like objects; `max_bytes`
+    lowers the MAX_PDF_UPLOAD_BYTES limit.
+    """
+    limit = MAX_PDF_UPLOAD_BYTES if max_bytes is None else min(max_bytes, MAX_PDF_UPLOAD_BYTES)
+    spooled = spool_stream(fileobj, suffix=".pdf", max_bytes=limit)
+    return check_pdf_header(spooled)
+
+def check_pdf_header(spooled: SpooledUpload) -> SpooledUpload:
+    # The header may be preceded by junk, but must be within the first 1024 bytes.
+    if PDF_MAGIC not in spooled.head:
+        spooled.discard()
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a PDF file.")
+    return spooled
+
+async def convert_pdf_upload(pdf_file: UploadFile, shard_pages=None, parallelism=None, profile="default", page_ranges=None, **convert_kwargs) -> dict:
+    """
+    Save an uploaded PDF to a temporary file and convert it off the event
+    loop. Returns the conversion payload (markdown, tables, documents),
+    reusing a cached conversion when the same bytes were converted before
+    with the same settings. `shard_pages`/`parallelism` control page-sharded
+    conversion of large documents; `profile` and `page_ranges` select the
+    converter configuration and pages (see `convert_pdf`).
+    """
+    spooled = await save_pdf_upload(pdf_file)
     try:
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-            content = await pdf_file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save uploaded PDF: {str(e)}")
+        return await convert_spooled_pdf(
+            spooled,
+            shard_pages=shard_pages,
+            parallelism=parallelism,
+            profile=profile,
+            page_ranges=page_ranges,
+            **convert_kwargs,
+        )
+    finally:
+        spooled.discard()
+
+def conversion_key(sha256, shard_pages=None, profile="default", page_ranges=None, **convert_kwargs):
+    """
+    Conversion cache key for a PDF and conversion settings; with no settings
+    it is the key of the shared whole-document conversion used by
+    /process_pdf, QA indexing and batch extraction.
+    """
+    return cache_key(sha256, {**convert_kwargs, "shard_pages": shard_pages, "profile": profile, "page_ranges": page_ranges})
+
+async def convert_spooled_pdf(spooled: SpooledUpload, shard_pages=None, parallelism=None, profile="default", page_ranges=None, **convert_kwargs) -> dict:
+    """
+    Convert an already-saved PDF through the conversion cache (see
+    `convert_pdf_upload`). The caller owns and removes the file, and may do
+    so as soon as this returns or is cancelled.
+    """
+    key = conversion_key(spooled.sha256, shard_pages=shard_pages, profile=profile, page_ranges=page_ranges, **convert_kwargs)
     try:
-        converter = DocumentConverter()
-        result = converter.convert(tmp_path)
-        markdown = result.document.export_to_markdown()
+        # The conversion converts its own copy of the file (see ConversionCache.get_or_convert).
+        return await conversion_cache.get_or_convert(
+            key,
+            lambda path: convert_pdf(
+                path,
+                shard_pages=shard_pages,
+                parallelism=parallelism,
+                profile=profile,
+                page_ranges=page_ranges,
+                **convert_kwargs,
+            ),
+            spooled.path,
+        )
+    except ConversionQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
-    finally:
-        os.remove(tmp_path)
-    return markdown
+
+async def process_pdf_to_markdown(pdf_file: UploadFile, shard_pages=None, parallelism=None) -> str:
+    payload = await convert_pdf_upload(pdf_file, shard_pages=shard_pages, parallelism=parallelism)
+    return payload["markdown"]
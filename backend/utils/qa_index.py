@@ -0,0 +1,328 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from haystack import Document
+
+from utils.qa_models import qa_models, QA_RETRIEVER_TOP_K
+from utils.corpus_index import corpus_index, top_k_rows
+from utils.passages import split_markdown, QA_PASSAGE_WORDS, QA_PASSAGE_OVERLAP_WORDS, PASSAGE_SPLITTER_VERSION
+
+QA_INDEX_DIR = os.environ.get("QA_INDEX_DIR", os.path.join("cache", "qa_index"))
+QA_INDEX_MAX_BYTES = int(os.environ.get("QA_INDEX_MAX_BYTES", str(1024 ** 3)))
+QA_INDEX_MAX_AGE_SECONDS = float(os.environ.get("QA_INDEX_MAX_AGE_SECONDS", str(30 * 24 * 3600)))
+# How many indexed documents are kept loaded in the shared in-memory store.
+QA_INDEX_RESIDENT_DOCS = int(os.environ.get("QA_INDEX_RESIDENT_DOCS", "32"))
+
+# doc_ids are the hex SHA-256 of the PDF; anything else never names an index.
+DOC_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+MANIFEST = "manifest.json"
+PASSAGES = "passages.json"
+EMBEDDINGS = "embeddings.npy"
+
+
+def index_settings():
+    """Settings an index was built with; a mismatch means it must be rebuilt."""
+    return {
+        "embedding_model": qa_models.embedding_model,
+        "passage_words": QA_PASSAGE_WORDS,
+        "overlap_words": QA_PASSAGE_OVERLAP_WORDS,
+        "splitter_version": PASSAGE_SPLITTER_VERSION,
+    }
+
+
+def build_passages(markdown, doc_id):
+    """
+    Turn a converted document's markdown into the passage Documents that get
+    embedded (see `split_markdown`). `split_id`/`source_id` let
+    SentenceWindowRetriever find neighbouring passages; `split_idx_start` is
+    the passage's offset in the concatenation of passages (so windows are
+    stitched without cutting text), while `char_start` points into the markdown.
+    """
+    documents = []
+    offset = 0
+    for split_id, passage in enumerate(split_markdown(markdown)):
+        documents.append(Document(content=passage["content"], meta={
+            "source": "docling",
+            "doc_id": doc_id,
+            "source_id": doc_id,
+            "split_id": split_id,
+            "split_idx_start": offset,
+            "char_start": passage["start"],
+            "section": passage["section"],
+            "has_table": passage["has_table"],
+        }))
+        offset += len(passage["content"])
+    return documents
+
+
+class DocumentIndex:
+    """
+    Persistent per-document QA index.
+
+    Each indexed PDF gets a directory named after its doc_id (the SHA-256 of
+    the PDF). It holds the passages (content + meta) as JSON, their embeddings
+    as a float32 .npy matrix and a manifest with the settings it was built
+    with (embedding model and chunking). Indexes
+    outlive restarts and are evicted by total size and by age, least recently
+    used first. Up to QA_INDEX_RESIDENT_DOCS of them stay loaded in the shared
+    document store, so a follow-up question only embeds the query and runs the
+    reader.
+    """
+
+    def __init__(self, directory=QA_INDEX_DIR, max_bytes=QA_INDEX_MAX_BYTES,
+                 max_age_seconds=QA_INDEX_MAX_AGE_SECONDS, resident_docs=QA_INDEX_RESIDENT_DOCS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.resident_docs = resident_docs
+        self._resident = OrderedDict()
+        self._pins = {}
+        self._lock = threading.RLock()
+
+    def _path(self, doc_id, name=""):
+        # Also keeps client-supplied ids from reaching outside the directory.
+        if not DOC_ID_RE.match(doc_id):
+            raise ValueError(f"Invalid doc_id: {doc_id!r}")
+        return os.path.join(self.directory, doc_id, name)
+
+    def _read_manifest(self, doc_id):
+        try:
+            with open(self._path(doc_id, MANIFEST)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def exists(self, doc_id, settings=None):
+        """Whether `doc_id` is indexed (with exactly `settings`, if given)."""
+        manifest = self._read_manifest(doc_id)
+        if manifest is None:
+            return False
+        return settings is None or manifest.get("settings") == settings
+
+    def manifest(self, doc_id):
+        return self._read_manifest(doc_id)
+
+    def save(self, doc_id, documents, extra=None):
+        """Persist embedded documents for `doc_id` (atomically replacing any old index)."""
+        final_dir = self._path(doc_id)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_dir = os.path.join(self.directory, f".{doc_id}.{uuid.uuid4().hex}.tmp")
+        os.makedirs(tmp_dir)
+        try:
+            with open(os.path.join(tmp_dir, PASSAGES), "w") as f:
+                json.dump([{"id": d.id, "content": d.content, "meta": d.meta} for d in documents], f)
+            embeddings = np.asarray([d.embedding for d in documents], dtype=np.float32)
+            np.save(os.path.join(tmp_dir, EMBEDDINGS), embeddings)
+            manifest = {
+                "doc_id": doc_id,
+                "settings": index_settings(),
+                "passages": len(documents),
+                "created_at": time.time(),
+                **(extra or {}),
+            }
+            with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+                json.dump(manifest, f)
+            with self._lock:
+                if os.path.exists(final_dir):
+                    shutil.rmtree(final_dir)
+                os.replace(tmp_dir, final_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self.evict()
+        return manifest
+
+    def load_arrays(self, doc_id):
+        """Read `doc_id`'s passages (as dicts) and their embedding matrix."""
+        with open(self._path(doc_id, PASSAGES)) as f:
+            passages = json.load(f)
+        embeddings = np.load(self._path(doc_id, EMBEDDINGS))
+        self.touch(doc_id)
+        return passages, embeddings
+
+    def load(self, doc_id):
+        """Read the persisted, embedded documents for `doc_id`."""
+        passages, embeddings = self.load_arrays(doc_id)
+        return [
+            Document(id=p["id"], content=p["content"], meta=p["meta"], embedding=embeddings[i].tolist())
+            for i, p in enumerate(passages)
+        ]
+
+    def touch(self, doc_id):
+        try:
+            os.utime(self._path(doc_id, MANIFEST))
+        except OSError:
+            pass
+
+    def make_resident(self, doc_id, documents=None):
+        """
+        Make sure `doc_id`'s documents are in the shared store, loading them
+        from disk if needed and unloading the least recently used ones.
+        """
+        with self._lock:
+            if doc_id in self._resident:
+                self._resident.move_to_end(doc_id)
+                self.touch(doc_id)
+                return
+            if documents is None:
+                documents = self.load(doc_id)
+            qa_models.write(documents)
+            self._resident[doc_id] = True
+            self._unload_excess()
+
+    def _unload_excess(self):
+        """Unload least recently used documents over the limit, except pinned ones."""
+        for stale_id in list(self._resident):
+            if len(self._resident) <= self.resident_docs:
+                break
+            if not self._pins.get(stale_id):
+                del self._resident[stale_id]
+                qa_models.forget(stale_id)
+
+    @contextmanager
+    def resident(self, doc_id):
+        """
+        Keep `doc_id` loaded in the shared store for the duration of the
+        block (e.g. retrieval, reading and context windows of one request),
+        so concurrent loads of other documents cannot unload it midway.
+        Raises KeyError if it isn't indexed with the current settings.
+        """
+        with self._lock:
+            if not self.exists(doc_id, index_settings()):
+                raise KeyError(doc_id)
+            self.make_resident(doc_id)
+            self._pins[doc_id] = self._pins.get(doc_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins[doc_id] -= 1
+                if not self._pins[doc_id]:
+                    del self._pins[doc_id]
+                self._unload_excess()
+
+    def remove(self, doc_id):
+        with self._lock:
+            if self._resident.pop(doc_id, None):
+                qa_models.forget(doc_id)
+            shutil.rmtree(self._path(doc_id), ignore_errors=True)
+
+    def evict(self):
+        """Drop indexes older than max_age_seconds, then LRU ones until under max_bytes."""
+        entries = []
+        total = 0
+        now = time.time()
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                return
+            for name in os.listdir(self.directory):
+                if not DOC_ID_RE.match(name):
+                    continue
+                manifest_path = self._path(name, MANIFEST)
+                try:
+                    last_used = os.stat(manifest_path).st_mtime
+                except OSError:
+                    continue
+                if now - last_used > self.max_age_seconds:
+                    self.remove(name)
+                    continue
+                size = sum(
+                    os.path.getsize(os.path.join(self._path(name), f))
+                    for f in os.listdir(self._path(name))
+                )
+                entries.append((last_used, size, name))
+                total += size
+            entries.sort()
+            for _, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                self.remove(name)
+                total -= size
+
+
+document_index = DocumentIndex()
+
+
+def add_to_corpus(doc_id):
+    """Copy an indexed document into the corpus index unless it is there already."""
+    if corpus_index.contains(doc_id):
+        return
+    manifest = document_index.manifest(doc_id) or {}
+    extra = {key: manifest[key] for key in ("filename", "num_pages") if key in manifest}
+    corpus_index.add(doc_id, document_index.load(doc_id), extra)
+
+
+def index_markdown(doc_id, markdown, extra=None):
+    """
+    Embed and persist a converted document under `doc_id` (blocking), unless
+    it is already indexed with the current settings. Passages the corpus index
+    has seen before are not embedded again. The document is also added to the
+    corpus index. Returns the manifest.
+    """
+    models = qa_models.load()
+    if document_index.exists(doc_id, index_settings()):
+        add_to_corpus(doc_id)
+        document_index.make_resident(doc_id)
+        return document_index.manifest(doc_id)
+    documents = corpus_index.fill_embeddings(build_passages(markdown, doc_id), models.embed_documents)
+    manifest = document_index.save(doc_id, documents, extra=extra)
+    corpus_index.add(doc_id, documents, extra)
+    document_index.make_resident(doc_id, documents)
+    return manifest
+
+
+def ask_document_batch(doc_id, queries, retriever_top_k=None, reader_top_k=2):
+    """
+    Answer several questions against one indexed document (blocking).
+
+    All questions are embedded in one batch and scored against the document's
+    passage matrix with a single matrix multiply (dot product, like the
+    in-memory retriever); the reader then runs over every question x passage
+    pair in shared batches. Returns one pipeline-shaped result per question.
+    """
+    models = qa_models.load()
+    # The passages must be in the shared store for context windows; callers
+    # that build those windows afterwards keep it pinned with `resident`.
+    with document_index.resident(doc_id):
+        passages, embeddings = document_index.load_arrays(doc_id)
+    documents_per_query = [[] for _ in queries]
+    if len(passages):
+        scores = models.embed_queries(queries) @ embeddings.T
+        best = top_k_rows(scores, retriever_top_k or QA_RETRIEVER_TOP_K)
+        for i, row in enumerate(best):
+            documents_per_query[i] = [
+                Document(id=passages[j]["id"], content=passages[j]["content"], meta=passages[j]["meta"], score=float(scores[i, j]))
+                for j in row
+            ]
+    answers = models.read_many(queries, documents_per_query, top_k=reader_top_k)
+    return [{"reader": {"answers": query_answers}} for query_answers in answers]
+
+
+def ask_document(doc_id, query, retriever_top_k=None, reader_top_k=2):
+    """
+    Answer `query` against an indexed document (blocking). Only the query is
+    embedded; the document's passages come from the persistent index.
+    """
+    models = qa_models.load()
+    with document_index.resident(doc_id):
+        return models.ask(query, doc_id, retriever_top_k=retriever_top_k, reader_top_k=reader_top_k)
+
+
+def ask_corpus(query, retriever_top_k=None, reader_top_k=3, doc_ids=None):
+    """
+    Answer `query` across every document in the corpus index (or only
+    `doc_ids`), blocking. Retrieval is an exact search of the memory-mapped
+    corpus matrix; the reader then runs over the best passages.
+    """
+    models = qa_models.load()
+    documents = corpus_index.search_passages(models.embed_queries([query]), top_k=retriever_top_k or QA_RETRIEVER_TOP_K, doc_ids=doc_ids)[0]
+    return {"reader": {"answers": models.read_many([query], [documents], top_k=reader_top_k)[0]}}
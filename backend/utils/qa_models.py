@@ -0,0 +1,225 @@
+import math
+import os
+import threading
+import time
+
+import numpy as np
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
+from haystack.components.retrievers import SentenceWindowRetriever
+from haystack.components.readers import ExtractiveReader
+from haystack.components.embedders import SentenceTransformersDocumentEmbedder, SentenceTransformersTextEmbedder
+from haystack.document_stores.types import DuplicatePolicy
+
+from utils.qa_onnx import INFERENCE_BACKENDS, use_onnx
+
+QA_EMBEDDING_MODEL = os.environ.get("QA_EMBEDDING_MODEL", "sentence-transformers/multi-qa-mpnet-base-dot-v1")
+# None means ExtractiveReader's default model.
+QA_READER_MODEL = os.environ.get("QA_READER_MODEL") or None
+# torch, onnx (fp32 on ONNX Runtime) or onnx-int8 (dynamically quantized).
+QA_INFERENCE_BACKEND = os.environ.get("QA_INFERENCE_BACKEND", "torch")
+QA_EMBED_BATCH_SIZE = int(os.environ.get("QA_EMBED_BATCH_SIZE", "32"))
+# Passages handed from the retriever to the reader.
+QA_RETRIEVER_TOP_K = int(os.environ.get("QA_RETRIEVER_TOP_K", "5"))
+
+# Private ExtractiveReader helpers used to read many questions in one pass
+# (checked against haystack-ai 2.x); without them read_many runs the reader
+# once per question.
+READER_INTERNALS = ("_flatten_documents", "_preprocess", "_postprocess", "_nest_answers")
+
+
+class QAModels:
+    """
+    Application-scoped, pre-warmed extractive QA components.
+
+    The embedders, reader and retrievers are loaded once around a single
+    shared InMemoryDocumentStore. Requests keep their documents apart with a
+    `doc_id` meta filter. Embedding and reading each hold their own lock, so
+    concurrent requests never share a model mid-call, and every read or write
+    of the store holds the store lock, so a document being made resident or
+    unloaded never changes the store under a running retrieval.
+    """
+
+    def __init__(self, embedding_model=QA_EMBEDDING_MODEL, reader_model=QA_READER_MODEL, backend=QA_INFERENCE_BACKEND):
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown QA inference backend {backend!r}; expected one of {INFERENCE_BACKENDS}.")
+        self.embedding_model = embedding_model
+        self.reader_model = reader_model
+        self.backend = backend
+        self.load_seconds = None
+        self._load_lock = threading.Lock()
+        self._embed_lock = threading.Lock()
+        self._store_lock = threading.Lock()
+        self._qa_lock = threading.Lock()
+        self._batched_reader = True
+        self._loaded = False
+
+    def load(self):
+        """Load and warm up all models and build the pipelines (idempotent)."""
+        if self._loaded:
+            return self
+        with self._load_lock:
+            if self._loaded:
+                return self
+            started = time.perf_counter()
+
+            self.document_store = InMemoryDocumentStore()
+            self.document_embedder = SentenceTransformersDocumentEmbedder(
+                model=self.embedding_model, batch_size=QA_EMBED_BATCH_SIZE
+            )
+            self.text_embedder = SentenceTransformersTextEmbedder(model=self.embedding_model)
+            reader_kwargs = {"model": self.reader_model} if self.reader_model else {}
+            self.reader = ExtractiveReader(no_answer=True, **reader_kwargs)
+            if self.backend != "torch":
+                use_onnx(
+                    [self.document_embedder, self.text_embedder], self.reader, self.embedding_model,
+                    quantize=self.backend == "onnx-int8",
+                )
+            self.document_embedder.warm_up()
+            self.text_embedder.warm_up()
+            self.reader.warm_up()
+
+            self.retriever = InMemoryEmbeddingRetriever(document_store=self.document_store)
+            self.window_retriever = SentenceWindowRetriever(document_store=self.document_store, window_size=2)
+
+            self.load_seconds = time.perf_counter() - started
+            self._loaded = True
+            print(f"QA models loaded in {self.load_seconds:.2f}s (embedder: {self.embedding_model}, backend: {self.backend}).")
+        return self
+
+    def embed_documents(self, documents):
+        """Return `documents` with embeddings filled in."""
+        with self._embed_lock:
+            return self.document_embedder.run(documents=documents)["documents"]
+
+    def write(self, documents):
+        """Add already-embedded documents to the shared store."""
+        with self._store_lock:
+            self.document_store.write_documents(documents, policy=DuplicatePolicy.OVERWRITE)
+
+    def index(self, documents):
+        documents = self.embed_documents(documents)
+        self.write(documents)
+        return documents
+
+    def ask(self, query, doc_id, retriever_top_k=None, reader_top_k=2):
+        """
+        Embed, retrieve and read (the QA pipeline's steps) restricted to the
+        passages of `doc_id`; the reader only sees the `retriever_top_k`
+        best-matching passages. Returns a pipeline-shaped result.
+        """
+        retriever_top_k = retriever_top_k or QA_RETRIEVER_TOP_K
+        filters = {"field": "meta.doc_id", "operator": "==", "value": doc_id}
+        with self._embed_lock:
+            embedding = self.text_embedder.run(text=query)["embedding"]
+        with self._store_lock:
+            documents = self.retriever.run(query_embedding=embedding, filters=filters, top_k=retriever_top_k)["documents"]
+        with self._qa_lock:
+            answers = self.reader.run(query=query, documents=documents, top_k=reader_top_k)["answers"]
+        return {"reader": {"answers": answers}}
+
+    def embed_queries(self, queries):
+        """Embed several questions in one batched forward pass; returns a float32 matrix."""
+        texts = [self.text_embedder.prefix + query + self.text_embedder.suffix for query in queries]
+        with self._embed_lock:
+            embeddings = self.text_embedder.embedding_backend.embed(
+                texts,
+                batch_size=QA_EMBED_BATCH_SIZE,
+                show_progress_bar=False,
+                normalize_embeddings=self.text_embedder.normalize_embeddings,
+            )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def read_many(self, queries, documents_per_query, top_k=2):
+        """
+        Run the reader for several questions, each over its own retrieved
+        passages. All question x passage sequences are tokenized together and
+        go through the model in shared batches of `max_batch_size`. Returns
+        one list of answers per question.
+        """
+        with self._qa_lock:
+            if self._batched_reader and all(hasattr(self.reader, name) for name in READER_INTERNALS):
+                try:
+                    return self._read_batched(queries, documents_per_query, top_k)
+                except (TypeError, ValueError, AttributeError) as e:
+                    # The reader's private helpers changed shape in this
+                    # haystack release; stop using them.
+                    print("Warning: batched reading unavailable, answering one question at a time:", e)
+                    self._batched_reader = False
+            return [
+                self.reader.run(query=query, documents=documents, top_k=top_k)["answers"] if documents else []
+                for query, documents in zip(queries, documents_per_query)
+            ]
+
+    def _read_batched(self, queries, documents_per_query, top_k):
+        # Same steps as ExtractiveReader.run, but for many queries at once.
+        import torch
+
+        reader = self.reader
+        device = getattr(reader, "device", None)
+        device = device.to_torch() if hasattr(device, "to_torch") else (device or "cpu")
+        answers = [[] for _ in queries]
+        asked = [i for i, documents in enumerate(documents_per_query) if documents]
+        if not asked:
+            return answers
+        queries_ = [queries[i] for i in asked]
+        nested_documents = [documents_per_query[i] for i in asked]
+        answers_per_seq = reader.answers_per_seq or 20
+
+        flattened_queries, flattened_documents, query_ids = reader._flatten_documents(queries_, nested_documents)
+        input_ids, attention_mask, sequence_ids, encodings, query_ids, document_ids = reader._preprocess(
+            flattened_queries, flattened_documents, reader.max_seq_length, query_ids, reader.stride
+        )
+        batch_size = reader.max_batch_size or input_ids.shape[0]
+        start_logits, end_logits = [], []
+        for i in range(math.ceil(input_ids.shape[0] / batch_size)):
+            batch = slice(i * batch_size, (i + 1) * batch_size)
+            with torch.inference_mode():
+                output = reader.model(
+                    input_ids=input_ids[batch].to(device), attention_mask=attention_mask[batch].to(device)
+                )
+            start_logits.append(output.start_logits.cpu())
+            end_logits.append(output.end_logits.cpu())
+        start, end, probabilities = reader._postprocess(
+            torch.cat(start_logits), torch.cat(end_logits), sequence_ids, attention_mask.cpu(), answers_per_seq, encodings
+        )
+        nested_answers = reader._nest_answers(
+            start=start,
+            end=end,
+            probabilities=probabilities,
+            flattened_documents=flattened_documents,
+            queries=queries_,
+            answers_per_seq=answers_per_seq,
+            top_k=top_k,
+            score_threshold=reader.score_threshold,
+            query_ids=query_ids,
+            document_ids=document_ids,
+            no_answer=reader.no_answer,
+            overlap_threshold=reader.overlap_threshold,
+        )
+        for i, query_answers in zip(asked, nested_answers):
+            answers[i] = query_answers
+        return answers
+
+    def context_window(self, document):
+        with self._store_lock:
+            return self.window_retriever.run(retrieved_documents=[document])
+
+    def forget(self, doc_id):
+        """Remove a request's documents from the shared store."""
+        filters = {"field": "meta.doc_id", "operator": "==", "value": doc_id}
+        with self._store_lock:
+            stale = self.document_store.filter_documents(filters=filters)
+            self.document_store.delete_documents([d.id for d in stale])
+
+    def stats(self):
+        return {
+            "loaded": self._loaded,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "embedding_model": self.embedding_model,
+            "reader_model": self.reader_model,
+            "backend": self.backend,
+        }
+
+
+qa_models = QAModels()
@@ -0,0 +1,105 @@
+import os
+import re
+
+QA_ONNX_DIR = os.environ.get("QA_ONNX_DIR", os.path.join("cache", "onnx"))
+# Instruction set the int8 kernels are tuned for: avx2, avx512, avx512_vnni or arm64.
+QA_ONNX_QUANTIZATION = os.environ.get("QA_ONNX_QUANTIZATION", "avx2")
+
+INFERENCE_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# optimum[onnxruntime] is only needed for the ONNX backends.
+try:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTModelForQuestionAnswering, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+
+def _export_dir(kind, model_name, quantize):
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "--", model_name)
+    suffix = f"int8-{QA_ONNX_QUANTIZATION}" if quantize else "fp32"
+    return os.path.join(QA_ONNX_DIR, f"{kind}-{slug}-{suffix}")
+
+
+def _quantize(onnx_dir):
+    """Dynamically quantize onnx_dir/model.onnx to int8 (writes model_quantized.onnx)."""
+    config = getattr(AutoQuantizationConfig, QA_ONNX_QUANTIZATION)(is_static=False, per_channel=False)
+    ORTQuantizer.from_pretrained(onnx_dir, file_name="model.onnx").quantize(save_dir=onnx_dir, quantization_config=config)
+    return "model_quantized.onnx"
+
+
+def _model_file(onnx_dir, quantize):
+    name = "model_quantized.onnx" if quantize else "model.onnx"
+    return name if os.path.exists(os.path.join(onnx_dir, name)) else None
+
+
+def export_embedder(model_name, quantize=True):
+    """
+    Export a sentence-transformers model to ONNX (and quantize it) once.
+    Returns (directory, file_name) to load it from; later calls reuse the export.
+    """
+    target = _export_dir("embedder", model_name, quantize)
+    onnx_dir = os.path.join(target, "onnx")
+    file_name = _model_file(onnx_dir, quantize)
+    if file_name is None:
+        from sentence_transformers import SentenceTransformer
+
+        print(f"Exporting {model_name} to ONNX in {target}...")
+        # The sentence-transformers layout (pooling, normalization) plus the ONNX graph under onnx/.
+        SentenceTransformer(model_name, device="cpu").save(target)
+        ORTModelForFeatureExtraction.from_pretrained(target, export=True).save_pretrained(onnx_dir)
+        file_name = _quantize(onnx_dir) if quantize else "model.onnx"
+    return target, f"onnx/{file_name}"
+
+
+def export_reader(model_name, quantize=True):
+    """Export a question-answering model to ONNX (and quantize it) once. Returns (directory, file_name)."""
+    target = _export_dir("reader", model_name, quantize)
+    file_name = _model_file(target, quantize)
+    if file_name is None:
+        from transformers import AutoTokenizer
+
+        print(f"Exporting {model_name} to ONNX in {target}...")
+        ORTModelForQuestionAnswering.from_pretrained(model_name, export=True).save_pretrained(target)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(target)
+        file_name = _quantize(target) if quantize else "model.onnx"
+    return target, file_name
+
+
+class OnnxEmbeddingBackend:
+    """
+    Stand-in for Haystack's sentence-transformers embedding backend that runs
+    the model on ONNX Runtime. Set as `embedding_backend` before warm_up(), so
+    the embedder never loads the PyTorch weights.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def embed(self, data, **kwargs):
+        return self.model.encode(data, **kwargs).tolist()
+
+
+def use_onnx(embedders, reader, embedding_model, quantize=True):
+    """
+    Switch Haystack embedders and an ExtractiveReader to ONNX Runtime on CPU
+    (int8 dynamic quantization when `quantize`). Call before warm_up().
+    """
+    if not ONNX_AVAILABLE:
+        raise RuntimeError("The ONNX backend needs optimum[onnxruntime] installed.")
+    from sentence_transformers import SentenceTransformer
+    from transformers import AutoTokenizer
+    from haystack.utils import ComponentDevice
+
+    directory, file_name = export_embedder(embedding_model, quantize)
+    model = SentenceTransformer(directory, device="cpu", backend="onnx", model_kwargs={"file_name": file_name})
+    backend = OnnxEmbeddingBackend(model)
+    for embedder in embedders:
+        embedder.embedding_backend = backend
+
+    directory, file_name = export_reader(reader.model_name_or_path, quantize)
+    # ExtractiveReader.warm_up() keeps a model that is already set.
+    reader.model = ORTModelForQuestionAnswering.from_pretrained(directory, file_name=file_name)
+    reader.tokenizer = AutoTokenizer.from_pretrained(directory)
+    reader.device = ComponentDevice.from_str("cpu")
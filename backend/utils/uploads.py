@@ -0,0 +1,237 @@
+import hashlib
+import os
+import tempfile
+
+from fastapi import UploadFile, HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+UPLOAD_HEAD_SIZE = 1024          # leading bytes kept for magic-number checks
+# Allowance for multipart boundaries and form fields on top of a file size limit.
+MULTIPART_SLACK_BYTES = 1024 * 1024
+MAX_AVATAR_UPLOAD_BYTES = int(os.environ.get("MAX_AVATAR_UPLOAD_BYTES", str(10 * 1024 ** 2)))
+
+AVATAR_DIR = os.path.join("uploads", "avatars")
+# In-progress avatar uploads are written here, outside the served uploads
+# directory, then renamed into AVATAR_DIR; keep both on the same filesystem.
+AVATAR_SPOOL_DIR = os.environ.get("AVATAR_SPOOL_DIR", os.path.join("cache", "avatar_spool"))
+AVATAR_THUMBNAIL_SIZE = (128, 128)
+AVATAR_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png"}
+
+# Pillow is only needed for thumbnails; uploads still work without it.
+try:
+    from PIL import Image, ImageOps
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+
+class SpooledUpload:
+    """
+    An upload that has been streamed to a temporary file on disk,
+    together with its size, SHA-256 digest and first few bytes.
+    """
+
+    def __init__(self, path, sha256, size, head=b""):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.head = head
+
+    def discard(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class _SpoolWriter:
+    """
+    Writes chunks to a temporary file while tracking size, digest and head.
+    On any error the partial file is removed.
+    """
+
+    def __init__(self, suffix="", dir=None, max_bytes=None):
+        self.suffix = suffix
+        self.dir = dir
+        self.max_bytes = max_bytes
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self.tmp = None
+
+    def __enter__(self):
+        self.tmp = tempfile.NamedTemporaryFile(suffix=self.suffix, dir=self.dir, delete=False)
+        return self
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds the maximum size of {self.max_bytes} bytes.")
+        if len(self.head) < UPLOAD_HEAD_SIZE:
+            self.head += chunk[:UPLOAD_HEAD_SIZE - len(self.head)]
+        self.digest.update(chunk)
+        self.tmp.write(chunk)
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tmp.close()
+        if exc_type is not None:
+            os.remove(self.tmp.name)
+            if not isinstance(exc, HTTPException):
+                raise HTTPException(status_code=500, detail=f"Failed to save upload: {str(exc)}") from exc
+        return False
+
+    def result(self):
+        return SpooledUpload(self.tmp.name, self.digest.hexdigest(), self.size, self.head)
+
+
+async def spool_upload(upload: UploadFile, suffix="", dir=None, chunk_size=UPLOAD_CHUNK_SIZE, max_bytes=None) -> SpooledUpload:
+    """
+    Stream an UploadFile to a temporary file in fixed-size chunks, hashing the
+    content on the way through, so memory use stays constant regardless of
+    the upload size. Uploads larger than `max_bytes` are rejected with 413.
+    """
+    with _SpoolWriter(suffix=suffix, dir=dir, max_bytes=max_bytes) as writer:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            writer.write(chunk)
+    return writer.result()
+
+
+def spool_stream(fileobj, suffix="", dir=None, chunk_size=UPLOAD_CHUNK_SIZE, max_bytes=None) -> SpooledUpload:
+    """
+    Blocking counterpart of `spool_upload` for file-like objects
+    (e.g. members of a zip archive).
+    """
+    with _SpoolWriter(suffix=suffix, dir=dir, max_bytes=max_bytes) as writer:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            writer.write(chunk)
+    return writer.result()
+
+
+async def store_avatar(upload: UploadFile) -> str:
+    """
+    Store a profile picture under its content hash (uploads/avatars/<sha256>.<ext>).
+    Identical images are stored once, and since a path's content never
+    changes it can be served with immutable caching headers.
+    """
+    os.makedirs(AVATAR_DIR, exist_ok=True)
+    os.makedirs(AVATAR_SPOOL_DIR, exist_ok=True)
+    extension = AVATAR_EXTENSIONS[upload.content_type]
+    spooled = await spool_upload(upload, suffix=extension, dir=AVATAR_SPOOL_DIR, max_bytes=MAX_AVATAR_UPLOAD_BYTES)
+    file_location = os.path.join(AVATAR_DIR, spooled.sha256 + extension)
+    if os.path.exists(file_location):
+        spooled.discard()
+    else:
+        os.replace(spooled.path, file_location)
+    return file_location
+
+
+def avatar_thumbnail_path(file_location: str) -> str:
+    root, extension = os.path.splitext(file_location)
+    width, height = AVATAR_THUMBNAIL_SIZE
+    return f"{root}_{width}x{height}{extension}"
+
+
+def generate_avatar_thumbnail(file_location: str):
+    """
+    Write a fixed-size, center-cropped thumbnail next to the stored avatar.
+    Meant to run as a background task after the upload response is sent.
+    """
+    thumbnail_location = avatar_thumbnail_path(file_location)
+    if not PILLOW_AVAILABLE or os.path.exists(thumbnail_location):
+        return
+    try:
+        with Image.open(file_location) as img:
+            thumbnail = ImageOps.fit(ImageOps.exif_transpose(img), AVATAR_THUMBNAIL_SIZE)
+            tmp_location = thumbnail_location + ".tmp"
+            thumbnail.save(tmp_location, format=img.format)
+        os.replace(tmp_location, thumbnail_location)
+    except Exception as e:
+        print(f"Warning: could not generate thumbnail for {file_location}:", e)
+
+
+class UploadsStaticFiles(StaticFiles):
+    """
+    StaticFiles for the uploads directory. Content-addressed avatars are
+    served with a long-lived immutable Cache-Control header; anything else
+    (legacy files stored under their original name) must be revalidated.
+    """
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            if path.replace(os.sep, "/").startswith("avatars/"):
+                response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+            else:
+                response.headers["Cache-Control"] = "no-cache"
+        return response
+
+
+class RequestBodyTooLarge(HTTPException):
+    def __init__(self, limit):
+        super().__init__(status_code=413, detail=f"Request body exceeds the maximum size of {limit} bytes.")
+
+
+class UploadLimitMiddleware:
+    """
+    Rejects request bodies over a per-path-prefix limit (longest prefix wins)
+    with 413 before they reach the application. Starlette's multipart parser
+    spools the whole body to disk before a route runs, so checking sizes
+    while copying an UploadFile is too late. Requests are refused up front
+    from Content-Length, and bodies without one (chunked) are cut off as
+    soon as they exceed the limit.
+    """
+
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def limit_for(self, path):
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return limit
+        return None
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limit_for(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            return await self._reject(scope, receive, send, limit)
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise RequestBodyTooLarge(limit)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except RequestBodyTooLarge:
+            if response_started:
+                raise
+            await self._reject(scope, receive, send, limit)
+
+    async def _reject(self, scope, receive, send, limit):
+        error = RequestBodyTooLarge(limit)
+        response = JSONResponse(status_code=error.status_code, content={"detail": error.detail}, headers={"Connection": "close"})
+        await response(scope, receive, send)
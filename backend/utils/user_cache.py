@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+
+USER_CACHE_MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", "1024"))
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", "300"))
+
+
+class UserCache:
+    """
+    Bounded LRU/TTL cache of User records, keyed by id and by email.
+
+    Entries are plain JSON-friendly dicts (not session-bound model instances),
+    stored once under the user id with a secondary email -> id index. Any
+    write goes through `invalidate`.
+    """
+
+    def __init__(self, max_entries=USER_CACHE_MAX_ENTRIES, ttl_seconds=USER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # user_id -> (record, expires_at)
+        self._email_index = {}         # email -> user_id
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _get_entry(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            self._drop(user_id)
+            return None
+        self._entries.move_to_end(user_id)
+        return entry
+
+    def _drop(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            email = entry[0].get("email")
+            if self._email_index.get(email) == user_id:
+                del self._email_index[email]
+
+    def get_by_id(self, user_id):
+        """Return the cached record for a user id, or None."""
+        with self._lock:
+            entry = self._get_entry(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def get_by_email(self, email):
+        """Return the cached record for an email, or None."""
+        with self._lock:
+            user_id = self._email_index.get(email)
+            entry = self._get_entry(user_id) if user_id is not None else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user):
+        """Store a User (model or dict) and return its record."""
+        record = user if isinstance(user, dict) else user.dict()
+        with self._lock:
+            self._drop(record["id"])
+            self._entries[record["id"]] = (record, time.monotonic() + self.ttl_seconds)
+            self._email_index[record["email"]] = record["id"]
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._drop(oldest_id)
+                self.evictions += 1
+        return record
+
+    def invalidate(self, user_id=None, email=None):
+        """Drop a user from the cache after a write, by id and/or email."""
+        with self._lock:
+            if user_id is None and email is not None:
+                user_id = self._email_index.get(email)
+            if user_id is not None and user_id in self._entries:
+                self._drop(user_id)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._email_index.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+user_cache = UserCache()
+
+
+def user_etag(record):
+    """
+    Strong ETag derived from the serialized user record.
+    """
+    payload = json.dumps(jsonable_encoder(record), sort_keys=True, separators=(",", ":"))
+    return '"' + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32] + '"'